@@ -0,0 +1,79 @@
+
+# Benchmark: panel-wide as-of join vs the per-date book value loop.
+
+# Usage (from project/):
+#     python -m benchmarks.bench_asof --tickers 1000 --years 25
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.features.asof import asof_join
+
+
+def legacy_rolling_book_value(price_dates, book_value_series):
+
+    # The original get_rolling_book_value_per_share loop, kept here as the
+    # reference implementation for timing and correctness.
+
+    rolling_book_values = []
+    for date in price_dates:
+        date = pd.Timestamp(date)
+        available_book_values = book_value_series[book_value_series.index <= date]
+        if len(available_book_values) > 0:
+            rolling_book_values.append(available_book_values.iloc[-1])
+        else:
+            rolling_book_values.append(np.nan)
+    return pd.Series(rolling_book_values, index=price_dates)
+
+
+def make_inputs(n_tickers: int, n_years: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2000-01-03", periods=252 * n_years)
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+
+    # One filing per fiscal year, fiscal year ends scattered across months
+    fy_ends = pd.to_datetime([f"{1999 + y}-12-31" for y in range(n_years + 1)])
+    rows = []
+    for ticker in tickers:
+        shift = pd.DateOffset(months=int(rng.integers(0, 12)))
+        for fy_end in fy_ends:
+            rows.append((ticker, fy_end - shift, rng.lognormal(3.0, 0.5)))
+    fundamentals = pd.DataFrame(rows, columns=["ticker", "asOfDate", "value"])
+    return dates, tickers, fundamentals
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=200)
+    ap.add_argument("--years", type=int, default=25)
+    ap.add_argument("--legacy-tickers", type=int, default=10,
+                    help="tickers to time with the legacy loop (extrapolated)")
+    args = ap.parse_args()
+
+    dates, tickers, fundamentals = make_inputs(args.tickers, args.years)
+    print(f"{len(dates)} dates x {len(tickers)} tickers, "
+          f"{len(fundamentals)} filings")
+
+    start = time.perf_counter()
+    panel = asof_join(fundamentals, dates, tickers=tickers)
+    asof_secs = time.perf_counter() - start
+    print(f"asof_join (all tickers):       {asof_secs:8.3f}s")
+
+    sample = tickers[:args.legacy_tickers]
+    start = time.perf_counter()
+    for ticker in sample:
+        rows = fundamentals[fundamentals["ticker"] == ticker]
+        series = pd.Series(rows["value"].values,
+                           index=pd.to_datetime(rows["asOfDate"])).sort_index()
+        legacy = legacy_rolling_book_value(dates, series)
+        assert np.allclose(legacy.values, panel[ticker].values, equal_nan=True)
+    legacy_secs = (time.perf_counter() - start) * len(tickers) / len(sample)
+    print(f"legacy loop (extrapolated):    {legacy_secs:8.3f}s")
+    print(f"speedup:                       {legacy_secs / asof_secs:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+
+# Benchmark: incremental EWMA betas / vols vs recomputing rolling windows.
+
+# Usage (from project/):
+#     python -m benchmarks.bench_ewma --tickers 1000 --years 25
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.features.ewma import EWMAEstimator
+from src.utils.synthetic import synthetic_prices
+
+
+def rolling_beta(returns, window):
+
+    # Per-date rolling covariance with the equal-weighted benchmark
+
+    bench = returns.mean(axis=1)
+    cov = returns.rolling(window, min_periods=window).cov(bench)
+    return cov.div(bench.rolling(window, min_periods=window).var(), axis=0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=25)
+    ap.add_argument("--halflife", type=float, default=63)
+    args = ap.parse_args()
+
+    prices = synthetic_prices(args.tickers, args.years)
+    returns = prices.pct_change(fill_method=None)
+    history, today = returns.iloc[:-1], returns.iloc[-1:]
+    window = int(4 * args.halflife)
+
+    start = time.perf_counter()
+    rolling_beta(returns, window)
+    rolling_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    estimator = EWMAEstimator(returns.columns, halflife=args.halflife)
+    estimator.update(history)
+    ewma_secs = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = estimator.save(Path(tmp) / "ewma.npz")
+        start = time.perf_counter()
+        resumed = EWMAEstimator.load(path)
+        out = resumed.update(today)
+        resumed.save(path)
+        append_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rolling_beta(returns.iloc[-(window + 1):], window)
+    window_secs = time.perf_counter() - start
+
+    check = EWMAEstimator(returns.columns, halflife=args.halflife).update(returns)
+    identical = np.array_equal(check["beta"].to_numpy()[-1:], out["beta"].to_numpy(),
+                               equal_nan=True)
+    f32 = EWMAEstimator(returns.columns, halflife=args.halflife, dtype=np.float32)
+    f32_mb = f32.update(returns)["beta"].memory_usage(deep=True).sum() / 2 ** 20
+
+    print(f"{len(returns)} dates x {args.tickers} tickers, halflife {args.halflife:g} "
+          f"(rolling window {window})")
+    print(f"full history, rolling beta:        {rolling_secs:8.3f}s")
+    print(f"full history, EWMA:                {ewma_secs:8.3f}s")
+    print(f"append one day, rolling last window:{window_secs:7.3f}s")
+    print(f"append one day, EWMA (load+save):  {append_secs:8.4f}s")
+    print(f"resumed == unbroken run:           {identical}")
+    print(f"beta history as float32:           {f32_mb:8.1f} MB "
+          f"(vs {f32_mb * 2:.1f} MB float64)")
+
+
+if __name__ == "__main__":
+    main()
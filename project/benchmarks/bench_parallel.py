@@ -0,0 +1,60 @@
+
+# Benchmark: column-independent factors serially vs sharded across
+# processes over a shared-memory panel.
+
+# Usage (from project/):
+#     python -m benchmarks.bench_parallel --tickers 1000 --years 25 --workers 1 2 4
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from src.etl.compute_forward_returns import forward_log_returns
+from src.features.compute_factors import low_vol, momentum
+from src.utils.parallel import map_columns, shard_bounds
+from src.utils.synthetic import synthetic_prices
+
+FACTORS = {
+    "momentum": (momentum, {}),
+    "low_vol": (low_vol, {}),
+    "forward_returns": (forward_log_returns, {"horizon": 63}),
+}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=25)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--memory-budget", default="1GB")
+    args = ap.parse_args()
+
+    prices = synthetic_prices(args.tickers, args.years)
+    print(f"{len(prices)} dates x {args.tickers} tickers, {os.cpu_count()} CPUs, "
+          f"budget {args.memory_budget}")
+    print(f"{'factor':<16}{'serial':>9}" + "".join(f"{f'{w} workers':>12}" for w in args.workers)
+          + f"{'float32 err':>13}")
+    for name, (func, kwargs) in FACTORS.items():
+        start = time.perf_counter()
+        reference = func(prices, **kwargs).to_numpy()
+        row = f"{name:<16}{time.perf_counter() - start:>8.2f}s"
+        for workers in args.workers:
+            start = time.perf_counter()
+            out = map_columns(func, prices, workers=workers,
+                              memory_budget=args.memory_budget, **kwargs)
+            secs = time.perf_counter() - start
+            assert np.array_equal(out.to_numpy(), reference, equal_nan=True)
+            row += f"{secs:>11.2f}s"
+        single = map_columns(func, prices, workers=1, dtype=np.float32, **kwargs)
+        row += f"{np.nanmax(np.abs(single.to_numpy() - reference)):>13.1e}"
+        print(row)
+
+    for workers in args.workers:
+        print(f"shards with {workers} workers: "
+              f"{len(shard_bounds(len(prices), args.tickers, 8, workers, args.memory_budget))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+
+# Benchmark: point-in-time fundamentals store vs expanding annual filings
+# onto every calendar day (the old load_quality_z layout).
+
+# Usage (from project/):
+#     python -m benchmarks.bench_pit --tickers 1000 --years 25
+
+import argparse
+import tempfile
+import time
+
+import pandas as pd
+
+from src.features.pit import PITStore
+from src.utils.synthetic import synthetic_fundamentals, synthetic_prices
+
+FIELDS = ["NetIncome", "StockholdersEquity", "TotalDebt"]
+
+
+def calendar_expansion(statements, field):
+
+    # Old layout: pivot by fiscal year, left-merge onto every calendar day
+    # (a year's value shows from Jan 1 of that year)
+
+    df = statements.assign(year=pd.to_datetime(statements["asOfDate"]).dt.year)
+    pivot = df.pivot_table(index="year", columns="symbol", values=field, aggfunc="last")
+    daily = pd.DataFrame({"Date": pd.date_range(f"{pivot.index.min()}-01-01",
+                                                pd.Timestamp.today(), freq="D")})
+    daily["year"] = daily["Date"].dt.year
+    return daily.merge(pivot, how="left", left_on="year", right_index=True).drop(columns="year")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=25)
+    args = ap.parse_args()
+
+    prices = synthetic_prices(args.tickers, args.years)
+    statements = synthetic_fundamentals(prices)
+
+    start = time.perf_counter()
+    expanded = {f: calendar_expansion(statements, f) for f in FIELDS}
+    expand_secs = time.perf_counter() - start
+    expand_mb = sum(df.memory_usage(deep=True).sum() for df in expanded.values()) / 2 ** 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        store = PITStore(tmp)
+        store.ingest(statements, FIELDS)
+        ingest_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.asof_frames(FIELDS, prices.index, prices.columns)
+        query_secs = time.perf_counter() - start
+
+        # A restatement is one appended record; earlier knowledge dates
+        # still see the original value
+        restated = statements.copy()
+        restated.loc[restated.index[0], FIELDS[0]] *= 1.1
+        added = store.ingest(restated, FIELDS)
+
+    print(f"{args.tickers} tickers x {args.years} years, {len(statements)} filings, "
+          f"{len(FIELDS)} fields")
+    print(f"calendar-day expansion: {expand_mb:8.1f} MB  {expand_secs:6.2f}s")
+    print(f"PIT store records:      {store.nbytes / 2 ** 20:8.1f} MB  "
+          f"{ingest_secs:6.2f}s ingest")
+    print(f"as-of on trading days:  {'':>8}     {query_secs:6.2f}s "
+          f"({len(prices)} dates, built on demand)")
+    print(f"restatement appended:   {added} record(s), {len(store.records)} total")
+
+
+if __name__ == "__main__":
+    main()
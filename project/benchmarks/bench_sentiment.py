@@ -0,0 +1,80 @@
+# Benchmark: sparse sentiment events projected onto the trading calendar
+# by SentimentStore.project vs densifying them with a pandas pivot,
+# forward fill and per-cell decay.
+
+# Usage (from project/):
+#     python -m benchmarks.bench_sentiment --tickers 1000 --years 25
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.features.sentiment import SentimentStore
+from src.utils.synthetic import synthetic_prices, synthetic_sentiment
+
+
+def _time(func, repeat: int = 3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def pandas_projection(events: pd.DataFrame, dates: pd.DatetimeIndex, tickers,
+                      halflife: float) -> pd.DataFrame:
+
+    # Pivot to a dense frame, forward fill, and decay by each cell's age
+    # since its ticker's latest event
+
+    rows = dates.searchsorted(events["timestamp"].dt.normalize(), side="right")
+    events = events.assign(row=rows)[rows < len(dates)]
+    dense = (events.pivot_table(index="row", columns="ticker", values="score", aggfunc="mean")
+             .reindex(index=range(len(dates)), columns=tickers))
+    last = dense.notna().mul(np.arange(len(dates)), axis=0).where(dense.notna()).ffill()
+    age = np.arange(len(dates))[:, None] - last.to_numpy()
+    out = dense.ffill() * 0.5 ** (age / halflife)
+    out.index = dates
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=25)
+    ap.add_argument("--halflife", type=float, default=21)
+    args = ap.parse_args()
+
+    prices = synthetic_prices(args.tickers, args.years)
+    events = synthetic_sentiment(prices)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SentimentStore(directory)
+        append_secs, _ = _time(lambda: store.append(events), 1)
+        load_secs, _ = _time(lambda: SentimentStore(directory), 1)
+        store_secs, projected = _time(
+            lambda: store.project(prices.index, prices.columns, halflife=args.halflife))
+        pandas_secs, reference = _time(
+            lambda: pandas_projection(store.events(), prices.index, prices.columns,
+                                      args.halflife), 1)
+
+    a, b = projected.to_numpy(), reference.to_numpy()
+    max_err = np.nanmax(np.abs(a - b))
+    same_nans = np.array_equal(np.isnan(a), np.isnan(b))
+    dense_mb = a.nbytes / 2**20
+    print(f"{len(store)} events over {len(prices)} dates x {args.tickers} tickers "
+          f"({store.nbytes / 2**20:.1f} MB sparse vs {dense_mb:.0f} MB dense)")
+    print(f"append (one part file):          {append_secs:8.3f}s")
+    print(f"load store:                      {load_secs:8.3f}s")
+    print(f"pandas pivot + ffill + decay:    {pandas_secs:8.3f}s")
+    print(f"SentimentStore.project:          {store_secs:8.3f}s "
+          f"({pandas_secs / store_secs:.1f}x)")
+    print(f"max abs difference:              {max_err:.2e} (NaN masks equal: {same_nans})")
+
+
+if __name__ == "__main__":
+    main()
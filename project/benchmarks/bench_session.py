@@ -0,0 +1,81 @@
+# Benchmark: CLI startup with lazily imported commands, and the table
+# reads of a multi-stage run in one process with and without the session
+# cache.
+
+# Usage (from project/):
+#     python -m benchmarks.bench_session --tickers 1000 --years 25
+
+from contextlib import redirect_stdout
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.suite import STAGES, stage_validate
+from src.__main__ import COMMANDS
+from src.utils.cache import session_cache
+from src.utils.store import PROJECT_DIR
+from src.utils.synthetic import PRICES_FILE, SYNTHETIC_DIR, write_synthetic
+
+CHAIN = ["forward_returns", "rolling_factors", "value", "quality", "merge", "backtest"]
+# What a CLI importing every command up front would load
+EAGER = [module for module, _ in COMMANDS.values()]
+
+
+def startup_seconds(code: str, repeat: int = 5) -> float:
+
+    # Best wall time of a fresh interpreter running `code` from project/
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, check=True,
+                       stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_chain(work, cache_mb: float) -> tuple[float, dict]:
+    cache = session_cache()
+    cache.reset()
+    cache.max_bytes = int(cache_mb * 2 ** 20)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for name in CHAIN:
+            STAGES[name](work)
+    return time.perf_counter() - start, cache.stats()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=25)
+    ap.add_argument("--cache-mb", type=float, default=1024)
+    args = ap.parse_args()
+
+    cli_secs = startup_seconds("import sys; sys.argv = ['src', '--help']; "
+                               "from src.__main__ import main; main()")
+    eager_secs = startup_seconds("import " + ", ".join(EAGER))
+    print(f"startup, `python -m src --help`:       {cli_secs:8.3f}s")
+    print(f"startup, every command imported:      {eager_secs:8.3f}s")
+
+    work = SYNTHETIC_DIR / f"{args.tickers}x{args.years}_seed0"
+    if not (work / "raw" / PRICES_FILE).exists():
+        print(f"Generating synthetic data in {work} ...")
+        write_synthetic(work, args.tickers, args.years, 0)
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        stage_validate(work)
+    for module in EAGER:
+        importlib.import_module(module)
+
+    print(f"\n{len(CHAIN)} stages in one process ({' -> '.join(CHAIN)}):")
+    for label, cache_mb in (("no cache", 0), (f"{args.cache_mb:.0f} MB cache", args.cache_mb)):
+        secs, stats = run_chain(work, cache_mb)
+        print(f"{label:<14} {secs:7.2f}s  {stats['reads']} table reads, {stats['hits']} hits, "
+              f"{stats['read_mb']:.0f} MB loaded from disk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+
+# Benchmark: Parquet store reads vs pd.read_csv on a wide price panel.
+
+# Usage (from project/):
+#     python -m benchmarks.bench_store --tickers 1000 --years 25
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.utils.store import read_table, write_table
+
+
+def _time(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=25)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2000-01-03", periods=252 * args.years, name="Date")
+    tickers = [f"T{i:04d}" for i in range(args.tickers)]
+    log_ret = rng.normal(0.0003, 0.02, size=(len(dates), len(tickers)))
+    prices = pd.DataFrame(100 * np.exp(np.cumsum(log_ret, axis=0)),
+                          index=dates, columns=tickers)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "prices.csv"
+        pq_path = Path(tmp) / "prices.parquet"
+        prices.to_csv(csv_path)
+        write_table(prices, pq_path)
+
+        subset = tickers[:50]
+        start, end = dates[-252 * 3], dates[-1]
+
+        results = {
+            "read_csv (full)": _time(lambda: pd.read_csv(csv_path, index_col=0,
+                                                         parse_dates=True)),
+            "read_table (full)": _time(lambda: read_table(pq_path, index=True)),
+            "read_csv (50 tickers, usecols)": _time(
+                lambda: pd.read_csv(csv_path, index_col=0, parse_dates=True,
+                                    usecols=["Date"] + subset)),
+            "read_table (50 tickers)": _time(
+                lambda: read_table(pq_path, tickers=subset, index=True)),
+            "read_table (50 tickers, last 3y)": _time(
+                lambda: read_table(pq_path, start=start, end=end,
+                                   tickers=subset, index=True)),
+        }
+
+        roundtrip = read_table(pq_path, index=True)
+        exact = np.array_equal(roundtrip.to_numpy(), prices.to_numpy())
+        csv_mb = csv_path.stat().st_size / 1e6
+        pq_mb = sum(f.stat().st_size for f in pq_path.rglob("*.parquet")) / 1e6
+
+    print(f"{len(dates)} dates x {len(tickers)} tickers")
+    print(f"on disk: csv {csv_mb:.1f} MB, parquet {pq_mb:.1f} MB; "
+          f"exact float64 round-trip: {exact}")
+    for label, secs in results.items():
+        print(f"{label:36s} {secs:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
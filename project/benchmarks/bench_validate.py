@@ -0,0 +1,76 @@
+
+# Benchmark: streaming price validation vs loading the whole raw CSV.
+
+# Each variant runs in a fresh process so its peak RSS is its own.
+
+# Usage (from project/):
+#     python -m benchmarks.bench_validate --tickers 3000 --years 25 --budgets 64MB 256MB
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.etl.validate_prices import validate_prices
+from src.utils.store import write_table
+from src.utils.synthetic import synthetic_prices
+
+
+def in_memory(raw_path, out_path):
+
+    # The previous validate_prices: whole file, column NaN rule only
+
+    df = pd.read_csv(raw_path)
+    df = df.dropna(thresh=len(df) * 0.05, axis=1)
+    write_table(df, out_path)
+
+
+def _generate(raw_path, tickers, years):
+
+    # In its own process too: the spawned workers inherit the parent's
+    # ru_maxrss, so the parent must never hold the synthetic panel
+    synthetic_prices(tickers, years).rename_axis("Date").to_csv(raw_path)
+    return raw_path.stat().st_size
+
+
+def _measure(variant, raw_path, out_path, budget):
+    start = time.perf_counter()
+    if variant == "in-memory":
+        in_memory(raw_path, out_path)
+    else:
+        validate_prices(raw_path, out_path, memory_budget=budget, residual="keep",
+                        audit=False)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return time.perf_counter() - start, peak_kb / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=3000)
+    ap.add_argument("--years", type=int, default=25)
+    ap.add_argument("--budgets", nargs="+", default=["64MB", "256MB"])
+    args = ap.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = Path(tmp) / "prices.csv"
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            size = pool.submit(_generate, raw_path, args.tickers, args.years).result()
+        print(f"raw file: {size / 2 ** 20:.0f} MB "
+              f"({args.tickers} tickers x {args.years} years)")
+        variants = [("in-memory", None)] + [("streaming", b) for b in args.budgets]
+        for variant, budget in variants:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                secs, peak = pool.submit(_measure, variant, raw_path,
+                                         Path(tmp) / "out.parquet", budget).result()
+            label = variant if budget is None else f"{variant} ({budget})"
+            print(f"{label:<22}{secs:8.2f}s{peak:10.0f} MB peak RSS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+
+# Pipeline benchmark suite on synthetic R1000-scale data.
+
+# Generates (once, cached under data/synthetic/) a seeded price panel and
+# fundamentals fixture, then runs each stage on it in a fresh process and
+# records wall time, peak RSS and output rows. Every run is appended to a
+# JSON history; stages that got slower / heavier than their own last run
+# with the same configuration (or whose row counts changed) are flagged.
+# The baseline is per stage, so a --stages subset run never hides the
+# stages it left out from the next full run.
+
+# Usage (from project/):
+#     python -m benchmarks.suite                          # 1000 x 25y
+#     python -m benchmarks.suite --tickers 200 --years 5 --stages value merge
+#     python -m benchmarks.suite --fail-on-regression     # exit 1 if flagged
+
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+from src.utils.store import PROJECT_DIR, read_table, table_path, write_table
+from src.utils.synthetic import PRICES_FILE, SYNTHETIC_DIR, write_synthetic
+
+HISTORY_PATH = PROJECT_DIR / "data" / "state" / "benchmark_history.json"
+
+
+# --------------------------------------------------------------------- #
+# Stages: each reads its inputs from <work>/processed, writes its outputs
+# there, and returns the number of output rows
+# --------------------------------------------------------------------- #
+def _table(work: Path, name: str) -> Path:
+    return table_path(name, root=work / "processed")
+
+
+def stage_validate(work: Path) -> int:
+    from src.etl.validate_prices import validate_prices
+
+    # residual="keep": the synthetic panel's random gap runs would make
+    # the plan's row rule drop most dates and starve the later stages
+    result = validate_prices(work / "raw" / PRICES_FILE,
+                             _table(work, "r1000_cleaned_close_prices"),
+                             residual="keep", audit=False)
+    return result["rows"]
+
+
+def stage_forward_returns(work: Path) -> int:
+    from src.etl.compute_forward_returns import (horizon_column, multi_horizon_returns,
+                                                 stacked_returns)
+    from src.pipeline import HORIZONS
+
+    prices = read_table(_table(work, "r1000_cleaned_close_prices"), index=True)
+    panel = multi_horizon_returns(prices, HORIZONS)
+    write_table(panel.frame(horizon_column(63)), _table(work, "forward_returns"))
+    write_table(stacked_returns(panel), _table(work, "forward_returns_by_horizon"))
+    return len(prices)
+
+
+def stage_rolling_factors(work: Path) -> int:
+    from src.features.compute_factors import low_vol, momentum
+
+    prices = read_table(_table(work, "r1000_cleaned_close_prices"), index=True)
+    write_table(momentum(prices), _table(work, "momentum_factor"))
+    write_table(low_vol(prices), _table(work, "low_vol_factor"))
+    return 2 * len(prices)
+
+
+def _fundamentals_client(work: Path):
+    from src.utils.fundamentals import FixtureBackend, FundamentalsClient
+
+    # Cold cache every run, so the batched fetch path is measured too
+    cache = work / "cache"
+    shutil.rmtree(cache, ignore_errors=True)
+    return FundamentalsClient(FixtureBackend(work / "fundamentals"), cache_dir=cache)
+
+
+def stage_value(work: Path) -> int:
+    from src.features.pb_ratios import calculate_daily_pb_ratios
+
+    prices = read_table(_table(work, "r1000_cleaned_close_prices"), index=True)
+    pb = calculate_daily_pb_ratios(prices, client=_fundamentals_client(work))
+    z_cols = [c for c in pb.columns if c.endswith("_z")]
+    value_z = pb[z_cols].rename(columns=lambda c: c[:-2])
+    write_table(value_z, _table(work, "value_factor_z"))
+    return len(value_z)
+
+
+def stage_quality(work: Path) -> int:
+    from src.features.compute_factors import quality
+    from src.features.pit import PITStore
+    from src.utils.fundamentals import ANNUAL_FINANCIALS
+
+    prices = read_table(_table(work, "r1000_cleaned_close_prices"), index=True)
+    statements = _fundamentals_client(work).get(list(prices.columns), ANNUAL_FINANCIALS)
+    fields = ["NetIncome", "StockholdersEquity", "TotalDebt", "TotalAssets"]
+    # Empty store every run, so ingestion is measured too
+    shutil.rmtree(work / "fundamentals_pit", ignore_errors=True)
+    store = PITStore(work / "fundamentals_pit")
+    store.ingest(statements, fields)
+    daily = store.asof_frames(fields, prices.index, prices.columns)
+    q = quality(daily["NetIncome"] / daily["StockholdersEquity"],
+                daily["TotalDebt"] / daily["TotalAssets"])
+    write_table(q, _table(work, "quality_factor_daily_zscore_only"))
+    return len(q)
+
+
+def stage_merge(work: Path) -> int:
+    from src.etl.merge import FACTOR_MATRIX_INPUTS, merge_factor_matrix
+
+    inputs = [read_table(_table(work, name)) for name in FACTOR_MATRIX_INPUTS.values()]
+    df = merge_factor_matrix(*inputs)
+    write_table(df, _table(work, "factor_matrix"))
+    return len(df)
+
+
+def stage_backtest(work: Path) -> int:
+    from src.portfolio.backtest import backtest, from_factor_matrix
+
+    signals, returns = from_factor_matrix(read_table(_table(work, "factor_matrix")),
+                                          ["quality_z", "value_z"])
+    return len(backtest(signals, returns)["returns"])
+
+
+STAGES = {
+    "validate": stage_validate,
+    "forward_returns": stage_forward_returns,
+    "rolling_factors": stage_rolling_factors,
+    "value": stage_value,
+    "quality": stage_quality,
+    "merge": stage_merge,
+    "backtest": stage_backtest,
+}
+
+
+# --------------------------------------------------------------------- #
+# Measurement
+# --------------------------------------------------------------------- #
+def _measure(name: str, work: Path) -> dict:
+
+    # Worker (fresh spawned process, so ru_maxrss is this stage's peak);
+    # the stage's own progress prints are silenced
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        rows = STAGES[name](work)
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"seconds": round(seconds, 4), "peak_rss_mb": round(peak_kb / 1024, 1),
+            "rows": int(rows)}
+
+
+def run_suite(work: Path, stages=None) -> dict:
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in stages or STAGES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(_measure, name, work).result()
+        r = results[name]
+        print(f"{name:<18}{r['seconds']:>9.2f}s{r['peak_rss_mb']:>10.0f} MB{r['rows']:>10}")
+    return results
+
+
+# --------------------------------------------------------------------- #
+# History
+# --------------------------------------------------------------------- #
+def load_history(path=HISTORY_PATH) -> list:
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else []
+
+
+def save_history(history: list, path=HISTORY_PATH) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(history, indent=1))
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def stage_baselines(history: list, config: dict, stages) -> dict:
+
+    # {stage: most recent run with this config that measured the stage}
+
+    baselines = {}
+    for run in reversed(history):
+        if run["config"] != config:
+            continue
+        for name in stages:
+            if name not in baselines and name in run["stages"]:
+                baselines[name] = run
+        if len(baselines) == len(stages):
+            break
+    return baselines
+
+
+def regressions(current: dict, baseline: dict, time_tol: float = 0.25,
+                rss_tol: float = 0.15, min_seconds: float = 0.05) -> list[str]:
+
+    # Flags for stages slower than baseline by more than time_tol (and
+    # min_seconds, to ignore timer noise on tiny stages), heavier by more
+    # than rss_tol, or producing a different number of rows
+
+    flags = []
+    for name, now in current.items():
+        then = baseline.get(name)
+        if then is None:
+            continue
+        if (now["seconds"] > then["seconds"] * (1 + time_tol)
+                and now["seconds"] - then["seconds"] > min_seconds):
+            flags.append(f"{name}: time {then['seconds']:.2f}s -> {now['seconds']:.2f}s")
+        if now["peak_rss_mb"] > then["peak_rss_mb"] * (1 + rss_tol):
+            flags.append(f"{name}: peak RSS {then['peak_rss_mb']:.0f} MB "
+                         f"-> {now['peak_rss_mb']:.0f} MB")
+        if now["rows"] != then["rows"]:
+            flags.append(f"{name}: rows {then['rows']} -> {now['rows']}")
+    return flags
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=25)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stages", nargs="*", choices=list(STAGES), default=None,
+                    help="subset of stages (inputs must exist from an earlier run)")
+    ap.add_argument("--history", default=str(HISTORY_PATH))
+    ap.add_argument("--time-tol", type=float, default=0.25)
+    ap.add_argument("--rss-tol", type=float, default=0.15)
+    ap.add_argument("--no-record", action="store_true", help="do not append to the history")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args()
+
+    config = {"tickers": args.tickers, "years": args.years, "seed": args.seed}
+    work = SYNTHETIC_DIR / f"{args.tickers}x{args.years}_seed{args.seed}"
+    if not (work / "raw" / PRICES_FILE).exists():
+        print(f"Generating synthetic data in {work} ...")
+        write_synthetic(work, args.tickers, args.years, args.seed)
+
+    print(f"\n{'stage':<18}{'time':>10}{'peak RSS':>13}{'rows':>10}")
+    results = run_suite(work, args.stages)
+
+    history = load_history(args.history)
+    baselines = stage_baselines(history, config, list(results))
+    flags = regressions(results, {name: run["stages"][name] for name, run in baselines.items()},
+                        args.time_tol, args.rss_tol)
+    runs = {(run["timestamp"], run["commit"]) for run in baselines.values()}
+    against = ", ".join(f"{ts} ({commit})" for ts, commit in sorted(runs))
+    missing = [name for name in results if name not in baselines]
+    if not baselines:
+        print("\nNo baseline for this configuration yet.")
+    elif flags:
+        print(f"\nRegressions vs {against}:")
+        for flag in flags:
+            print(f"  - {flag}")
+    else:
+        print(f"\nNo regressions vs {against}.")
+    if baselines and missing:
+        print(f"No baseline yet for: {', '.join(missing)}")
+
+    if not args.no_record:
+        history.append({
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "config": config,
+            "stages": results,
+            "regressions": flags,
+        })
+        save_history(history, args.history)
+
+    if flags and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
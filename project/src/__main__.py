@@ -0,0 +1,63 @@
+# Single command line for the project.
+
+#     python -m src <command> [args...]
+
+# Each command is one module's main(), imported only when it runs, so
+# `python -m src --help` (and any one command) loads just what it needs
+# rather than every stage's dependencies. The module's own flags follow
+# the command, e.g. `python -m src validate --memory-budget 512MB`.
+
+# Usage (from project/):
+#     python -m src download                   # raw close prices (yfinance)
+#     python -m src run --jobs 1               # the pipeline, in-process
+#     python -m src quality --tickers AAPL MSFT
+#     python -m src metrics --last 5
+
+
+import importlib
+import sys
+
+from src.utils.metrics import set_recording
+
+COMMANDS = {
+    "download": ("src.utils.data_loader", "download raw close prices"),
+    "validate": ("src.etl.validate_prices", "validate / repair the raw prices"),
+    "forward-returns": ("src.etl.compute_forward_returns", "forward log returns"),
+    "value": ("src.features.pb_ratios", "price-to-book value factor"),
+    "quality": ("src.etl.load_quality_z", "quality factor z-scores"),
+    "merge": ("src.etl.merge", "merge the factor matrix"),
+    "ic": ("src.features.ic", "factor IC and quantile spreads"),
+    "update": ("src.etl.incremental", "incremental daily update"),
+    "sentiment": ("src.features.sentiment", "sentiment event store"),
+    "macro": ("src.features.macro", "macro regimes"),
+    "universe": ("src.utils.universe", "point-in-time universe"),
+    "walkforward": ("src.models.walkforward", "walk-forward model"),
+    "hmm": ("src.models.hmm", "HMM regimes and factor weights"),
+    "run": ("src.pipeline", "run the stage DAG"),
+    "store": ("src.utils.store", "Parquet store maintenance"),
+    "metrics": ("src.utils.metrics", "timing / memory report"),
+}
+
+
+def usage() -> str:
+    width = max(map(len, COMMANDS))
+    lines = [f"  {name:<{width}}  {help_}" for name, (_, help_) in COMMANDS.items()]
+    return "usage: python -m src <command> [args...]\n\ncommands:\n" + "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        sys.exit(f"unknown command {command!r}\n\n{usage()}")
+    set_recording()
+    module = importlib.import_module(COMMANDS[command][0])
+    sys.argv = [f"python -m src {command}"] + rest
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,35 @@
 
 # Compute N-day forward log-returns and write to parquet.
 
-# Example:
-# python -m compute_forward_returns \
-#     --prices data/processed/prices_cleaned.csv \
-#     --horizon 63 \
-#     --out data/processed/forward_returns.csv
+# Every horizon is a difference of one log-price array, so any list of
+# horizons costs one read, one log and one subtraction each:
+#     fwd_h[t] = log P[t + h] - log P[t]
+
+# --out gets the wide table for --horizon (what merge reads);
+# --stacked-out gets every --horizons target side by side in one long
+# table (date, asset, fwd_21, fwd_63, ...) for the IC analytics.
+
+# Example (from project/):
+# python -m src.etl.compute_forward_returns \
+#     --prices data/processed/r1000_cleaned_close_prices.parquet \
+#     --horizon 63 --horizons 21 63 126 \
+#     --out data/processed/forward_returns.parquet \
+#     --stacked-out data/processed/forward_returns_by_horizon.parquet
 
-from pathlib import Path
 import argparse
 import pandas as pd
 import numpy as np
 
+from src.utils.metrics import timed
+from src.utils.panel import Panel
+from src.utils.store import read_table, write_table
+
+
+def horizon_column(horizon: int) -> str:
+    return f"fwd_{horizon}"
+
+
+@timed()
 def forward_log_returns(df: pd.DataFrame, horizon: int) -> pd.DataFrame:
 
     # df: wide price table (index=Date, columns=tickers, level=AdjClose)
@@ -19,18 +37,67 @@ def forward_log_returns(df: pd.DataFrame, horizon: int) -> pd.DataFrame:
 
     return np.log(df).diff(horizon).shift(-horizon)
 
+
+def log_prices(df: pd.DataFrame) -> pd.DataFrame:
+    return np.log(df)
+
+
+@timed()
+def multi_horizon_returns(df: pd.DataFrame, horizons) -> Panel:
+
+    # Forward log returns for every horizon from one log-price array.
+    # Returns a Panel with one field per horizon ("fwd_21", ...), each
+    # equal to forward_log_returns(df, h). One elementwise log is cheaper
+    # than any process pool, so this stays serial.
+
+    df = df.sort_index()
+    values = log_prices(df).to_numpy(dtype=float)
+
+    panel = Panel(df.index, df.columns)
+    for h in sorted(set(horizons)):
+        if h < 1:
+            raise ValueError(f"horizon must be positive, got {h}")
+        out = np.full_like(values, np.nan)
+        out[:-h] = values[h:] - values[:-h]
+        panel.fields[horizon_column(h)] = out
+    return panel
+
+
+def stacked_returns(panel: Panel) -> pd.DataFrame:
+
+    # Long (date, asset, fwd_h...) table; rows with no horizon at all
+    # (the last max(horizons) dates, unlisted tickers) are dropped
+
+    df = panel.to_long(dropna=False)
+    fields = list(panel.fields)
+    df = df[df[fields].notna().any(axis=1).to_numpy()].reset_index(drop=True)
+    df["asset"] = df["asset"].astype(str)
+    return df
+
+
+@timed("compute_forward_returns")
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--prices", required=True)
-    ap.add_argument("--horizon", type=int, default=63)
+    ap.add_argument("--horizon", type=int, default=63,
+                    help="horizon of the wide --out table")
+    ap.add_argument("--horizons", type=int, nargs="+", default=None,
+                    help="horizons of the --stacked-out table (default: --horizon)")
     ap.add_argument("--out", required=True)
+    ap.add_argument("--stacked-out", default=None)
     args = ap.parse_args()
+    horizons = sorted(set(args.horizons or []) | {args.horizon})
 
-    prices = pd.read_csv(args.prices, index_col=0).set_index("Date")
-    fwd = forward_log_returns(prices, args.horizon)
-    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
-    fwd.reset_index().to_csv(args.out, index=False)
-    print(f"forward returns -> {args.out}")
+    with timed("read") as m:
+        prices = read_table(args.prices, index=True)
+        m.count(prices)
+    panel = multi_horizon_returns(prices, horizons)
+    with timed("write"):
+        write_table(panel.frame(horizon_column(args.horizon)), args.out)
+        if args.stacked_out:
+            write_table(stacked_returns(panel), args.stacked_out)
+    print(f"forward returns ({', '.join(map(str, horizons))}d) -> {args.out}"
+          + (f", {args.stacked_out}" if args.stacked_out else ""))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,272 @@
+
+# Incremental daily update mode.
+
+# Instead of recomputing full history every run, keep the minimal rolling
+# state needed to extend each output by new trading days:
+
+#     log_tail   - last `lookback + 1` log prices (momentum needs P[t-1-lookback])
+#     cum_ring   - last `window + 1` rows of cumulative sum / sum of squares /
+#                  count of daily log returns, plus each column's shift;
+#                  any window's moments are a difference of two rows (low-vol)
+#     pending    - last `horizon` log prices whose forward returns are not
+#                  resolvable yet
+
+# Given only new price rows, update() returns the new momentum / low-vol
+# rows plus every forward return that became resolvable (backfill). The
+# arithmetic is the same sequence of float operations a from-scratch run
+# performs (the kernels are shared with features.rolling), so extending a
+# state is bit-identical to compute_factors.momentum / low_vol and
+# compute_forward_returns.forward_log_returns over the full history.
+
+# run_update also refreshes the multi-horizon forward_returns_by_horizon
+# table the IC stage reads: only its last max(horizon) dates can change,
+# so those are recomputed from the (already upserted) price tail.
+
+# Usage (from project/):
+#     python -m src.etl.incremental init                 # seed from history
+#     python -m src.etl.incremental update --prices new_rows.csv
+
+
+from pathlib import Path
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.etl.compute_forward_returns import multi_horizon_returns, stacked_returns
+from src.etl.merge import load_inputs, merge_factor_matrix
+from src.features.rolling import (accumulate, first_valid, log_returns,
+                                  moment_steps, window_std)
+from src.utils.store import (PROJECT_DIR, read_table, table_columns,
+                             table_path, upsert_table, write_table)
+
+STATE_PATH = PROJECT_DIR / "data" / "state" / "incremental.npz"
+
+PRICE_TABLE = "r1000_cleaned_close_prices"
+OUTPUT_TABLES = {
+    "momentum":        "momentum_factor",
+    "low_vol":         "low_vol_factor",
+    "forward_returns": "forward_returns",
+}
+HORIZON_TABLE = "forward_returns_by_horizon"
+
+
+class IncrementalState:
+
+    def __init__(self, tickers, lookback=252, skip=21, window=252, horizon=63,
+                 last_date=None, log_tail=None, cum_ring=None, shift=None,
+                 pending=None, pending_dates=None):
+        self.tickers = pd.Index(tickers)
+        self.lookback, self.skip = lookback, skip
+        self.window, self.horizon = window, horizon
+        self.last_date = None if last_date is None else pd.Timestamp(last_date)
+
+        n = len(self.tickers)
+        # Before the first row every lagged price is unknown and every
+        # cumulative sum is zero, exactly like the head of a full run
+        self.log_tail = (np.full((max(lookback, skip) + 1, n), np.nan)
+                         if log_tail is None else log_tail)
+        self.cum_ring = (np.zeros((3, window + 1, n))
+                         if cum_ring is None else cum_ring)
+        # Variance shift per column: its first valid return, once seen
+        self.shift = np.full(n, np.nan) if shift is None else shift
+        self.pending = np.empty((0, n)) if pending is None else pending
+        self.pending_dates = (pd.DatetimeIndex([]) if pending_dates is None
+                              else pd.DatetimeIndex(pending_dates))
+
+    @classmethod
+    def empty(cls, tickers, **params):
+        return cls(tickers, **params)
+
+    # ----------------------------------------------------------- update
+    def update(self, new_prices: pd.DataFrame) -> dict:
+
+        # new_prices: wide price rows (DatetimeIndex, tickers as columns)
+        # strictly after the last date already seen.
+
+        # Returns {"momentum", "low_vol"}: rows for the new dates, and
+        # {"forward_returns"}: rows for every date whose forward return
+        # changed (backfilled pending dates + the new dates, NaN where
+        # still unresolved).
+
+        new_prices = new_prices.sort_index()
+        dates = pd.DatetimeIndex(new_prices.index)
+        unknown = new_prices.columns.difference(self.tickers)
+        if len(unknown):
+            raise ValueError(f"tickers not in state: {list(unknown)}; "
+                             "rebuild the state from history")
+        if self.last_date is not None and len(dates) and dates[0] <= self.last_date:
+            raise ValueError(f"new rows start {dates[0].date()} but state "
+                             f"already covers {self.last_date.date()}")
+
+        new = new_prices.reindex(columns=self.tickers).to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            new_log = np.log(new)
+        k, n_tail = len(new), len(self.log_tail)
+        lp = np.concatenate([self.log_tail, new_log])
+        rows = np.arange(n_tail, n_tail + k)
+
+        # Momentum (12-1), lagged one day: uses prices up to t-1
+        momentum = np.where(np.isnan(lp[rows - 1]), np.nan,
+                            lp[rows - 1 - self.skip] - lp[rows - 1 - self.lookback])
+
+        # Daily log returns, then extend the cumulative moments row by row
+        returns = log_returns(lp[rows], lp[rows - 1])
+        unset = np.isnan(self.shift)
+        if k and unset.any():
+            self.shift[unset] = first_valid(returns[:, unset])
+        cum = np.concatenate(
+            [self.cum_ring,
+             accumulate(self.cum_ring[:, -1], moment_steps(returns, self.shift))],
+            axis=1,
+        )
+
+        # Low vol at t uses the window of returns ending t-1
+        end = self.window + rows - n_tail
+        low_vol = -window_std(cum[:, end], cum[:, end - self.window], self.window)
+
+        # Forward returns: log P[t+h] - log P[t] wherever t+h is now known
+        log_prices = np.concatenate([self.pending, new_log])
+        fwd_dates = self.pending_dates.append(dates)
+        fwd = np.full_like(log_prices, np.nan)
+        h = self.horizon
+        fwd[:len(log_prices) - h] = log_prices[h:] - log_prices[:len(log_prices) - h]
+
+        # Roll the state forward
+        self.log_tail = lp[-n_tail:]
+        self.cum_ring = cum[:, -(self.window + 1):]
+        self.pending = log_prices[-h:] if h else log_prices[:0]
+        self.pending_dates = fwd_dates[-h:] if h else fwd_dates[:0]
+        if k:
+            self.last_date = dates[-1]
+
+        frame = lambda values, index: pd.DataFrame(values, index=index,
+                                                  columns=self.tickers)
+        return {
+            "momentum": frame(momentum, dates),
+            "low_vol": frame(low_vol, dates),
+            "forward_returns": frame(fwd, fwd_dates),
+        }
+
+    # ------------------------------------------------------ persistence
+    def save(self, path=STATE_PATH) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            path,
+            tickers=np.asarray(self.tickers, dtype=str),
+            params=np.array([self.lookback, self.skip, self.window, self.horizon]),
+            last_date=np.array([str(self.last_date)]),
+            log_tail=self.log_tail,
+            cum_ring=self.cum_ring,
+            shift=self.shift,
+            pending=self.pending,
+            pending_dates=self.pending_dates.to_numpy(),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        with np.load(path) as f:
+            lookback, skip, window, horizon = (int(v) for v in f["params"])
+            last_date = str(f["last_date"][0])
+            return cls(
+                f["tickers"], lookback, skip, window, horizon,
+                last_date=None if last_date == "None" else last_date,
+                log_tail=f["log_tail"], cum_ring=f["cum_ring"], shift=f["shift"],
+                pending=f["pending"], pending_dates=f["pending_dates"],
+            )
+
+
+# --------------------------------------------------------------------- #
+# Pipeline entry points
+# --------------------------------------------------------------------- #
+def init_state(state_path=STATE_PATH, **params) -> IncrementalState:
+
+    # Seed the state from the full cleaned price history and (re)write the
+    # factor and forward-return tables from the same pass.
+
+    prices = read_table(table_path(PRICE_TABLE), index=True)
+    state = IncrementalState.empty(prices.columns, **params)
+    outputs = state.update(prices)
+    for key, name in OUTPUT_TABLES.items():
+        write_table(outputs[key].rename_axis("Date"), table_path(name))
+    state.save(state_path)
+    print(f"state seeded through {state.last_date.date()} -> {state_path}")
+    return state
+
+
+def update_horizon_returns(first_date, prices_path=None, path=None) -> int:
+
+    # Recompute the forward_returns_by_horizon rows that prices from
+    # `first_date` on can resolve: every date within max(horizon) trading
+    # days before it. Horizons are the table's own fwd_<h> columns. Same
+    # log / subtract as a full compute_forward_returns run, so the rows
+    # are bit-identical to one. Returns the number of rows upserted (0
+    # when the table has not been built yet).
+
+    prices_path = table_path(PRICE_TABLE) if prices_path is None else prices_path
+    path = table_path(HORIZON_TABLE) if path is None else Path(path)
+    if not path.exists():
+        return 0
+    horizons = [int(c[4:]) for c in table_columns(path)
+                if c.startswith("fwd_") and c[4:].isdigit()]
+    if not horizons:
+        return 0
+
+    calendar = read_table(prices_path, tickers=[], index=True).index
+    start = calendar[max(calendar.searchsorted(pd.Timestamp(first_date)) - max(horizons), 0)]
+    prices = read_table(prices_path, start=start, index=True)
+    rows = stacked_returns(multi_horizon_returns(prices, horizons))
+    if len(rows):
+        upsert_table(rows, path)
+    return len(rows)
+
+
+def run_update(new_prices: pd.DataFrame, state_path=STATE_PATH) -> dict:
+
+    # Append one (or a few) trading days: extend the factor tables, backfill
+    # newly resolved forward returns (both the wide table and the
+    # multi-horizon one) and re-merge only the factor_matrix dates that
+    # changed. The state is saved only after every table write.
+
+    state = IncrementalState.load(state_path)
+    outputs = state.update(new_prices)
+
+    upsert_table(new_prices.rename_axis("Date"), table_path(PRICE_TABLE))
+    for key, name in OUTPUT_TABLES.items():
+        upsert_table(outputs[key].rename_axis("Date"), table_path(name))
+
+    if len(new_prices):
+        update_horizon_returns(new_prices.index.min())
+
+    changed = outputs["forward_returns"].index
+    if len(changed):
+        rows = merge_factor_matrix(*load_inputs(start=changed[0], end=changed[-1]))
+        if len(rows):
+            upsert_table(rows, table_path("factor_matrix"))
+
+    state.save(state_path)
+    print(f"appended {len(new_prices)} day(s) through {state.last_date.date()}")
+    return outputs
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("init", help="seed state from the full price history")
+    upd = sub.add_parser("update", help="append new price rows")
+    upd.add_argument("--prices", required=True,
+                     help="CSV of new rows: Date column + ticker columns")
+    ap.add_argument("--state", default=str(STATE_PATH))
+    args = ap.parse_args()
+
+    if args.command == "init":
+        init_state(args.state)
+    else:
+        new_prices = pd.read_csv(args.prices, index_col="Date", parse_dates=True)
+        run_update(new_prices, args.state)
+
+
+if __name__ == "__main__":
+    main()
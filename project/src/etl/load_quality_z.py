@@ -1,55 +1,81 @@
-import pandas as pd
-from yahooquery import Ticker
-
-# Define tickers
-tickers = ['AAPL', 'AMZN', 'GOOGL', 'JNJ', 'META', 'MSFT', 'NVDA', 'TSLA', 'UNH']
-t = Ticker(tickers)
-
-# Fetch and clean
-df = t.all_financial_data(frequency='a').reset_index()
-quality_df = df[['symbol','asOfDate','NetIncome','StockholdersEquity','TotalDebt']].dropna()
-quality_df['ROE'] = quality_df['NetIncome'] / quality_df['StockholdersEquity']
-quality_df['Leverage'] = quality_df['TotalDebt'] / quality_df['StockholdersEquity']
-quality_df['Quality'] = quality_df['ROE'] - quality_df['Leverage']
-
-# Date formatting and pivot
-quality_df['Date'] = pd.to_datetime(quality_df['asOfDate'])
-quality_df['year'] = quality_df['Date'].dt.year
-pivot = quality_df.pivot(index='year', columns='symbol', values='Quality')
-
-# Daily index and merge
-date_index = pd.date_range(
-    start=f'{pivot.index.min()}-01-01',
-    end=pd.Timestamp.today(),
-    freq='D'
-)
-daily_quality = pd.DataFrame({'Date': date_index})
-daily_quality['year'] = daily_quality['Date'].dt.year
-daily_quality = daily_quality.merge(
-    pivot,
-    how='left',
-    left_on='year',
-    right_index=True
-).drop(columns='year')
-
-# Compute z-scores
-for ticker in tickers:
-    if ticker in daily_quality.columns:
-        daily_quality[f"{ticker}"] = (
-            daily_quality[ticker] - daily_quality[ticker].mean()
-        ) / daily_quality[ticker].std()
-
-# Save full CSV with z-scores
-daily_quality.to_csv("../../data/processed/quality_factor_daily_full.csv", index=False)
-
-# Filter rows where all z-scores are present
-zscore_cols = [f"{ticker}" for ticker in tickers if f"{ticker}" in daily_quality.columns]
-filtered = daily_quality[['Date'] + zscore_cols].dropna()
-
-# Save filtered z-score CSV
-filtered.to_csv("../../data/processed/quality_factor_daily_zscore_only.csv", index=False)
-
-print("Saved both CSVs:")
-print("   - quality_factor_daily_full.csv (full data with z-scores)")
-print("   - quality_factor_daily_zscore_only.csv (filtered rows where all z-scores are present)")
+# Run from project/: python -m src.etl.load_quality_z [--tickers AAPL MSFT ...]
+# or
+#     full, zscores = quality_z(["AAPL", "MSFT"])
 
+import argparse
+
+from src.features.pit import PITStore
+from src.features.standardize import standardize
+from src.utils.fundamentals import ANNUAL_FINANCIALS, get_client
+from src.utils.metrics import timed
+from src.utils.store import read_table, table_path, write_table
+from src.utils.universe import universe_mask
+
+QUALITY_FIELDS = ['NetIncome', 'StockholdersEquity', 'TotalDebt']
+TICKERS = ['AAPL', 'AMZN', 'GOOGL', 'JNJ', 'META', 'MSFT', 'NVDA', 'TSLA', 'UNH']
+
+
+def quality_z(tickers=TICKERS, prices_path=None):
+
+    # Daily quality (ROE - leverage) with its cross-sectional z-scores,
+    # and the rows where every z-score is present
+
+    # Fetch (shared, cached with pb_ratios) and record new or restated filings
+    # in the point-in-time store; filings missing a field are skipped so all
+    # three inputs come from the same statement
+    with timed("fetch") as m:
+        df = get_client().get(tickers, ANNUAL_FINANCIALS)
+        m.add(rows=len(df))
+    with timed("pit_ingest") as m:
+        store = PITStore()
+        added = store.ingest(df.dropna(subset=QUALITY_FIELDS), QUALITY_FIELDS)
+        m.add(rows=added)
+    print(f"Point-in-time store: {added} new records, {len(store.records)} total")
+
+    # Values as known on each trading day (reporting lag applied), instead of
+    # a fiscal year's number spread over every calendar day of that year
+    with timed("pit_asof") as m:
+        dates = read_table(prices_path or table_path("r1000_cleaned_close_prices"),
+                           tickers=[], index=True).index
+        fields = store.asof_frames(QUALITY_FIELDS, dates, tickers)
+        m.add(rows=len(dates))
+    roe = fields['NetIncome'] / fields['StockholdersEquity']
+    leverage = fields['TotalDebt'] / fields['StockholdersEquity']
+    daily_quality = (roe - leverage).rename_axis('Date').reset_index()
+
+    # Compute cross-sectional z-scores per date (no per-ticker loop, and no
+    # full-history mean/std leaking future filings into past dates) over
+    # each date's index members, when the universe files exist
+    quality_cols = [ticker for ticker in tickers if ticker in daily_quality.columns]
+    with timed("standardize") as m:
+        daily_quality[quality_cols] = standardize(daily_quality[quality_cols].to_numpy(dtype=float),
+                                                  mask=universe_mask(roe[quality_cols]))
+        m.count(daily_quality[quality_cols])
+
+    # Filter rows where all z-scores are present
+    zscore_cols = [f"{ticker}" for ticker in tickers if f"{ticker}" in daily_quality.columns]
+    filtered = daily_quality[['Date'] + zscore_cols].dropna()
+    return daily_quality, filtered
+
+
+@timed("load_quality_z")
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", nargs="*", default=TICKERS)
+    ap.add_argument("--prices", default=str(table_path("r1000_cleaned_close_prices")))
+    args = ap.parse_args()
+
+    daily_quality, filtered = quality_z(args.tickers, args.prices)
+
+    # Save full table with z-scores, and the filtered z-score table
+    write_table(daily_quality, table_path("quality_factor_daily_full"))
+    write_table(filtered, table_path("quality_factor_daily_zscore_only"))
+
+    print("Saved both tables:")
+    print("   - quality_factor_daily_full.parquet (full data with z-scores)")
+    print("   - quality_factor_daily_zscore_only.parquet (filtered rows where all z-scores are present)")
+    get_client().report()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,57 @@
-import pandas as pd
+# Run from project/: python -m src.etl.merge
 
-# Load wide-format CSVs (tickers as columns, daily dates as rows)
-quality = pd.read_csv("../../data/processed/quality_factor_daily_zscore_only.csv")
-value   = pd.read_csv("../../data/processed/value_factor_z.csv")
-prices  = pd.read_csv("../../data/processed/r1000_cleaned_close_prices.csv")
-returns = pd.read_csv("../../data/processed/forward_returns.csv")
+from src.utils.metrics import timed
+from src.utils.panel import Panel
+from src.utils.store import read_table, table_path, write_table
 
-# Reshape to long format
-quality = quality.melt(id_vars="Date", var_name="ticker", value_name="quality_z")
-value   = value.melt(id_vars="Date", var_name="ticker", value_name="value_z")
-prices  = prices.melt(id_vars="Date", var_name="ticker", value_name="price")
-returns = returns.melt(id_vars="Date", var_name="ticker", value_name="fwd_return")
+FACTOR_MATRIX_INPUTS = {
+    "quality_z":  "quality_factor_daily_zscore_only",
+    "value_z":    "value_factor_z",
+    "price":      "r1000_cleaned_close_prices",
+    "fwd_return": "forward_returns",
+}
 
-# Standardize formatting
-for df_ in [quality, value, prices, returns]:
-    df_["ticker"] = df_["ticker"].str.upper()
-    df_["Date"] = pd.to_datetime(df_["Date"])
 
-# Merge all on ['Date', 'ticker']
-df = (
-    quality
-    .merge(value, on=["Date", "ticker"])
-    .merge(prices, on=["Date", "ticker"])
-    .merge(returns, on=["Date", "ticker"])
-)
+@timed()
+def merge_factor_matrix(quality, value, prices, returns):
 
-# Drop rows with missing data
-df = df.dropna()
+    # quality / value / prices / returns: wide tables (Date column,
+    # tickers as columns). Returns the long factor matrix.
 
+    # Align all four on one shared date index / asset dictionary instead
+    # of melting each to long format and merging on string keys
+    panel = Panel.from_frames(
+        {"quality_z": quality, "value_z": value, "price": prices, "fwd_return": returns},
+        how="intersection",
+    )
 
-# Rename columns to match convention
-df = df.rename(columns={"Date": "date", "ticker": "asset"})
+    # Only complete (date, asset) rows, exported once
+    df = panel.to_long(dropna=True)
+    df["asset"] = df["asset"].astype(str)
 
-# Reorder columns: [date, asset, z-scored factors, price, forward return]
-df = df[["date", "asset", "quality_z", "value_z", "price", "fwd_return"]]
+    # Columns: [date, asset, z-scored factors, price, forward return]
+    return df[["date", "asset", "quality_z", "value_z", "price", "fwd_return"]]
 
-# Save to CSV
-df.to_csv("../../data/processed/factor_matrix.csv", index=False)
-print("Saved to data/processed/factor_matrix.csv") 
 
+@timed()
+def load_inputs(start=None, end=None):
 
+    # Read the four wide inputs, optionally only for a date range (used by
+    # the incremental update to re-merge just the dates that changed).
 
+    return [read_table(table_path(name), start=start, end=end)
+            for name in FACTOR_MATRIX_INPUTS.values()]
+
+
+@timed("merge")
+def main():
+    df = merge_factor_matrix(*load_inputs())
+
+    # Save to Parquet
+    with timed("write"):
+        out = write_table(df, table_path("factor_matrix"))
+    print(f"Saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
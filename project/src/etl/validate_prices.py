@@ -1,11 +1,364 @@
+# Run from project/: python -m src.etl.validate_prices [--raw PATH] [--memory-budget 256MB]
+
+# Streaming price validation (docs/validation_plan.md).
+
+# The raw wide CSV (Date, one close column per ticker) is never loaded
+# whole. It is read in date chunks sized from a memory budget, twice over:
+
+#     scan   - one vectorized pass per chunk collects each ticker's
+#              listed span and NaN count, gap runs, split-like jumps and
+#              stale (unchanged) prices, carrying the last valid row /
+#              price across chunk boundaries; the parsed chunks are
+#              spilled to a temporary binary file so the CSV is parsed
+#              only once
+#     repair - tickers over the NaN limit are dropped; gaps of at most
+#              MAX_GAP rows are forward-filled (back-filled at the start
+#              of the file); rows still holding a NaN inside a ticker's
+#              listed span are dropped. Chunks look MAX_GAP rows ahead
+#              in the spill and carry the last valid price, so a gap
+#              straddling two chunks is repaired exactly as in one pass.
+
+# NaNs before a ticker's first or after its last price are listings and
+# delistings, not missing data: they neither count towards the NaN ratio
+# nor trigger row drops. Jumps and stale prices are flagged, not changed.
+# Every decision is written to the audit trail (utils/logger).
+
+
+from pathlib import Path
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from src.utils.logger import append_audit_records, append_validation_entry
+from src.utils.metrics import timed
+from src.utils.parallel import parse_bytes
+from src.utils.store import RAW_EQUITY_DIR, TableWriter, table_path
+
+RAW_PRICES = RAW_EQUITY_DIR / "r1000_close_prices.csv"
+
+MAX_NAN_RATIO = 0.05    # drop a ticker above this share of NaNs in its listed span
+MAX_GAP = 3             # longest gap (trading days) repaired by ffill / bfill
+JUMP_RATIO = 1.45       # close-to-close ratio flagged as split-like (3:2 and up)
+STALE_DAYS = 5          # rows without a price change flagged as stale
+DEFAULT_BUDGET = "256MB"
+
+# float64-sized working arrays per cell of a chunk in the scan
+OVERHEAD = 12
+
+# Bytes of parser memory (read-ahead blocks, column builders, converted
+# batches) per byte of CSV text in a block
+PARSE_OVERHEAD = 32
+
+
+def chunk_rows(n_columns: int, memory_budget=DEFAULT_BUDGET) -> int:
+    per_row = max(n_columns, 1) * 8 * OVERHEAD
+    return max(parse_bytes(memory_budget) // per_row, 4 * MAX_GAP)
+
+
+def read_header(raw_path) -> tuple:
+    columns = pd.read_csv(raw_path, nrows=0).columns
+    return columns[0], [str(c) for c in columns[1:]]
+
+
+def read_chunks(raw_path, memory_budget=DEFAULT_BUDGET):
+
+    # (dates, (rows, tickers) float64 values) per block of the raw CSV,
+    # parsed by pyarrow's streaming reader (exactly rounded floats, unlike
+    # pandas' default parser); the text block size keeps the parser's
+    # memory within the budget
+
+    date_col, tickers = read_header(raw_path)
+    types = {date_col: pa.timestamp("ns"), **{t: pa.float64() for t in tickers}}
+    reader = pacsv.open_csv(
+        raw_path,
+        read_options=pacsv.ReadOptions(
+            block_size=max(parse_bytes(memory_budget) // PARSE_OVERHEAD, 1 << 16)),
+        convert_options=pacsv.ConvertOptions(column_types=types),
+    )
+    for batch in reader:
+        dates = pd.DatetimeIndex(batch.column(0).to_numpy(zero_copy_only=False))
+        values = np.empty((batch.num_rows, len(tickers)))
+        for i in range(len(tickers)):
+            values[:, i] = batch.column(i + 1).to_numpy(zero_copy_only=False)
+        yield dates, values
+
+
+def _last_valid(valid, rows, carry):
+
+    # Row of the last valid value at or before each cell (carry: the last
+    # valid row before the block, -1 if none)
+
+    return np.maximum(np.maximum.accumulate(np.where(valid, rows[:, None], -1), axis=0),
+                      carry)
+
+
+def _ffilled(values, last_row, start, carry_price):
+
+    # Price at each cell's last valid row (carry_price when that row is
+    # before the block)
+
+    local = last_row - start
+    taken = np.take_along_axis(values, np.maximum(local, 0), axis=0)
+    return np.where(local >= 0, taken, carry_price)
+
+
+# --------------------------------------------------------------------- #
+# Pass 1: scan
+# --------------------------------------------------------------------- #
+def scan(raw_path, spill_path, memory_budget=DEFAULT_BUDGET,
+         jump_ratio: float = JUMP_RATIO, stale_days: int = STALE_DAYS) -> dict:
+
+    # Per-ticker statistics of the raw file plus jump / stale events (as
+    # (column, row, ...) tuples); chunk values are appended to spill_path.
+
+    date_col, tickers = read_header(raw_path)
+    n = len(tickers)
+    state = {
+        "n_valid": np.zeros(n, dtype=np.int64),
+        "first_valid": np.full(n, -1, dtype=np.int64),
+        "last_valid": np.full(n, -1, dtype=np.int64),
+        "last_price": np.full(n, np.nan),
+        "last_change": np.full(n, -1, dtype=np.int64),
+        "short_gaps": np.zeros(n, dtype=np.int64),
+        "long_gaps": np.zeros(n, dtype=np.int64),
+        "max_gap": np.zeros(n, dtype=np.int64),
+    }
+    jumps, stale, dates = [], [], []
+
+    start, chunks = 0, 0
+    with open(spill_path, "wb") as spill:
+        for chunk_dates, values in read_chunks(raw_path, memory_budget):
+            if (len(dates) and chunk_dates[0] <= dates[-1][-1]) \
+                    or not chunk_dates.is_monotonic_increasing or chunk_dates.has_duplicates:
+                raise ValueError(f"{raw_path} is not sorted by strictly increasing date")
+            dates.append(chunk_dates)
+            values.tofile(spill)
+
+            rows = start + np.arange(len(values))
+            valid = ~np.isnan(values)
+            last_row = _last_valid(valid, rows, state["last_valid"])
+            price = _ffilled(values, last_row, start, state["last_price"])
+            prev_row = np.vstack([state["last_valid"][None], last_row[:-1]])
+            prev_price = np.vstack([state["last_price"][None], price[:-1]])
+            has_prev = valid & (prev_row >= 0)
+
+            # Gap runs, measured when the next price arrives
+            gap = np.where(has_prev, rows[:, None] - prev_row - 1, 0)
+            state["short_gaps"] += ((gap > 0) & (gap <= MAX_GAP)).sum(axis=0)
+            state["long_gaps"] += (gap > MAX_GAP).sum(axis=0)
+            state["max_gap"] = np.maximum(state["max_gap"], gap.max(axis=0))
+
+            # Split-like jumps against the previous valid close
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = values / prev_price
+            jump = has_prev & ((ratio >= jump_ratio) | (ratio <= 1.0 / jump_ratio))
+            for r, c in zip(*np.nonzero(jump)):
+                jumps.append((c, start + r, ratio[r, c]))
+
+            # Stale prices: rows since the last change, flagged once when
+            # they reach stale_days
+            same = has_prev & (values == prev_price)
+            last_change = np.maximum(
+                np.maximum.accumulate(np.where(valid & ~same, rows[:, None], -1), axis=0),
+                state["last_change"])
+            crossed = same & (rows[:, None] - last_change >= stale_days) \
+                & (prev_row - last_change < stale_days)
+            for r, c in zip(*np.nonzero(crossed)):
+                stale.append((c, last_change[r, c], start + r))
+
+            state["n_valid"] += valid.sum(axis=0)
+            new = (state["first_valid"] < 0) & valid.any(axis=0)
+            state["first_valid"][new] = start + valid.argmax(axis=0)[new]
+            state["last_valid"] = last_row[-1]
+            state["last_price"] = price[-1]
+            state["last_change"] = last_change[-1]
+            start += len(values)
+            chunks += 1
+
+    state.update(date_col=date_col, tickers=tickers, jumps=jumps, stale=stale,
+                 chunks=chunks,
+                 dates=dates[0].append(dates[1:]) if dates else pd.DatetimeIndex([]))
+    return state
+
+
+# --------------------------------------------------------------------- #
+# Pass 2: repair
+# --------------------------------------------------------------------- #
+def repair(spill_path, stats: dict, keep: np.ndarray, writer: TableWriter,
+           rows_per_chunk: int, max_gap: int = MAX_GAP, residual: str = "rows") -> dict:
+
+    # keep: column positions of the tickers that survive the NaN rule.
+    # residual: "rows" drops rows with an unrepaired NaN inside a listed
+    # span (the plan's rule), "keep" leaves those cells NaN.
+
+    dates = stats["dates"]
+    n_rows, n_cols = len(dates), len(stats["tickers"])
+    first, last = stats["first_valid"][keep], stats["last_valid"][keep]
+
+    def read_rows(lo, hi):
+
+        # Spill rows [lo, hi), kept columns only; read rather than mapped so
+        # no more than one block is ever resident
+        block = np.fromfile(spill_path, dtype=np.float64, count=(hi - lo) * n_cols,
+                            offset=lo * n_cols * 8)
+        return block.reshape(hi - lo, n_cols)[:, keep]
+
+    first_price = np.array([read_rows(r, r + 1)[0, i] if r >= 0 else np.nan
+                            for i, r in enumerate(first)])
+    columns = [stats["tickers"][c] for c in keep]
+
+    carry_row = np.full(len(keep), -1, dtype=np.int64)
+    carry_price = np.full(len(keep), np.nan)
+    filled = np.zeros(len(keep), dtype=np.int64)
+    residual_cells = np.zeros(len(keep), dtype=np.int64)
+    dropped_rows = []
+
+    for start in range(0, n_rows, rows_per_chunk):
+        stop = min(start + rows_per_chunk, n_rows)
+        ahead = min(stop + max_gap, n_rows)
+        block = read_rows(start, ahead)
+        rows = np.arange(start, ahead)
+        valid = ~np.isnan(block)
+        last_row = _last_valid(valid, rows, carry_row)
+        price = _ffilled(block, last_row, start, carry_price)
+        next_row = np.minimum.accumulate(np.where(valid, rows[:, None], n_rows)[::-1],
+                                         axis=0)[::-1]
+
+        # Only the first stop - start rows are decided here; the look-ahead
+        # rows just close gaps that run past the chunk boundary
+        k = stop - start
+        out, valid, t = block[:k], valid[:k], rows[:k, None]
+        last_row, price, next_row = last_row[:k], price[:k], next_row[:k]
+        leading, trailing = t < first, t > last
+        interior = ~valid & ~leading & ~trailing
+        fill_forward = (interior & (next_row - last_row - 1 <= max_gap)) \
+            | (~valid & trailing & (n_rows - 1 - last <= max_gap))
+        fill_back = ~valid & leading & (first <= max_gap)
+        out[fill_forward] = price[fill_forward]
+        out[fill_back] = np.broadcast_to(first_price, out.shape)[fill_back]
+        unrepaired = interior & ~fill_forward
+
+        filled += (fill_forward | fill_back).sum(axis=0)
+        residual_cells += unrepaired.sum(axis=0)
+        drop = unrepaired.any(axis=1) if residual == "rows" else np.zeros(k, dtype=bool)
+        dropped_rows.extend(dates[start:stop][drop])
+
+        frame = pd.DataFrame(out[~drop], index=dates[start:stop][~drop], columns=columns)
+        writer.write(frame.rename_axis(stats["date_col"]))
+        carry_row, carry_price = last_row[-1], price[-1]
+
+    return {"filled": filled, "residual_cells": residual_cells,
+            "dropped_rows": pd.DatetimeIndex(dropped_rows)}
+
+
+# --------------------------------------------------------------------- #
+# Driver
+# --------------------------------------------------------------------- #
+@timed()
+def validate_prices(raw_path=RAW_PRICES,
+                    out_path=None,
+                    memory_budget=DEFAULT_BUDGET,
+                    max_nan_ratio: float = MAX_NAN_RATIO,
+                    max_gap: int = MAX_GAP,
+                    residual: str = "rows",
+                    audit: bool = True) -> dict:
+
+    # Validate raw_path into the cleaned price table at out_path (default
+    # the r1000_cleaned_close_prices table). Returns a summary dict with
+    # the dropped tickers / rows and the audit records.
+
+    started = time.perf_counter()
+    out_path = table_path("r1000_cleaned_close_prices") if out_path is None else out_path
+    rows_per_chunk = chunk_rows(len(read_header(raw_path)[1]), memory_budget)
+
+    fd, spill_path = tempfile.mkstemp(suffix=".f64", dir=Path(out_path).parent
+                                      if Path(out_path).parent.exists() else None)
+    os.close(fd)
+    try:
+        with timed("scan") as m:
+            stats = scan(raw_path, spill_path, memory_budget)
+            m.add(rows=len(stats["dates"]), nans=int((len(stats["dates"]) - stats["n_valid"]).sum()),
+                  chunks=stats["chunks"])
+        tickers = stats["tickers"]
+        span = stats["last_valid"] - stats["first_valid"] + 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            nan_ratio = np.where(stats["n_valid"] > 0, 1.0 - stats["n_valid"] / span, 1.0)
+        keep = np.flatnonzero(nan_ratio <= max_nan_ratio)
+        with timed("repair") as m, TableWriter(out_path) as writer:
+            repaired = repair(spill_path, stats, keep, writer, rows_per_chunk,
+                              max_gap, residual)
+            clean_rows = writer.rows
+            m.add(rows=clean_rows, nans=int(repaired["residual_cells"].sum()),
+                  filled=int(repaired["filled"].sum()))
+    finally:
+        os.remove(spill_path)
+
+    dates = stats["dates"]
+    dropped = [tickers[c] for c in np.flatnonzero(nan_ratio > max_nan_ratio)]
+    records = [{"check": "missing", "ticker": tickers[c], "nan_ratio": round(nan_ratio[c], 6),
+                "action": "drop_ticker"} for c in np.flatnonzero(nan_ratio > max_nan_ratio)]
+    for i, c in enumerate(keep):
+        if stats["short_gaps"][c] or stats["long_gaps"][c] or repaired["filled"][i]:
+            records.append({"check": "gaps", "ticker": tickers[c],
+                            "short_gaps": stats["short_gaps"][c],
+                            "long_gaps": stats["long_gaps"][c],
+                            "max_gap": stats["max_gap"][c],
+                            "filled": repaired["filled"][i],
+                            "unrepaired": repaired["residual_cells"][i]})
+    records += [{"check": "jump", "ticker": tickers[c], "date": dates[r],
+                 "ratio": round(ratio, 6), "action": "flag"}
+                for c, r, ratio in stats["jumps"]]
+    records += [{"check": "stale", "ticker": tickers[c], "since": dates[since],
+                 "date": dates[r], "action": "flag"}
+                for c, since, r in stats["stale"]]
+    rows_dropped = repaired["dropped_rows"]
+    records.append({"check": "residual_rows", "rows": len(rows_dropped),
+                    "first": rows_dropped.min() if len(rows_dropped) else None,
+                    "last": rows_dropped.max() if len(rows_dropped) else None,
+                    "action": "drop_rows" if residual == "rows" else "keep"})
+    summary = {"check": "summary", "source": str(raw_path), "out": str(out_path),
+               "raw_shape": [len(dates), len(tickers)], "clean_shape": [clean_rows, len(keep)],
+               "chunks": stats["chunks"], "rows_per_chunk": rows_per_chunk,
+               "seconds": round(time.perf_counter() - started, 3)}
+    records.append(summary)
+
+    if audit:
+        append_validation_entry((len(dates), len(tickers)), (clean_rows, len(keep)), dropped,
+                                nulls=int(repaired["residual_cells"].sum()))
+        append_audit_records(records)
+
+    return {"out": Path(out_path), "dropped_tickers": dropped, "dropped_rows": rows_dropped,
+            "rows": clean_rows, "records": records}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--raw", default=str(RAW_PRICES))
+    ap.add_argument("--out", default=str(table_path("r1000_cleaned_close_prices")))
+    ap.add_argument("--memory-budget", default=DEFAULT_BUDGET,
+                    help="working memory for a chunk, e.g. 256MB")
+    ap.add_argument("--max-nan-ratio", type=float, default=MAX_NAN_RATIO)
+    ap.add_argument("--max-gap", type=int, default=MAX_GAP)
+    ap.add_argument("--residual", choices=["rows", "keep"], default="rows",
+                    help="drop rows with unrepaired gaps, or keep them as NaN")
+    ap.add_argument("--no-audit", action="store_true")
+    args = ap.parse_args()
 
-df = pd.read_csv("/Users/raunaksood/Documents/r1000-ls-strategy/project/data/raw/equity/r1000_close_prices.csv")
+    result = validate_prices(args.raw, args.out, args.memory_budget, args.max_nan_ratio,
+                             args.max_gap, args.residual, audit=not args.no_audit)
+    summary = result["records"][-1]
+    print(f"raw {tuple(summary['raw_shape'])} -> clean {tuple(summary['clean_shape'])} "
+          f"({summary['chunks']} read blocks, repaired {summary['rows_per_chunk']} rows at a time)")
+    print(f"dropped tickers: {result['dropped_tickers']}")
+    print(f"dropped rows: {len(result['dropped_rows'])}")
+    print(f"Saved to {result['out']}")
 
-# remove columns where null is more than 5 percent
-limit_per = len(df) * 0.05
-df = df.dropna(thresh=limit_per, axis=1)
-print(df.head())
 
-df.to_csv("/Users/raunaksood/Documents/r1000-ls-strategy/project/data/processed/r1000_cleaned_close_prices.csv")
-print("Saved to r1000_cleaned_close_prices.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+
+# Point-in-time as-of join.
+
+# Aligns sparse, irregularly dated fundamentals (long format:
+# ticker, asOfDate, value) onto a daily price calendar for the whole
+# panel in one sorted / searchsorted pass instead of a per-date,
+# per-ticker loop.
+
+# A filing only becomes visible `lag_days` calendar days after its
+# asOfDate (fiscal period end), so the output never uses a number
+# before it would realistically have been published.
+
+
+import pandas as pd
+import numpy as np
+
+
+def asof_join(fundamentals: pd.DataFrame,
+              dates,
+              tickers=None,
+              lag_days: int = 0,
+              value_col: str = "value",
+              ticker_col: str = "ticker",
+              date_col: str = "asOfDate") -> pd.DataFrame:
+
+    # fundamentals: long table with one row per (ticker, asOfDate) filing
+    # dates:        trading calendar to align onto (any sortable dates)
+    # tickers:      output columns; defaults to every ticker in fundamentals
+    # lag_days:     reporting lag added to asOfDate before a value is usable
+
+    # Returns a date x ticker frame holding, for each date, the most recent
+    # value whose availability date is on or before that date (NaN before
+    # the first filing).
+
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).sort_values()
+    if tickers is None:
+        tickers = pd.unique(fundamentals[ticker_col])
+    tickers = pd.Index(tickers)
+
+    n_dates, n_tickers = len(dates), len(tickers)
+    out = np.full((n_dates, n_tickers), np.nan)
+    if n_dates == 0 or n_tickers == 0 or len(fundamentals) == 0:
+        return pd.DataFrame(out, index=dates, columns=tickers)
+
+    values = fundamentals[value_col].to_numpy(dtype=float)
+    codes = tickers.get_indexer(fundamentals[ticker_col])
+    available = (pd.to_datetime(fundamentals[date_col])
+                 + pd.Timedelta(days=lag_days)).to_numpy()
+
+    # Drop unknown tickers and empty filings up front
+    keep = (codes >= 0) & ~np.isnan(values) & ~pd.isna(available)
+    values, codes, available = values[keep], codes[keep], available[keep]
+
+    # First trading date on which each filing is visible
+    rows = np.searchsorted(dates.to_numpy(), available, side="left")
+    on_calendar = rows < n_dates
+    values, codes, rows, available = (
+        values[on_calendar], codes[on_calendar],
+        rows[on_calendar], available[on_calendar],
+    )
+
+    # Several filings can land on the same (row, ticker) cell, e.g. all
+    # history before the first price date; keep the latest one.
+    order = np.lexsort((available, rows, codes))
+    codes, rows, values = codes[order], rows[order], values[order]
+    last = np.ones(len(codes), dtype=bool)
+    last[:-1] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+    codes, rows, values = codes[last], rows[last], values[last]
+
+    out[rows, codes] = values
+
+    # Forward-fill each column from its last event row
+    has_event = np.zeros((n_dates, n_tickers), dtype=bool)
+    has_event[rows, codes] = True
+    last_row = np.where(has_event, np.arange(n_dates)[:, None], 0)
+    np.maximum.accumulate(last_row, axis=0, out=last_row)
+    filled = out[last_row, np.arange(n_tickers)]
+    filled[~np.logical_or.accumulate(has_event, axis=0)] = np.nan
+
+    return pd.DataFrame(filled, index=dates, columns=tickers)
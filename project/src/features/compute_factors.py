@@ -8,26 +8,34 @@
 import pandas as pd
 import numpy as np
 
+from src.features.ewma import EWMAEstimator
+from src.features.rolling import RollingPanel
+from src.features.standardize import standardize_frames
+from src.features.technical import TechnicalPanel
+from src.utils.parallel import map_columns
+from src.utils.metrics import timed
+
 # --------------------------------------------------------------------- #
 # Momentum (12-1)
 # --------------------------------------------------------------------- #
+@timed()
 def momentum(prices: pd.DataFrame,
              lookback: int = 252,
-             skip: int = 21) -> pd.DataFrame:
+             skip: int = 21,
+             workers: int = 1,
+             memory_budget="1GB") -> pd.DataFrame:
     # 12-month total return minus most recent 1-month return.
 
     # subtract one month to prevent recent spikes from affecting mean
 
-    prices = prices.sort_index()
-
-    # Log returns: r_t = log(P_t / P_{t-d})
-    long_return = np.log(prices / prices.shift(lookback))
-    short_return = np.log(prices / prices.shift(skip))
-
-    momentum_signal = long_return - short_return
-
-    # Lag 1 day to avoid lookahead bias
-    return momentum_signal.shift(1)
+    # log(P_t / P_{t-lookback}) - log(P_t / P_{t-skip}), lagged 1 day to
+    # avoid lookahead bias. To sweep several (lookback, skip) pairs build
+    # one RollingPanel and call .momentum() on it per pair. workers > 1
+    # shards the tickers across processes (utils/parallel.py).
+    if workers > 1:
+        return map_columns(momentum, prices, workers=workers, memory_budget=memory_budget,
+                           lookback=lookback, skip=skip)
+    return RollingPanel(prices).momentum(lookback, skip, lag=1)
 
 
 # --------------------------------------------------------------------- #
@@ -43,6 +51,7 @@ def value(book_to_price: pd.DataFrame) -> pd.DataFrame:
 # --------------------------------------------------------------------- #
 # Size (market-cap)
 # --------------------------------------------------------------------- #
+@timed()
 def size(mkt_cap: pd.DataFrame) -> pd.DataFrame:
 
     # Inverse so that SMALLER firms → larger positive signal.
@@ -57,8 +66,10 @@ def size(mkt_cap: pd.DataFrame) -> pd.DataFrame:
 # --------------------------------------------------------------------- #
 # Quality (ROE – leverage)
 # --------------------------------------------------------------------- #
+@timed()
 def quality(roe: pd.DataFrame,
-            d2a: pd.DataFrame) -> pd.DataFrame:
+            d2a: pd.DataFrame,
+            universe=None) -> pd.DataFrame:
     
     #Composite: high ROE, low leverage.
 
@@ -67,29 +78,87 @@ def quality(roe: pd.DataFrame,
     # quality factor finds comapanies that are profit efficient and 
     # low debt while punishing low roe and high debt 
 
-    return roe.rank(axis=1, pct=True) - d2a.rank(axis=1, pct=True)
+    # both cross-sectional percentile ranks come from one stacked pass,
+    # among the index members of each date when a universe is given
+    ranks = standardize_frames({"roe": roe, "d2a": d2a}, method="rank",
+                               universe=universe)
+    return ranks["roe"] - ranks["d2a"]
 
 
 # --------------------------------------------------------------------- #
 # Volatility (1-Y σ)
 # --------------------------------------------------------------------- #
+@timed()
 def low_vol(prices: pd.DataFrame,
-            window: int = 252) -> pd.DataFrame:
+            window: int = 252,
+            halflife: float = None,
+            workers: int = 1,
+            memory_budget="1GB") -> pd.DataFrame:
     
     # Lower σ => stronger signal. so a big stddev of %change will mean 
     # more "wobbly", so make it negative so it pushes this type of stock
     # to the bottom of the list, go short.
-    prices = prices.sort_index()
-    log_returns = np.log(prices / prices.shift(1))
-    rolling_vol = log_returns.rolling(window=window, min_periods=window).std()
-    return -rolling_vol.shift(1)  # lag to prevent leakage
+    # Rolling std of daily log returns, lagged 1 day to prevent leakage.
+    # With a halflife, an exponentially weighted std instead (needs
+    # `halflife` observations; same estimator the daily beta updates use).
+    # workers > 1 shards the tickers across processes (utils/parallel.py).
+    if workers > 1:
+        return map_columns(low_vol, prices, workers=workers, memory_budget=memory_budget,
+                           window=window, halflife=halflife)
+    if halflife is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_returns = np.log(prices.sort_index()).diff()
+        estimator = EWMAEstimator(prices.columns, halflife=halflife,
+                                  min_periods=int(halflife))
+        return -estimator.update(log_returns)["volatility"].shift(1)
+    rolling_vol = RollingPanel(prices).volatility(window, min_periods=window, lag=1)
+    return -rolling_vol
 
 
 # --------------------------------------------------------------------- #
-# Sentiment (placeholder for NLP scores)
+# Technical (RSI, MACD, MA crossovers)
 # --------------------------------------------------------------------- #
-def sentiment(nlp_scores: pd.DataFrame) -> pd.DataFrame:
+@timed()
+def rsi(prices: pd.DataFrame, window: int = 14) -> pd.DataFrame:
+
+    # Wilder RSI, lagged 1 day. Used for entry timing / position scaling
+    # rather than ranking, so it keeps its 0-100 scale.
+    # For a parameter grid build one TechnicalPanel and call .grid().
+    return TechnicalPanel(prices).rsi(window, lag=1)
+
+
+@timed()
+def macd(prices: pd.DataFrame, fast: int = 12, slow: int = 26,
+         signal: int = 9) -> pd.DataFrame:
+
+    # MACD histogram (line - signal line) of log prices, lagged 1 day.
+    # Positive while the short-term trend is accelerating.
+    return TechnicalPanel(prices).macd(fast, slow, signal, lag=1)["histogram"]
+
+
+@timed()
+def ma_crossover(prices: pd.DataFrame, fast: int = 50, slow: int = 200,
+                 kind: str = "sma") -> pd.DataFrame:
+
+    # Fast minus slow moving average of log prices, lagged 1 day.
+    # Positive above the crossover (golden cross), negative below.
+    return TechnicalPanel(prices).ma_crossover(fast, slow, kind, lag=1)
+
+
+# --------------------------------------------------------------------- #
+# Sentiment (NLP scores)
+# --------------------------------------------------------------------- #
+def sentiment(nlp_scores, prices: pd.DataFrame = None, halflife: float = 21,
+              **project_kw) -> pd.DataFrame:
     
     # Higher positive language => stronger long signal.
-    
+
+    # A dense date x ticker frame passes through; a SentimentStore of
+    # scored events is projected onto the prices' calendar and columns
+    # (decayed with `halflife`, see features/sentiment.py).
+    if hasattr(nlp_scores, "project"):
+        if prices is None:
+            raise ValueError("projecting sentiment events needs the prices calendar")
+        return nlp_scores.project(prices.index, prices.columns, halflife=halflife,
+                                  **project_kw)
     return nlp_scores
\ No newline at end of file
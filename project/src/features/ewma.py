@@ -0,0 +1,229 @@
+
+# Incremental exponentially weighted moments.
+
+# Keeps, per asset, the running exponentially weighted mean and second
+# moments of its daily returns and of their co-movement with a benchmark
+# (and optionally K factor returns), so each new trading day costs O(N)
+# (O(N K) with factors) instead of recomputing a rolling covariance over
+# the whole window:
+
+#     volatility - EW standard deviation of each asset's returns
+#     beta       - EW cov(asset, benchmark) / EW var(benchmark)
+#     factor_cov - (K, K) EW covariance of the factor returns
+#     factor_betas - (N, K) loadings of each asset on the factors
+
+# Updates follow West's weighted incremental algorithm (decay the sums,
+# then add the new deviation), which avoids the cancellation of
+# sum-of-squares formulas. Weights match pandas ewm(halflife, adjust=True,
+# ignore_na=False) with bias correction: a missing return decays its
+# asset's weights without adding an observation. A day without a
+# benchmark (or factor) return counts as missing for every asset.
+
+# The state checkpoints to .npz like etl.incremental.IncrementalState;
+# resuming from a checkpoint gives exactly the floats of an unbroken run.
+
+# Usage:
+#     est = EWMAEstimator(returns.columns, halflife=63)
+#     out = est.update(returns)             # history, or just the new days
+#     out["beta"], out["volatility"]
+#     est.save(path); est = EWMAEstimator.load(path)
+
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.utils.store import PROJECT_DIR
+
+STATE_PATH = PROJECT_DIR / "data" / "state" / "ewma.npz"
+
+# Per-asset state arrays, shape (N,) unless noted
+ASSET_STATE = ("weight", "weight_sq", "count", "mean", "mean_bench",
+               "m_xx", "m_bb", "m_xb")
+FACTOR_STATE = ("mean_factor_pair", "m_xf")     # (N, K)
+COMMON_STATE = ("f_weight", "f_weight_sq", "f_mean", "f_m")   # scalar, scalar, (K,), (K, K)
+
+
+def _mean_or_nan(x: np.ndarray) -> float:
+    valid = x[~np.isnan(x)]
+    return valid.mean() if len(valid) else np.nan
+
+
+class EWMAEstimator:
+
+    def __init__(self, assets, halflife: float = 63, min_periods: int = 20,
+                 n_factors: int = 0, dtype=np.float64, last_date=None, **state):
+        self.assets = pd.Index(assets)
+        self.halflife = halflife
+        self.decay = 0.5 ** (1.0 / halflife)
+        self.min_periods = min_periods
+        self.n_factors = n_factors
+        self.dtype = np.dtype(dtype)
+        self.last_date = None if last_date is None else pd.Timestamp(last_date)
+
+        n, k = len(self.assets), n_factors
+        shapes = {name: (n,) for name in ASSET_STATE}
+        shapes.update({name: (n, k) for name in FACTOR_STATE})
+        shapes.update(f_weight=(), f_weight_sq=(), f_mean=(k,), f_m=(k, k))
+        for name, shape in shapes.items():
+            setattr(self, name, np.asarray(state[name], dtype=float) if name in state
+                    else np.zeros(shape))
+
+    # ----------------------------------------------------------- update
+    def _step(self, x: np.ndarray, bench: float, factors: np.ndarray) -> None:
+
+        # One trading day. x: (N,) returns, bench: scalar, factors: (K,)
+
+        lam = self.decay
+        day_ok = not np.isnan(bench) and not np.isnan(factors).any()
+        valid = ~np.isnan(x) & day_ok
+
+        self.weight *= lam
+        self.weight += valid
+        self.weight_sq *= lam * lam
+        self.weight_sq += valid
+        self.count += valid
+        for m in (self.m_xx, self.m_bb, self.m_xb, self.m_xf):
+            m *= lam
+
+        # West's update on the valid assets: deviations from the old mean
+        # times deviations from the new one
+        w = np.where(valid, self.weight, 1.0)
+        dx = np.where(valid, x - self.mean, 0.0)
+        db = np.where(valid, bench - self.mean_bench, 0.0)
+        self.mean += dx / w
+        self.mean_bench += db / w
+        new_dx = np.where(valid, x - self.mean, 0.0)
+        new_db = np.where(valid, bench - self.mean_bench, 0.0)
+        self.m_xx += dx * new_dx
+        self.m_bb += db * new_db
+        self.m_xb += dx * new_db
+
+        if self.n_factors and day_ok:
+            df = np.where(valid[:, None], factors - self.mean_factor_pair, 0.0)
+            self.mean_factor_pair += df / w[:, None]
+            self.m_xf += dx[:, None] * (factors - self.mean_factor_pair) * valid[:, None]
+
+            # Common factor moments (every valid day counts)
+            self.f_weight = lam * self.f_weight + 1.0
+            self.f_weight_sq = lam * lam * self.f_weight_sq + 1.0
+            dfc = factors - self.f_mean
+            self.f_mean = self.f_mean + dfc / self.f_weight
+            self.f_m = lam * self.f_m + np.outer(dfc, factors - self.f_mean)
+        elif self.n_factors:
+            self.f_m = lam * self.f_m
+            self.f_weight *= lam
+            self.f_weight_sq *= lam * lam
+
+    def _scale(self) -> np.ndarray:
+
+        # Bias-corrected normaliser W / (W^2 - sum of squared weights);
+        # NaN until min_periods observations
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scale = self.weight / (self.weight ** 2 - self.weight_sq)
+        return np.where(self.count >= max(self.min_periods, 2), scale, np.nan)
+
+    def update(self, returns: pd.DataFrame, benchmark: pd.Series = None,
+               factor_returns: pd.DataFrame = None) -> dict:
+
+        # returns:        wide daily returns for dates after the last one seen
+        # benchmark:      benchmark return per date; default the equal-weighted
+        #                 mean of the available returns
+        # factor_returns: (dates x K) factor returns, if n_factors > 0
+
+        # Returns {"volatility", "beta"}: wide frames for the new dates
+        # (values after including each date), in the estimator's dtype.
+
+        returns = returns.sort_index()
+        dates = pd.DatetimeIndex(returns.index)
+        unknown = returns.columns.difference(self.assets)
+        if len(unknown):
+            raise ValueError(f"assets not in estimator: {list(unknown)}")
+        if self.last_date is not None and len(dates) and dates[0] <= self.last_date:
+            raise ValueError(f"new rows start {dates[0].date()} but state "
+                             f"already covers {self.last_date.date()}")
+
+        x = returns.reindex(columns=self.assets).to_numpy(dtype=float)
+        bench = None if benchmark is None \
+            else pd.Series(benchmark).reindex(dates).to_numpy(dtype=float)
+        if self.n_factors:
+            if factor_returns is None:
+                raise ValueError(f"estimator expects {self.n_factors} factor returns")
+            factors = pd.DataFrame(factor_returns).reindex(dates).to_numpy(dtype=float)
+        else:
+            factors = np.empty((len(dates), 0))
+
+        vol = np.empty(x.shape, dtype=self.dtype)
+        beta = np.empty(x.shape, dtype=self.dtype)
+        for t in range(len(dates)):
+            # Equal-weighted benchmark row by row, so the floats do not
+            # depend on how the history is split into update() calls
+            b = bench[t] if bench is not None else _mean_or_nan(x[t])
+            self._step(x[t], b, factors[t])
+            scale = self._scale()
+            with np.errstate(invalid="ignore", divide="ignore"):
+                vol[t] = np.sqrt(np.maximum(self.m_xx * scale, 0.0))
+                beta[t] = np.where(np.isnan(scale), np.nan, self.m_xb / self.m_bb)
+        if len(dates):
+            self.last_date = dates[-1]
+
+        frame = lambda values: pd.DataFrame(values, index=dates, columns=self.assets)
+        return {"volatility": frame(vol), "beta": frame(beta)}
+
+    # ------------------------------------------------------ current state
+    def volatility(self) -> np.ndarray:
+        with np.errstate(invalid="ignore"):
+            return np.sqrt(np.maximum(self.m_xx * self._scale(), 0.0)).astype(self.dtype)
+
+    def beta(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(np.isnan(self._scale()), np.nan,
+                            self.m_xb / self.m_bb).astype(self.dtype)
+
+    def covariance(self) -> np.ndarray:
+
+        # (N,) EW covariance of each asset with the benchmark
+
+        return (self.m_xb * self._scale()).astype(self.dtype)
+
+    def factor_cov(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scale = self.f_weight / (self.f_weight ** 2 - self.f_weight_sq)
+        return (self.f_m * scale).astype(self.dtype)
+
+    def factor_betas(self) -> np.ndarray:
+
+        # (N, K) regression loadings of each asset on the factors: its EW
+        # cross-covariance times the inverse common factor covariance
+
+        scale = self._scale()
+        cross = self.m_xf * scale[:, None]
+        return (cross @ np.linalg.pinv(self.factor_cov().astype(float))).astype(self.dtype)
+
+    # ------------------------------------------------------ persistence
+    def save(self, path=STATE_PATH) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {name: getattr(self, name)
+                 for name in ASSET_STATE + FACTOR_STATE + COMMON_STATE}
+        np.savez(
+            path,
+            assets=np.asarray(self.assets, dtype=str),
+            params=np.array([self.halflife, self.min_periods, self.n_factors], dtype=float),
+            dtype=np.array([self.dtype.str]),
+            last_date=np.array([str(self.last_date)]),
+            **state,
+        )
+        return path
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        with np.load(path) as f:
+            halflife, min_periods, n_factors = f["params"]
+            last_date = str(f["last_date"][0])
+            state = {name: f[name] for name in ASSET_STATE + FACTOR_STATE + COMMON_STATE}
+            return cls(f["assets"], halflife=float(halflife), min_periods=int(min_periods),
+                       n_factors=int(n_factors), dtype=str(f["dtype"][0]),
+                       last_date=None if last_date == "None" else last_date, **state)
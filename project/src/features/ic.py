@@ -0,0 +1,220 @@
+# Factor IC analytics.
+
+# For every factor x forward-return horizon pair, on every date:
+
+#     ic        - rank IC: Spearman correlation between the factor and the
+#                 forward return across the assets where both are known
+#     quantiles - mean forward return of each factor quantile bucket
+#     spread    - top bucket minus bottom bucket
+
+# and over the whole sample a summary per pair (mean / std / IR / hit
+# rate of the IC, mean quantile returns and spread) plus the IC decay
+# table (mean IC per factor across horizons).
+
+# Nothing is grouped by date on the long factor_matrix: factors and
+# forward returns are (dates x assets) Panel arrays, and each block of
+# dates ranks every pair at once with one standardize(method="rank") call
+# over a (dates, assets, pairs) stack. Ranks are taken on the pair's joint
+# mask, so a name missing its forward return does not shift the factor
+# ranks of the others.
+
+# Usage (from project/):
+#     python -m src.features.ic --quantiles 5
+# or
+#     result = factor_ic(panel, ["quality_z", "value_z"], {21: "fwd_21", 63: "fwd_63"})
+#     result["summary"]; result["decay"]; result["ic"]["value_z", 63]
+
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.etl.compute_forward_returns import horizon_column
+from src.features.standardize import quantile_buckets, standardize
+from src.utils.metrics import timed
+from src.utils.panel import Panel
+from src.utils.store import PROCESSED_DIR, read_table, table_path, write_table
+from src.utils.universe import load_universe
+
+NON_FACTOR_COLS = ("date", "asset", "price", "fwd_return")
+
+
+# --------------------------------------------------------------------- #
+# Kernels (axis 1 = assets, last axis = factor x horizon pairs)
+# --------------------------------------------------------------------- #
+def rank_correlation(x: np.ndarray, y: np.ndarray, min_assets: int):
+
+    # x, y: (B, N, P) with the same NaN mask. Pearson correlation of the
+    # cross-sectional percentile ranks per (date, pair), plus the ranks
+    # of x and the number of assets. NaN below min_assets.
+
+    ranks = standardize(np.concatenate([x, y], axis=-1), method="rank", block=len(x))
+    rx, ry = np.split(ranks, 2, axis=-1)
+    valid = ~np.isnan(rx)
+    n = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Average-tie ranks 1..n always sum to n (n + 1) / 2
+        mean = ((n + 1) / (2 * n))[:, None]
+        dx = np.where(valid, rx - mean, 0.0)
+        dy = np.where(valid, ry - mean, 0.0)
+        ic = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+    ic[n < min_assets] = np.nan
+    return ic, rx, n
+
+
+def quantile_means(ranks: np.ndarray, returns: np.ndarray, n_quantiles: int,
+                   n: np.ndarray, min_assets: int) -> np.ndarray:
+
+    # ranks: (B, N, P) percentile ranks in (0, 1], returns on the same
+    # mask. Mean return of each bucket 1..n_quantiles, bucketed by
+    # ordinal position like backtest.quantile_weights (top and bottom
+    # hold max(n // q, 1) names each), so the top-minus-bottom spread is
+    # the backtest's legs. Returns (B, Q, P).
+
+    bucket = quantile_buckets(ranks, n_quantiles)
+    filled = np.where(np.isnan(returns), 0.0, returns)
+    out = np.empty((len(ranks), n_quantiles, ranks.shape[-1]))
+    for q in range(n_quantiles):
+        members = bucket == q + 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[:, q] = np.where(members, filled, 0.0).sum(axis=1) / members.sum(axis=1)
+    out[np.broadcast_to((n < min_assets)[:, None], out.shape)] = np.nan
+    return out
+
+
+# --------------------------------------------------------------------- #
+# Engine
+# --------------------------------------------------------------------- #
+@timed()
+def factor_ic(panel: Panel, factors, targets: dict, n_quantiles: int = 5,
+              min_assets: int = 5, block: int = 128, universe=None) -> dict:
+
+    # panel:    Panel holding the factor and forward-return fields
+    # factors:  factor field names
+    # targets:  {horizon in days: forward-return field name}
+    # universe: utils/universe.Universe; only each date's index members
+    #           are ranked
+    # block:   dates ranked per vectorized step (bounds memory at about
+    #          block x assets x pairs x 8 floats)
+
+    # Returns {"ic", "spread": date x (factor, horizon) frames,
+    #          "quantiles": date x (factor, horizon, quantile) frame,
+    #          "summary": (factor, horizon) rows, "decay": factor x horizon}
+
+    factors = list(factors)
+    horizons = sorted(targets)
+    pairs = pd.MultiIndex.from_product([factors, horizons], names=["factor", "horizon"])
+    n_dates = len(panel.dates)
+    mask = None if universe is None else universe.mask(panel.dates, panel.assets)
+
+    ic = np.empty((n_dates, len(pairs)))
+    counts = np.empty((n_dates, len(pairs)), dtype=int)
+    quantiles = np.empty((n_dates, n_quantiles, len(pairs)))
+    for start in range(0, n_dates, block):
+        rows = slice(start, start + block)
+        x = np.stack([panel[f][rows] for f, _ in pairs], axis=-1)
+        y = np.stack([panel[targets[h]][rows] for _, h in pairs], axis=-1)
+        joint = np.isnan(x) | np.isnan(y)
+        if mask is not None:
+            joint |= ~mask[rows, :, None]
+        x[joint] = np.nan
+        y[joint] = np.nan
+        ic[rows], ranks, counts[rows] = rank_correlation(x, y, min_assets)
+        quantiles[rows] = quantile_means(ranks, y, n_quantiles, counts[rows], min_assets)
+
+    spread = quantiles[:, -1] - quantiles[:, 0]
+    result = {
+        "ic": pd.DataFrame(ic, index=panel.dates, columns=pairs),
+        "spread": pd.DataFrame(spread, index=panel.dates, columns=pairs),
+        "quantiles": pd.DataFrame(
+            quantiles.transpose(0, 2, 1).reshape(n_dates, -1), index=panel.dates,
+            columns=pd.MultiIndex.from_tuples(
+                [(f, h, q + 1) for f, h in pairs for q in range(n_quantiles)],
+                names=["factor", "horizon", "quantile"])),
+    }
+    result["summary"] = summarize(result, counts)
+    result["decay"] = result["summary"]["ic_mean"].unstack("horizon")
+    return result
+
+
+def summarize(result: dict, counts: np.ndarray) -> pd.DataFrame:
+
+    # Per (factor, horizon) over the dates with an IC. Daily h-day returns
+    # overlap, so the t-stat counts n / h independent observations.
+
+    ic, spread = result["ic"], result["spread"]
+    horizons = ic.columns.get_level_values("horizon").to_numpy()
+    n = ic.notna().sum().to_numpy()
+    summary = pd.DataFrame({
+        "ic_mean": ic.mean(), "ic_std": ic.std(),
+        "hit_rate": (ic > 0).sum() / n,
+        "n_dates": n,
+        "mean_assets": np.where(ic.notna(), counts, 0).sum(axis=0) / n,
+    }, index=ic.columns)
+    summary.insert(2, "ic_ir", summary["ic_mean"] / summary["ic_std"])
+    summary.insert(3, "t_stat", summary["ic_ir"] * np.sqrt(n / horizons))
+
+    means = result["quantiles"].mean().unstack("quantile")
+    means.columns = [f"q{q}" for q in means.columns]
+    summary = summary.join(means)
+    summary["spread"] = spread.mean()
+    summary["spread_ann"] = summary["spread"] * 252 / horizons
+    return summary
+
+
+# --------------------------------------------------------------------- #
+# Inputs
+# --------------------------------------------------------------------- #
+def load_panel(factor_matrix: pd.DataFrame, forward: pd.DataFrame, factors=None):
+
+    # factor_matrix: long (date, asset, *factors, ...) table
+    # forward:       long (date, asset, fwd_h...) table from
+    #                compute_forward_returns --stacked-out
+    # Returns (panel, factor names, {horizon: field}).
+
+    factors = [c for c in factor_matrix.columns if c not in NON_FACTOR_COLS] \
+        if factors is None else list(factors)
+    fields = [c for c in forward.columns if c.startswith("fwd_") and c[4:].isdigit()]
+    targets = {int(c[4:]): c for c in fields}
+    if set(targets.values()) != {horizon_column(h) for h in targets}:
+        raise ValueError(f"unexpected forward return columns {fields}")
+
+    panel = Panel.from_long(factor_matrix, fields=factors)
+    returns = Panel.from_long(forward, fields=fields)
+    for name in fields:
+        panel.add(name, returns.frame(name))
+    return panel, factors, targets
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--factor-matrix", default=str(table_path("factor_matrix")))
+    ap.add_argument("--forward", default=str(table_path("forward_returns_by_horizon")))
+    ap.add_argument("--factors", nargs="+", default=None)
+    ap.add_argument("--quantiles", type=int, default=5)
+    ap.add_argument("--min-assets", type=int, default=5)
+    ap.add_argument("--out", default=str(table_path("factor_ic", PROCESSED_DIR)),
+                    help="daily IC table (Date + <factor>_<horizon> columns)")
+    args = ap.parse_args()
+
+    with timed("read"):
+        panel, factors, targets = load_panel(read_table(args.factor_matrix),
+                                             read_table(args.forward), args.factors)
+    result = factor_ic(panel, factors, targets, n_quantiles=args.quantiles,
+                       min_assets=args.min_assets,
+                       universe=load_universe(missing_ok=True))
+
+    daily = result["ic"].copy()
+    daily.columns = [f"{f}_{h}" for f, h in daily.columns]
+    write_table(daily.rename_axis("Date"), args.out)
+
+    with pd.option_context("display.width", 200, "display.max_columns", 50):
+        print(result["summary"].round(4).to_string())
+        print("\nIC decay (mean rank IC by horizon):")
+        print(result["decay"].round(4).to_string())
+    print(f"\ndaily IC -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# Macro regime layer.
+
+# Loads the macro series that drive regime filters and factor rotation
+# (CPI, Fed Funds, VIX, oil, USD index) from local FRED-layout files in
+# data/raw/macro (<series id>.csv or .parquet: a date column and a value
+# column, "." for missing), and aligns them onto the trading calendar:
+
+#     1. each series is transformed at its own frequency (CPI -> 12-month
+#        inflation, oil -> 3-month log return, ...), so a monthly change
+#        is measured between monthly prints, not between calendar days
+#     2. every observation becomes usable `lag_days` after its observation
+#        date (CPI for March is published mid-April, a weekly H.10 print
+#        the Monday after, a daily close the next day)
+#     3. all series are as-of joined onto the calendar in one searchsorted
+#        pass (features.asof), and the aligned (dates x series) matrix is
+#        cached under data/cache/macro/, keyed by the calendar, the series
+#        spec and the file contents
+
+# Regime flags and factor-tilt weights are whole-matrix array ops on the
+# aligned values (no per-date loop) and come out as (dates x regimes) /
+# (dates x factors) arrays that broadcast against a date x asset factor
+# panel; tilted_composite() does that broadcast.
+
+# Usage (from project/):
+#     python -m src.features.macro fixture      # offline stand-in for FRED
+#     python -m src.features.macro download     # FRED via pandas-datareader
+#     python -m src.features.macro              # align onto the price calendar
+# or
+#     macro = align_macro(prices.index)
+#     flags = regime_flags(macro)
+#     weights = factor_weights(flags, {"momentum": .25, "quality": .25, ...})
+#     score = tilted_composite(panel, weights)
+
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from src.features.asof import asof_join
+from src.utils.metrics import timed
+from src.utils.store import PROJECT_DIR, read_table, table_path, write_table
+
+MACRO_DIR = PROJECT_DIR / "data" / "raw" / "macro"
+MACRO_CACHE_DIR = PROJECT_DIR / "data" / "cache" / "macro"
+
+
+class MacroSeries:
+
+    # name:       column in the aligned matrix
+    # series_id:  FRED id, also the file stem in the macro directory
+    # frequency:  "D", "W" or "M" (documentation; transforms count periods
+    #             in observations of the series itself)
+    # lag_days:   calendar days from observation date to publication
+    # transform:  "level", "pct" (simple change), "log" (log change) or
+    #             "diff" over `periods` observations
+
+    def __init__(self, name, series_id, frequency, lag_days, transform="level", periods=1):
+        self.name = name
+        self.series_id = series_id
+        self.frequency = frequency
+        self.lag_days = lag_days
+        self.transform = transform
+        self.periods = periods
+
+    def spec(self) -> list:
+        return [self.name, self.series_id, self.frequency, self.lag_days,
+                self.transform, self.periods]
+
+
+# FRED dates monthly series on the 1st of the month they describe
+SERIES = (
+    MacroSeries("cpi_yoy", "CPIAUCSL", "M", lag_days=45, transform="pct", periods=12),
+    MacroSeries("fed_funds", "FEDFUNDS", "M", lag_days=32),
+    MacroSeries("fed_funds_6m", "FEDFUNDS", "M", lag_days=32, transform="diff", periods=6),
+    MacroSeries("vix", "VIXCLS", "D", lag_days=1),
+    MacroSeries("oil_3m", "DCOILWTICO", "D", lag_days=1, transform="log", periods=63),
+    MacroSeries("usd_3m", "DTWEXBGS", "W", lag_days=3, transform="log", periods=13),
+)
+
+# (regime, column, ">" or "<", threshold); NaN (not yet published) is
+# never in a regime
+REGIMES = (
+    ("high_vol", "vix", ">", 25.0),
+    ("high_inflation", "cpi_yoy", ">", 0.03),
+    ("tightening", "fed_funds_6m", ">", 0.5),
+    ("oil_shock", "oil_3m", ">", 0.25),
+    ("strong_usd", "usd_3m", ">", 0.05),
+)
+
+# Regimes that need all of their parts at once
+COMPOSITES = {
+    "stress": ("high_vol", "high_inflation"),
+}
+
+# Additive factor-weight tilts per active regime (README: rotate from
+# momentum to quality in high-volatility, high-inflation regimes)
+TILTS = {
+    "high_vol": {"momentum": -0.05, "low_vol": 0.05},
+    "high_inflation": {"value": 0.05, "size": -0.05},
+    "tightening": {"quality": 0.05, "size": -0.05},
+    "stress": {"momentum": -0.10, "quality": 0.10},
+}
+
+
+# --------------------------------------------------------------------- #
+# Loading
+# --------------------------------------------------------------------- #
+def read_series(series_id: str, directory=MACRO_DIR) -> pd.Series:
+
+    # One FRED-layout file as a float series on its observation dates
+
+    directory = Path(directory)
+    path = directory / f"{series_id}.parquet"
+    if path.exists():
+        frame = pd.read_parquet(path)
+    else:
+        path = directory / f"{series_id}.csv"
+        if not path.exists():
+            raise FileNotFoundError(
+                f"no {series_id}.parquet / .csv in {directory} (python -m "
+                f"src.features.macro download, or fixture for synthetic data)")
+        frame = pd.read_csv(path, na_values=["."])
+    values = frame[series_id] if series_id in frame.columns else frame.iloc[:, 1]
+    series = pd.Series(pd.to_numeric(values, errors="coerce").to_numpy(),
+                       index=pd.DatetimeIndex(pd.to_datetime(frame.iloc[:, 0])), name=series_id)
+    return series.dropna().sort_index()
+
+
+def transformed(series: pd.Series, spec: MacroSeries) -> pd.Series:
+
+    # spec.transform over spec.periods observations of the series
+
+    if spec.transform == "level":
+        return series
+    past = series.shift(spec.periods)
+    if spec.transform == "pct":
+        return series / past - 1.0
+    if spec.transform == "log":
+        return np.log(series / past)
+    if spec.transform == "diff":
+        return series - past
+    raise ValueError(f"unknown transform {spec.transform!r}")
+
+
+def _files(series, directory) -> list:
+    directory = Path(directory)
+    out = []
+    for series_id in sorted({s.series_id for s in series}):
+        for suffix in (".parquet", ".csv"):
+            if (directory / f"{series_id}{suffix}").exists():
+                out.append(directory / f"{series_id}{suffix}")
+                break
+    return out
+
+
+def macro_key(dates: pd.DatetimeIndex, series, directory=MACRO_DIR) -> str:
+
+    # Cache key of an aligned matrix: calendar, series spec, file contents
+
+    h = hashlib.sha256()
+    h.update(dates.asi8.tobytes())
+    h.update(json.dumps([s.spec() for s in series]).encode())
+    for path in _files(series, directory):
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+@timed()
+def align_macro(dates,
+                series=SERIES,
+                directory=MACRO_DIR,
+                cache_dir=MACRO_CACHE_DIR) -> pd.DataFrame:
+
+    # (dates x series names) frame of each transformed series as published
+    # by each date; NaN before its first publication. Cached when
+    # cache_dir is set.
+
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).sort_values()
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = Path(cache_dir) / f"{macro_key(dates, series, directory)[:32]}.parquet"
+        if cache_path.exists():
+            return pd.read_parquet(cache_path)
+
+    raw = {series_id: read_series(series_id, directory)
+           for series_id in {s.series_id for s in series}}
+    long = []
+    for spec in series:
+        values = transformed(raw[spec.series_id], spec).dropna()
+        long.append(pd.DataFrame({
+            "ticker": spec.name,
+            "asOfDate": values.index + pd.Timedelta(days=spec.lag_days),
+            "value": values.to_numpy(dtype=float),
+        }))
+    aligned = asof_join(pd.concat(long, ignore_index=True), dates,
+                        tickers=[s.name for s in series]).rename_axis("Date")
+
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        aligned.to_parquet(cache_path)
+    return aligned
+
+
+# --------------------------------------------------------------------- #
+# Regimes and tilts
+# --------------------------------------------------------------------- #
+def regime_flags(macro: pd.DataFrame, regimes=REGIMES, composites=COMPOSITES) -> pd.DataFrame:
+
+    # (dates x regimes) booleans from one comparison over the aligned
+    # matrix, plus composites (logical AND of their parts)
+
+    names = [name for name, *_ in regimes]
+    values = macro[[column for _, column, _, _ in regimes]].to_numpy(dtype=float)
+    sign = np.array([1.0 if op == ">" else -1.0 for _, _, op, _ in regimes])
+    threshold = np.array([t for *_, t in regimes])
+    with np.errstate(invalid="ignore"):
+        flags = values * sign > threshold * sign          # NaN compares False
+    if composites:
+        parts = np.array([[name in members for name in names]
+                          for members in composites.values()])
+        # (T, R) @ (R, C) counts the active parts of every composite at once
+        active = flags.astype(np.int64) @ parts.T.astype(np.int64)
+        flags = np.hstack([flags, active == parts.sum(axis=1)])
+        names += list(composites)
+    return pd.DataFrame(flags, index=macro.index, columns=names)
+
+
+def factor_weights(flags: pd.DataFrame, base: dict, tilts=TILTS) -> pd.DataFrame:
+
+    # (dates x factors) weights: base + the tilts of every active regime,
+    # clipped at zero and rescaled to the base's total. flags may also be
+    # regime probabilities (models/hmm.py), which scale each tilt. A tilt
+    # on a factor missing from base would silently turn a rotation into a
+    # rescale of the rest, so it raises a warning.
+
+    factors = list(base)
+    dropped = {f"{regime}: {f}" for regime in flags.columns
+               for f in tilts.get(regime, {}) if f not in base}
+    if dropped:
+        warnings.warn(f"tilts on factors missing from base are ignored ({', '.join(sorted(dropped))})",
+                      RuntimeWarning, stacklevel=2)
+    tilt = np.array([[tilts.get(regime, {}).get(f, 0.0) for f in factors]
+                     for regime in flags.columns])
+    weights = np.array([base[f] for f in factors]) + flags.to_numpy(dtype=float) @ tilt
+    np.maximum(weights, 0.0, out=weights)
+    total = weights.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights *= np.where(total > 0, sum(base.values()) / total, 0.0)
+    return pd.DataFrame(weights, index=flags.index, columns=factors)
+
+
+def tilted_composite(factors, weights: pd.DataFrame) -> pd.DataFrame:
+
+    # factors: Panel (utils.panel) or {factor: wide date x asset frame}
+    #          with one field per weights column
+    # weights: factor_weights() output
+
+    # Weighted sum of the factors on each date, the weights broadcast
+    # across assets; a missing factor value drops out and the remaining
+    # weights are rescaled.
+
+    if isinstance(factors, dict):
+        from src.utils.panel import Panel
+        factors = Panel.from_frames(factors)
+    w = weights.reindex(factors.dates, method="ffill").to_numpy(dtype=float)
+    stacked = np.stack([factors[f] for f in weights.columns])       # (F, T, N)
+    valid = ~np.isnan(stacked)
+    w = w.T[:, :, None]                                             # (F, T, 1)
+    total = np.where(valid, w, 0.0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        score = np.where(valid, stacked * w, 0.0).sum(axis=0) / total
+    score[total == 0] = np.nan
+    return pd.DataFrame(score, index=factors.dates, columns=factors.assets)
+
+
+# --------------------------------------------------------------------- #
+# Sources
+# --------------------------------------------------------------------- #
+def download(series=SERIES, directory=MACRO_DIR, start="1998-01-01") -> list:
+
+    # FRED through pandas-datareader (imported lazily; only this command
+    # needs it) into <directory>/<series id>.csv
+
+    from pandas_datareader import data as pdr
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = []
+    for series_id in sorted({s.series_id for s in series}):
+        frame = pdr.DataReader(series_id, "fred", start)
+        frame.rename_axis("observation_date").to_csv(directory / f"{series_id}.csv", na_rep=".")
+        written.append(series_id)
+    return written
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("command", nargs="?", default="align",
+                    choices=["align", "fixture", "download"])
+    ap.add_argument("--directory", default=str(MACRO_DIR))
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    if args.command == "fixture":
+        from src.utils.synthetic import write_macro
+
+        out = write_macro(args.directory, "1998-01-01", pd.Timestamp.today().normalize(),
+                          args.seed)
+        print(f"Synthetic macro fixture written to {out}")
+        return
+    if args.command == "download":
+        print(f"Downloaded {download(directory=args.directory)} to {args.directory}")
+        return
+
+    dates = read_table(table_path("r1000_cleaned_close_prices"), tickers=[], index=True).index
+    macro = align_macro(dates, directory=args.directory)
+    flags = regime_flags(macro)
+    write_table(macro.join(flags.astype(float)), table_path("macro_regimes"))
+    print(f"{len(macro)} dates x {macro.shape[1]} series; share of dates in each regime:")
+    print(flags.mean().round(3).to_string())
+    print(f"Saved to {table_path('macro_regimes')}")
+
+
+if __name__ == "__main__":
+    main()
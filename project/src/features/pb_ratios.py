@@ -1,31 +1,27 @@
+import argparse
+
 import pandas as pd
-import yahooquery as yq
 import numpy as np
-from pathlib import Path
 
-def load_price_data():
+from src.features.asof import asof_join
+from src.features.standardize import standardize
+from src.utils.fundamentals import REPORTING_LAG_DAYS, get_client
+from src.utils.metrics import timed
+from src.utils.parallel import map_columns
+from src.utils.store import PROCESSED_DIR, read_table, table_path, write_table
+from src.utils.universe import universe_mask
+
+@timed()
+def load_price_data(path=None):
 
-    # Load the cleaned price data from CSV file.
+    # Load the cleaned price data from the processed Parquet store
+    # (r1000_cleaned_close_prices unless `path` is given).
     
     # Returns:
     #     pd.DataFrame: DataFrame containing daily closing prices for all stocks
     #                  Expected format: dates as index, stock tickers as columns
 
-    price_file_path = "/Users/francispadua/r1000-ls-strategy/project/data/processed/r1000_cleaned_close_prices.csv"
-    
-    # Read the CSV file - the Date column should be used as index
-    # The file has structure: unnamed_index, Date, AAPL, AMZN, GOOGL, etc.
-    price_df = pd.read_csv(price_file_path)
-    
-    # Set Date column as index and drop the unnamed first column
-    price_df = price_df.set_index('Date')
-    price_df.index = pd.to_datetime(price_df.index)
-    
-    # Drop the unnamed first column (which contains 0,1,2,3...)
-    if len(price_df.columns) > 0:
-        first_col_name = str(price_df.columns[0])
-        if first_col_name.startswith('Unnamed'):
-            price_df = price_df.drop(columns=[first_col_name])
+    price_df = read_table(path or table_path("r1000_cleaned_close_prices"), index=True)
     
     print(f"Loaded price data: {price_df.shape[0]} dates, {price_df.shape[1]} stocks")
     print(f"Date range: {price_df.index.min()} to {price_df.index.max()}")
@@ -33,7 +29,38 @@ def load_price_data():
     
     return price_df
 
-def get_detailed_book_value_data(ticker_symbol):
+def get_book_value_statements(tickers, client=None):
+
+    # Fetch annual statements for all tickers through the shared fundamentals
+    # client (batched, cached) and keep rows with both book value and shares.
+    
+    # Uses:
+    # - StockholdersEquity: Total book value (includes all assets)
+    # - OrdinarySharesNumber: Total shares outstanding
+    
+    # Args:
+    #     tickers (list): List of stock ticker symbols
+    #     client (FundamentalsClient): Defaults to the process-wide client
+    
+    # Returns:
+    #     pd.DataFrame: symbol, asOfDate, StockholdersEquity, OrdinarySharesNumber
+
+    client = client if client is not None else get_client()
+    statements = client.get(tickers)
+    
+    columns = ['symbol', 'asOfDate', 'StockholdersEquity', 'OrdinarySharesNumber']
+    if not set(columns).issubset(statements.columns):
+        return pd.DataFrame(columns=columns)
+    
+    # Filter for rows that have both book value and shares data
+    valid_data = statements.loc[
+        statements['StockholdersEquity'].notna() & 
+        statements['OrdinarySharesNumber'].notna(),
+        columns
+    ]
+    return valid_data.sort_values(['symbol', 'asOfDate']).reset_index(drop=True)
+
+def get_detailed_book_value_data(ticker_symbol, client=None):
 
     # Extract detailed tangible book value data for verification purposes.
     
@@ -50,67 +77,43 @@ def get_detailed_book_value_data(ticker_symbol):
     #     pd.DataFrame: DataFrame with detailed financial data by year
     #                  Returns None if no data available
 
-    try:
-        # Create yahooquery Ticker object for the stock
-        ticker = yq.Ticker(ticker_symbol)
-        
-        # Get balance sheet data (returns annual financial statements)
-        balance_sheet = ticker.balance_sheet()
-        
-        # Filter for rows that have both book value and shares data
-        valid_data = balance_sheet[
-            balance_sheet['StockholdersEquity'].notna() & 
-            balance_sheet['OrdinarySharesNumber'].notna()
-        ].copy()
-        
-        if len(valid_data) == 0:
-            print(f"  No valid book value data for {ticker_symbol}")
-            return None
-        
-        # Create detailed breakdown DataFrame
-        detailed_data = pd.DataFrame({
-            'Ticker': ticker_symbol,
-            'Fiscal_Year_End': pd.to_datetime(valid_data['asOfDate']),
-            'Total_Book_Value': valid_data['StockholdersEquity'],
-            'Shares_Outstanding': valid_data['OrdinarySharesNumber'],
-            'Book_Value_Per_Share': valid_data['StockholdersEquity'] / valid_data['OrdinarySharesNumber']
-        })
-        
-        # Sort by fiscal year end date
-        detailed_data = detailed_data.sort_values('Fiscal_Year_End')
-        
-        print(f"  {ticker_symbol}: Found {len(detailed_data)} years of detailed data")
-        return detailed_data
-        
-    except Exception as e:
-        print(f"  Error getting detailed book value data for {ticker_symbol}: {e}")
+    valid_data = get_book_value_statements([ticker_symbol], client)
+    
+    if len(valid_data) == 0:
+        print(f"  No valid book value data for {ticker_symbol}")
         return None
+    
+    detailed_data = _detailed_book_values(valid_data)
+    print(f"  {ticker_symbol}: Found {len(detailed_data)} years of detailed data")
+    return detailed_data
+
+def _detailed_book_values(valid_data):
+
+    # Verification layout for rows from get_book_value_statements
 
-def create_book_value_verification_csv(tickers):
+    return pd.DataFrame({
+        'Ticker': valid_data['symbol'],
+        'Fiscal_Year_End': pd.to_datetime(valid_data['asOfDate']),
+        'Total_Book_Value': valid_data['StockholdersEquity'],
+        'Shares_Outstanding': valid_data['OrdinarySharesNumber'],
+        'Book_Value_Per_Share': valid_data['StockholdersEquity'] / valid_data['OrdinarySharesNumber']
+    }).reset_index(drop=True)
+
+def create_book_value_verification_csv(tickers, client=None):
 
     # Create a comprehensive CSV file showing detailed book value calculations
-    # for verification purposes.
+    # for verification purposes. Shares the cached download used for the
+    # PB ratios, so it costs no extra requests.
     
     # Args:
     #     tickers (list): List of stock ticker symbols
 
     print("\nCreating detailed book value verification CSV...")
     
-    all_detailed_data = []
+    valid_data = get_book_value_statements(tickers, client)
     
-    # Loop through each stock ticker
-    for i, ticker in enumerate(tickers):
-        print(f"Processing {i+1}/{len(tickers)}: {ticker}")
-        
-        # Get detailed book value data for this stock
-        detailed_data = get_detailed_book_value_data(ticker)
-        
-        if detailed_data is not None:
-            all_detailed_data.append(detailed_data)
-    
-    if all_detailed_data:
-        # Combine all data into one DataFrame
-        verification_df = pd.concat(all_detailed_data, ignore_index=True)
+    if len(valid_data):
+        verification_df = _detailed_book_values(valid_data)
         
         # Format the data for better readability
         verification_df['Fiscal_Year_End'] = verification_df['Fiscal_Year_End'].dt.strftime('%Y-%m-%d')
@@ -119,21 +122,16 @@ def create_book_value_verification_csv(tickers):
         verification_df['Book_Value_Per_Share'] = verification_df['Book_Value_Per_Share'].round(4)
         
         # Save to CSV
-        output_path = "../../data/processed/book_value_verification.csv"
+        output_path = PROCESSED_DIR / "book_value_verification.csv"
         verification_df.to_csv(output_path, index=False)
         
         print(f"\nVerification data saved to: {output_path}")
         print(f"Total records: {len(verification_df)} across {len(tickers)} stocks")
         
-def get_historical_book_values(ticker_symbol):
+def get_historical_book_values(ticker_symbol, client=None):
 
     # Extract ALL historical book value per share data for a given stock.
     
-    # Uses yahooquery to get:
-    # - balance_sheet(): Gets historical balance sheet data (annual)
-    # - StockholdersEquity: Total book value (includes all assets)
-    # - OrdinarySharesNumber: Total shares outstanding
-    
     # Args:
     #     ticker_symbol (str): Stock ticker symbol (e.g., 'AAPL')
     
@@ -141,42 +139,19 @@ def get_historical_book_values(ticker_symbol):
     #     pd.Series: Series with fiscal year-end dates as index and book value per share as values
     #               Returns None if no data available
 
-    try:
-        # Create yahooquery Ticker object for the stock
-        ticker = yq.Ticker(ticker_symbol)
-        
-        # Get balance sheet data (returns annual financial statements)
-        balance_sheet = ticker.balance_sheet()
-        
-        # Filter for rows that have both book value and shares data
-        valid_data = balance_sheet[
-            balance_sheet['StockholdersEquity'].notna() & 
-            balance_sheet['OrdinarySharesNumber'].notna()
-        ].copy()
-        
-        if len(valid_data) == 0:
-            print(f"  No valid book value data for {ticker_symbol}")
-            return None
-        
-        # Calculate book value per share for each year
-        valid_data['BookValuePerShare'] = (
-            valid_data['StockholdersEquity'] / valid_data['OrdinarySharesNumber']
-        )
-        
-        # Create a Series with fiscal year-end dates as index
-        book_value_series = pd.Series(
-            valid_data['BookValuePerShare'].values,
-            index=pd.to_datetime(valid_data['asOfDate'])
-        ).sort_index()
-        
-        print(f"  {ticker_symbol}: Found {len(book_value_series)} years of book value data")
-        return book_value_series
-        
-    except Exception as e:
-        print(f"  Error getting book value for {ticker_symbol}: {e}")
+    table = get_book_value_table([ticker_symbol], client)
+    
+    if len(table) == 0:
+        print(f"  No valid book value data for {ticker_symbol}")
         return None
+    
+    book_value_series = pd.Series(
+        table['value'].values, index=pd.to_datetime(table['asOfDate'])
+    )
+    print(f"  {ticker_symbol}: Found {len(book_value_series)} years of book value data")
+    return book_value_series
 
-def get_rolling_book_value_per_share(price_dates, book_value_series):
+def get_rolling_book_value_per_share(price_dates, book_value_series, lag_days=0):
 
     # Create a rolling book value per share series that updates annually.
     
@@ -186,35 +161,55 @@ def get_rolling_book_value_per_share(price_dates, book_value_series):
     # Args:
     #     price_dates (pd.DatetimeIndex): All dates from the price data
     #     book_value_series (pd.Series): Historical book values with fiscal year-end dates
+    #     lag_days (int): Reporting lag before a fiscal year's value is usable
     
     # Returns:
     #     pd.Series: Rolling book value per share for each price date
 
     if book_value_series is None or len(book_value_series) == 0:
         return pd.Series(np.nan, index=price_dates)
+
+    book_values = pd.DataFrame({
+        'ticker': 0,
+        'asOfDate': book_value_series.index,
+        'value': book_value_series.values,
+    })
+    rolling = asof_join(book_values, price_dates, tickers=[0], lag_days=lag_days)
+    return rolling[0].reindex(pd.DatetimeIndex(price_dates)).rename(None)
+
+def get_book_value_table(tickers, client=None):
+
+    # Collect historical book value per share for all tickers into one
+    # long table (ticker, asOfDate, value) for the panel-wide as-of join.
     
+    # Args:
+    #     tickers (list): List of stock ticker symbols
+    #     client (FundamentalsClient): Defaults to the process-wide client
     
-    # For each price date, find the most recent book value available
-    rolling_book_values = []
-    
-    for date in price_dates:
-        # Convert date to pandas Timestamp for comparison
-        date = pd.Timestamp(date)
-        
-        # Find book values that are available before or on this date
-        available_book_values = book_value_series[book_value_series.index <= date]
-        
-        if len(available_book_values) > 0:
-            # Use the most recent book value available
-            most_recent_book_value = available_book_values.iloc[-1]
-            rolling_book_values.append(most_recent_book_value)
-        else:
-            # No book value data available for this date yet
-            rolling_book_values.append(np.nan)
+    # Returns:
+    #     pd.DataFrame: Long-format book values; empty if nothing was found
+
+    valid_data = get_book_value_statements(tickers, client)
     
-    return pd.Series(rolling_book_values, index=price_dates)
+    return pd.DataFrame({
+        'ticker': valid_data['symbol'],
+        'asOfDate': pd.to_datetime(valid_data['asOfDate']),
+        'value': valid_data['StockholdersEquity'] / valid_data['OrdinarySharesNumber'],
+    })
+
+def price_to_book(price_df, book_values, lag_days=REPORTING_LAG_DAYS):
+
+    # Daily price / as-of book value per share for the columns of
+    # price_df. Column independent, so map_columns can shard it.
 
-def calculate_daily_pb_ratios(price_df):
+    rolling_book_values = asof_join(
+        book_values, price_df.index, tickers=price_df.columns, lag_days=lag_days
+    ).reindex(price_df.index)
+    return price_df / rolling_book_values
+
+@timed()
+def calculate_daily_pb_ratios(price_df, lag_days=REPORTING_LAG_DAYS, client=None,
+                              workers=1, memory_budget="1GB"):
 
     # Calculate daily Price-to-Book (PB) ratios for all stocks using rolling book values.
     
@@ -223,83 +218,78 @@ def calculate_daily_pb_ratios(price_df):
     
     # Args:
     #     price_df (pd.DataFrame): DataFrame with daily prices (dates as index, tickers as columns)
+    #     lag_days (int): Reporting lag before a fiscal year's book value is usable
+    #     workers (int): Processes to shard the as-of join and division across
+    #                    by ticker (utils/parallel.py); the z-scores stay whole
     
     # Returns:
     #     pd.DataFrame: DataFrame with daily PB ratios (same structure as input)
 
-    # Create empty DataFrame to store PB ratios (same structure as price data)
-    pb_ratios_df = price_df.copy()
-    
     # Get list of all stock tickers from the price data columns
     tickers = price_df.columns.tolist()
     print(f"\nCalculating rolling PB ratios for {len(tickers)} stocks...")
     
-    # Loop through each stock ticker
-    for i, ticker in enumerate(tickers):
-        print(f"Processing {i+1}/{len(tickers)}: {ticker}")
-        
-        # Get ALL historical book values for this stock
-        historical_book_values = get_historical_book_values(ticker)
-        
-        if historical_book_values is None:
-            # If no book value data, set all PB ratios to NaN
-            pb_ratios_df[ticker] = np.nan
-            continue
-        
-        # Create rolling book value series that updates annually
-        rolling_book_values = get_rolling_book_value_per_share(
-            price_df.index, historical_book_values
-        )
-        
-        # Calculate daily PB ratios: Daily Price / Rolling Book Value Per Share
-        daily_prices = price_df[ticker]
-        daily_pb_ratios = daily_prices / rolling_book_values
-        
-        # Store the calculated PB ratios
-        pb_ratios_df[ticker] = daily_pb_ratios
-
-        pb_ratios_df[f"{ticker}_z"] = (pb_ratios_df[ticker] - pb_ratios_df[ticker].mean()) / pb_ratios_df[ticker].std()
-        
-        print(f"    Applied {len(historical_book_values)} different book values across time period")
+    # Get ALL historical book values for every stock in long format
+    with timed("book_values") as m:
+        book_values = get_book_value_table(tickers, client)
+        m.add(rows=len(book_values))
+    print(f"    Found book values for {book_values['ticker'].nunique()}/{len(tickers)} stocks")
+    
+    # Align every ticker's book values onto the price calendar in one pass
+    # and calculate daily PB ratios: Daily Price / Rolling Book Value Per Share
+    with timed("asof_join"):
+        if workers > 1:
+            pb_ratios_df = map_columns(price_to_book, price_df, workers=workers,
+                                       memory_budget=memory_budget,
+                                       book_values=book_values, lag_days=lag_days)
+        else:
+            pb_ratios_df = price_to_book(price_df, book_values, lag_days)
+    
+    # Cross-sectional z-score per date (a ticker's full-history mean/std
+    # would leak future prices into every past value), taken only
+    # over the index members of that date (utils/universe.py, if present)
+    z_scores = pd.DataFrame(standardize(pb_ratios_df.to_numpy(dtype=float),
+                                        mask=universe_mask(pb_ratios_df)),
+                            index=pb_ratios_df.index, columns=pb_ratios_df.columns)
+    pb_ratios_df = pd.concat([pb_ratios_df, z_scores.add_suffix("_z")], axis=1)
+    
+    # Tickers with no book value data keep an all-NaN column (and no _z column)
+    missing = set(tickers) - set(book_values['ticker'])
+    pb_ratios_df = pb_ratios_df.drop(columns=[f"{t}_z" for t in missing])
     
     return pb_ratios_df
 
-def save_pb_ratios_to_csv(pb_ratios_df):
+@timed()
+def save_pb_ratios(pb_ratios_df):
 
-    # Save the calculated daily PB ratios to a CSV file, preserving the Date column.
+    # Save the calculated daily PB ratios to the Parquet store, preserving the Date column.
     
     # Args:
     #     pb_ratios_df (pd.DataFrame): DataFrame containing daily PB ratios
 
-    # Define output file path
-    output_path = "../../data/processed/value_factor.csv"
-    
-    # Save to CSV with date index preserved as "Date" column
-    # The index_label parameter ensures the date column is named "Date"
-    pb_ratios_df.to_csv(output_path, index_label="Date")
+    output_path = write_table(pb_ratios_df.rename_axis("Date"), table_path("value_factor"))
     
     print(f"\nPB ratios saved to: {output_path}")
     print(f"Data shape: {pb_ratios_df.shape[0]} dates, {pb_ratios_df.shape[1]} stocks")
-    print("Date column preserved in output CSV")
 
-def filter_complete_rows(input_csv, output_csv):
+@timed()
+def filter_complete_rows(input_path, output_path):
     """
     Keep only rows where all columns except 'Date' are present (no missing values).
     """
-    import pandas as pd
-    df = pd.read_csv(input_csv)
+    df = read_table(input_path)
     # Drop rows with any missing values except in 'Date'
     cols_to_check = [col for col in df.columns if col != 'Date']
     df_clean = df.dropna(subset=cols_to_check)
-    df_clean.to_csv(output_csv, index=False)
-    print(f"Filtered CSV saved to {output_csv} ({len(df_clean)} rows)")
+    write_table(df_clean, output_path)
+    print(f"Filtered table saved to {output_path} ({len(df_clean)} rows)")
 
-def filter_zscore_complete_rows(input_csv, output_csv):
+@timed()
+def filter_zscore_complete_rows(input_path, output_path):
     """
     Save only rows with all z-score columns (ending with '_z') and Date present (no missing values).
     """
-    import pandas as pd
-    df = pd.read_csv(input_csv)
+    df = read_table(input_path)
     # Select only Date and columns ending with '_z'
     z_cols = [col for col in df.columns if col.endswith('_z')]
     cols = ['Date'] + z_cols
@@ -311,24 +301,31 @@ def filter_zscore_complete_rows(input_csv, output_csv):
     rename_dict = {col: col[:-2] for col in z_cols}  # Remove last 2 characters ('_z')
     df_z_clean = df_z_clean.rename(columns=rename_dict)
     
-    df_z_clean.to_csv(output_csv, index=False)
-    print(f"Filtered z-score CSV saved to {output_csv} ({len(df_z_clean)} rows)")
+    write_table(df_z_clean, output_path)
+    print(f"Filtered z-score table saved to {output_path} ({len(df_z_clean)} rows)")
 
+@timed("pb_ratios")
 def main():
 
     # Main function that orchestrates the entire rolling PB ratio calculation process.
     
     # Steps:
-    # 1. Load daily price data from CSV
+    # 1. Load daily price data from the Parquet store
     # 2. Create detailed book value verification CSV
-    # 3. Get ALL historical book values for each stock using yahooquery
+    # 3. Get ALL historical book values for every stock (batched, cached fetch)
     # 4. Calculate daily PB ratios using rolling/time-varying book values that update annually
-    # 5. Save results to CSV file with Date column preserved
+    # 5. Save results to the Parquet store with Date column preserved
     
     # Rolling Logic:
     # - For each date, use the most recent annual book value available at that time
     # - Example: Jan 1, 2025 uses 2024's book value; Jan 1, 2024 uses 2023's book value
 
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes to shard tickers across (see utils/parallel.py)")
+    ap.add_argument("--memory-budget", default="1GB")
+    args = ap.parse_args()
+
     print("=== Rolling Daily PB Ratio Calculation with Verification ===\n")
     
     # Step 1: Load the daily price data
@@ -341,31 +338,34 @@ def main():
      
     # Step 3 & 4: Calculate rolling daily PB ratios for all stocks
     print("\nStep 3: Calculating rolling daily PB ratios...")
-    pb_ratios_df = calculate_daily_pb_ratios(price_df)
+    pb_ratios_df = calculate_daily_pb_ratios(price_df, workers=args.workers,
+                                             memory_budget=args.memory_budget)
     
-    # Step 5: Save results to CSV with Date column preserved
+    # Step 5: Save results with Date column preserved
     print("\nStep 4: Saving results...")
-    save_pb_ratios_to_csv(pb_ratios_df)
+    save_pb_ratios(pb_ratios_df)
     # Filter for complete rows only (no missing values except Date)
     filter_complete_rows(
-        "../../data/processed/value_factor.csv",
-        "../../data/processed/value_factor.csv"
+        table_path("value_factor"),
+        table_path("value_factor")
     )
-    # Save only complete z-score rows to value_factor_z.csv
+    # Save only complete z-score rows to value_factor_z
     filter_zscore_complete_rows(
-        "../../data/processed/value_factor.csv",
-        "../../data/processed/value_factor_z.csv"
+        table_path("value_factor"),
+        table_path("value_factor_z")
     )
 
     
+    get_client().report()
+    
     print("\n=== Process Complete ===")
     print("Files created:")
 
     # debugging: 
     # print("1. book_value_verification.csv - Detailed breakdown of book value calculations")
     
-    print("1. value_factor.csv - Daily PB ratios using rolling book values")
-    print("2. value_factor_z.csv - Only rows with all z-score columns present")
+    print("1. value_factor.parquet - Daily PB ratios using rolling book values")
+    print("2. value_factor_z.parquet - Only rows with all z-score columns present")
 
 # Run the main function when script is executed
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+
+# Bitemporal point-in-time fundamentals store.
+
+# Every filing value is kept once, as a record
+
+#     ticker, field, period_end, available, value
+
+# where period_end is the fiscal period it describes (the statement's
+# asOfDate) and available is the first date it could have been known.
+# Original filings become available `lag_days` after period_end (or when
+# first observed, if sooner); a restated value is appended as a new record
+# available from the day it was observed, so the original stays in the
+# history and queries as of earlier dates still see it. Nothing already
+# stored is rewritten: each ingest adds one part file of new records.
+
+# Queries are vectorized as-of joins onto any calendar: for each date and
+# ticker, the record with the latest period_end among those available by
+# then (its latest restatement, if several are). Values are laid out per
+# date only when a factor asks for them, instead of keeping one number per
+# ticker per calendar day.
+
+# Usage:
+#     store = PITStore()
+#     store.ingest(get_client().get(tickers), ["NetIncome", "StockholdersEquity"])
+#     equity = store.asof("StockholdersEquity", prices.index, prices.columns)
+#     store.asof("StockholdersEquity", dates, knowledge_date="2020-06-30")  # as run then
+
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.features.asof import asof_join
+from src.utils.fundamentals import REPORTING_LAG_DAYS
+from src.utils.store import PROCESSED_DIR
+
+PIT_DIR = PROCESSED_DIR / "fundamentals_pit"
+
+COLUMNS = ["ticker", "field", "period_end", "available", "value"]
+
+
+def _empty() -> pd.DataFrame:
+    return pd.DataFrame({
+        "ticker": pd.Series(dtype="category"),
+        "field": pd.Series(dtype="category"),
+        "period_end": pd.Series(dtype="datetime64[ns]"),
+        "available": pd.Series(dtype="datetime64[ns]"),
+        "value": pd.Series(dtype=float),
+    })
+
+
+class PITStore:
+
+    def __init__(self, directory=PIT_DIR):
+        self.directory = Path(directory)
+        self.records = self._read()
+
+    def _parts(self) -> list[Path]:
+        return sorted(self.directory.glob("part-*.parquet"))
+
+    def _read(self) -> pd.DataFrame:
+
+        # All records in ingest order (row order breaks ties between
+        # versions available on the same day)
+
+        parts = [pd.read_parquet(p) for p in self._parts()]
+        if not parts:
+            return _empty()
+        df = pd.concat(parts, ignore_index=True)
+        for col in ("ticker", "field"):
+            df[col] = df[col].astype("category")
+        return df[COLUMNS]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.records.memory_usage(deep=True).sum())
+
+    # ------------------------------------------------------------ writes
+    def latest(self, knowledge_date=None) -> pd.DataFrame:
+
+        # Most recent version of every (ticker, field, period_end) known
+        # by knowledge_date (default: everything stored)
+
+        df = self.records
+        if knowledge_date is not None:
+            df = df[df["available"] <= pd.Timestamp(knowledge_date)]
+        df = df.sort_values("available", kind="stable")
+        return df.drop_duplicates(["ticker", "field", "period_end"], keep="last")
+
+    def ingest(self, statements: pd.DataFrame,
+               fields,
+               observed=None,
+               lag_days: int = REPORTING_LAG_DAYS,
+               symbol_col: str = "symbol",
+               date_col: str = "asOfDate") -> int:
+
+        # statements: wide statement rows (symbol, asOfDate, <fields>) as
+        #             returned by FundamentalsClient.get
+        # observed:   when these values were seen (default today); restated
+        #             values become available from this date
+
+        # Appends records for new periods and for changed values only.
+        # Returns the number of records added.
+
+        fields = [fields] if isinstance(fields, str) else list(fields)
+        observed = pd.Timestamp.today() if observed is None else pd.Timestamp(observed)
+        observed = observed.normalize()
+
+        new = statements[[symbol_col, date_col] + fields].melt(
+            id_vars=[symbol_col, date_col], var_name="field", value_name="value")
+        new = new.dropna(subset=["value"])
+        new = pd.DataFrame({
+            "ticker": new[symbol_col].astype(str).str.upper().to_numpy(),
+            "field": new["field"].to_numpy(),
+            "period_end": pd.to_datetime(new[date_col]).dt.normalize().to_numpy(),
+            "value": new["value"].to_numpy(dtype=float),
+        }).drop_duplicates(["ticker", "field", "period_end"], keep="last")
+
+        known = self.latest().astype({"ticker": str, "field": str}).rename(
+            columns={"available": "available_known", "value": "value_known"})
+        merged = new.merge(known, on=["ticker", "field", "period_end"], how="left")
+
+        first = merged["value_known"].isna()
+        changed = ~first & (merged["value"] != merged["value_known"])
+        merged = merged[first | changed]
+        if merged.empty:
+            return 0
+
+        # A first sighting is dated by the reporting lag (backfilled
+        # history stays usable); a restatement from when it was seen
+        lagged = merged["period_end"] + pd.Timedelta(days=lag_days)
+        merged["available"] = lagged.clip(upper=observed).where(
+            first[merged.index],
+            merged["available_known"].fillna(observed).clip(lower=observed))
+        added = merged[COLUMNS].reset_index(drop=True)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        added.to_parquet(self.directory / f"part-{len(self._parts()):05d}.parquet",
+                         index=False)
+        self.records = self._read()
+        return len(added)
+
+    # ----------------------------------------------------------- queries
+    def history(self, ticker: str, field: str = None) -> pd.DataFrame:
+
+        # Every version of a ticker's values, in the order they became known
+
+        df = self.records[self.records["ticker"] == str(ticker).upper()]
+        if field is not None:
+            df = df[df["field"] == field]
+        return df.sort_values(["field", "period_end", "available"], kind="stable")
+
+    def asof(self, field: str, dates, tickers=None, knowledge_date=None) -> pd.DataFrame:
+
+        # dates:          calendar to align onto (e.g. trading days)
+        # tickers:        output columns; default every ticker with the field
+        # knowledge_date: ignore records that became available after this
+        #                 (reproduces what a past run would have seen)
+
+        # Returns a date x ticker frame: on each date, the value of the
+        # latest period available by then, in its latest known version.
+
+        df = self.records[self.records["field"] == field]
+        if knowledge_date is not None:
+            df = df[df["available"] <= pd.Timestamp(knowledge_date)]
+        if tickers is None:
+            tickers = sorted(df["ticker"].astype(str).unique())
+        tickers = pd.Index(tickers).astype(str).str.upper()
+
+        codes = tickers.get_indexer(df["ticker"].astype(str))
+        keep = codes >= 0
+        codes = codes[keep]
+        period = df["period_end"].to_numpy()[keep]
+        available = df["available"].to_numpy()[keep]
+        values = df["value"].to_numpy(dtype=float)[keep]
+        seq = np.arange(len(codes))
+
+        # Rank every record by (ticker, period_end, available, ingest order):
+        # the current value is the highest-ranked record released so far.
+        # Walking each ticker's records in release order, a running max of
+        # the rank picks it (ticker is the leading key, so one global
+        # running max never crosses tickers).
+        by_rank = np.lexsort((seq, available, period, codes))
+        rank = np.empty(len(codes), dtype=np.int64)
+        rank[by_rank] = seq
+        release = np.lexsort((rank, available, codes))
+        winner = by_rank[np.maximum.accumulate(rank[release])] if len(codes) else release
+
+        events = pd.DataFrame({
+            "ticker": codes[release],
+            "asOfDate": available[release],
+            "value": values[winner],
+        })
+        out = asof_join(events, dates, tickers=np.arange(len(tickers)))
+        out.columns = tickers
+        return out
+
+    def asof_frames(self, fields, dates, tickers=None, knowledge_date=None) -> dict:
+        return {field: self.asof(field, dates, tickers, knowledge_date) for field in fields}
@@ -0,0 +1,154 @@
+
+# Streaming multi-window rolling statistics.
+
+# Builds, once per price panel, the arrays every rolling factor needs:
+
+#     log_prices - log P; any (lookback, skip) momentum is a difference
+#                  of two rows
+#     cum        - cumulative (sum, sum of squares, count) of daily log
+#                  returns with a zero first row, so any window's moments
+#                  are a difference of two rows
+
+# Every window size / (lookback, skip) pair is then O(1) per cell, so a
+# sweep over 63/126/252 costs one pass to build and one subtraction per
+# variant instead of a full rolling pass each.
+
+# Numerical stability: returns are shifted by each column's first valid
+# return before accumulating (the "shifted data" variance algorithm), so
+# the sum of squares stays small and s2 - s1^2/n does not cancel.
+# Missing returns contribute zero to the sums and are tracked by the
+# count, which drives NaN-aware min_periods.
+
+
+import pandas as pd
+import numpy as np
+
+
+def log_returns(log_prices: np.ndarray, prev_log_prices: np.ndarray) -> np.ndarray:
+    return log_prices - prev_log_prices
+
+
+def first_valid(values: np.ndarray) -> np.ndarray:
+
+    # First non-NaN value of each column (NaN if none)
+
+    valid = ~np.isnan(values)
+    rows = valid.argmax(axis=0)
+    out = values[rows, np.arange(values.shape[1])]
+    out[~valid.any(axis=0)] = np.nan
+    return out
+
+
+def moment_steps(returns: np.ndarray, shift: np.ndarray,
+                 out: np.ndarray = None) -> np.ndarray:
+
+    # Per-row increments (3, T, N) of the cumulative (sum, sum of squares,
+    # count) for returns shifted by `shift`; missing returns add nothing.
+
+    if out is None:
+        out = np.empty((3,) + returns.shape)
+    valid = ~np.isnan(returns)
+    np.subtract(returns, shift, out=out[0])
+    out[0][~valid] = 0.0
+    np.multiply(out[0], out[0], out=out[1])
+    out[2] = valid
+    return out
+
+
+def accumulate(start: np.ndarray, steps: np.ndarray) -> np.ndarray:
+
+    # Running totals of `steps` (3, T, N) starting from row `start` (3, N).
+    # Sequential adds from `start`, so extending a running total in pieces
+    # gives exactly the same floats as accumulating it in one go.
+
+    return np.cumsum(np.concatenate([start[:, None], steps], axis=1), axis=1)[:, 1:]
+
+
+def window_std(cum_end: np.ndarray, cum_start: np.ndarray,
+               min_periods: int, out: np.ndarray = None) -> np.ndarray:
+
+    # Sample std of a window from two rows of cumulative
+    # (sum, sum of squares, count); NaN below min_periods observations.
+
+    n = cum_end[2] - cum_start[2]
+    too_few = n < max(min_periods, 2)
+    s1 = cum_end[0] - cum_start[0]
+    var = np.subtract(cum_end[1], cum_start[1], out=out)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # var = (s2 - s1^2 / n) / (n - 1), built in place
+        s1 *= s1
+        s1 /= n
+        var -= s1
+        n -= 1
+        var /= n
+        np.maximum(var, 0.0, out=var)
+        np.sqrt(var, out=var)
+    var[too_few] = np.nan
+    return var
+
+
+class RollingPanel:
+
+    # prices: wide price table (index=Date, columns=tickers)
+
+    def __init__(self, prices: pd.DataFrame):
+        prices = prices.sort_index()
+        self.index, self.columns = prices.index, prices.columns
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.log_prices = np.log(prices.to_numpy(dtype=float))
+
+        n_dates, n_tickers = self.log_prices.shape
+        returns = np.full((n_dates, n_tickers), np.nan)
+        returns[1:] = log_returns(self.log_prices[1:], self.log_prices[:-1])
+        self.shift = first_valid(returns)
+
+        # cum[:, i] = totals over return rows < i (accumulated in place,
+        # same sequential adds as accumulate())
+        self.cum = np.zeros((3, n_dates + 1, n_tickers))
+        moment_steps(returns, self.shift, out=self.cum[:, 1:])
+        np.cumsum(self.cum, axis=1, out=self.cum)
+
+    def _frame(self, values: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(values, index=self.index, columns=self.columns)
+
+    def momentum(self, lookback: int = 252, skip: int = 21,
+                 lag: int = 1) -> pd.DataFrame:
+
+        # Log return from t-lag-lookback to t-lag-skip, i.e. the
+        # lookback-period return minus the most recent skip-period return,
+        # observed `lag` days later. NaN where the latest price is missing.
+
+        lp = self.log_prices
+        n = len(lp)
+        out = np.full_like(lp, np.nan)
+        first = lag + max(lookback, skip)
+        if first < n:
+            # Row t reads rows t-lag, t-lag-skip, t-lag-lookback (slices)
+            rows = lambda back: lp[first - back:n - back]
+            np.subtract(rows(lag + skip), rows(lag + lookback), out=out[first:])
+            out[first:][np.isnan(rows(lag))] = np.nan
+        return self._frame(out)
+
+    def volatility(self, window: int = 252, min_periods: int = None,
+                   lag: int = 1) -> pd.DataFrame:
+
+        # Rolling sample std of daily log returns over `window` rows,
+        # observed `lag` days later.
+
+        min_periods = window if min_periods is None else min_periods
+        n = len(self.log_prices)
+        out = np.full(self.log_prices.shape, np.nan)
+        # Row t reads the window of return rows ending e = t-lag, i.e. cum
+        # rows e+1 and e+1-window. Until a full window exists the start is
+        # clipped to cum row 0 (all zeros), and the count enforces
+        # min_periods. Both are contiguous slices, so nothing is gathered.
+        head = min(window + lag - 1, n)
+        if lag < head:
+            window_std(self.cum[:, 1:head - lag + 1], self.cum[:, :1],
+                       min_periods, out=out[lag:head])
+        if head < n:
+            window_std(self.cum[:, head - lag + 1:n - lag + 1],
+                       self.cum[:, head - lag + 1 - window:n - lag + 1 - window],
+                       min_periods, out=out[head:])
+        return self._frame(out)
@@ -0,0 +1,280 @@
+# Event-driven sentiment store.
+
+# Sentiment arrives as events, one score per earnings call / 10-K / ...,
+# kept sparsely as records
+
+#     ticker, timestamp, score, source
+
+# in append-only part files (data/processed/sentiment_events/, one part
+# per append, like the PIT store). In memory the tickers are integer
+# codes into one asset index, so a projection never touches strings.
+
+# project() lays the events onto a trading calendar on demand:
+
+#     1. each event lands on the first trading day it could be used: the
+#        next trading day after its timestamp's date with lag=1 (a call
+#        after the close must not score that day's return), or the same
+#        day with lag=0
+#     2. events landing on the same (day, ticker) are aggregated ("mean",
+#        "sum" or "last") with one bincount scatter
+#     3. one recursive pass over the dates decays every ticker at once:
+#            s_t = d * s_{t-1}                    no event
+#            s_t = x_t          (mode="replace")  event x_t
+#            s_t = d * s_{t-1} + x_t (mode="accumulate")
+#        with d = 0.5 ** (1 / halflife) per trading day; before a
+#        ticker's first event, and past max_age days after its latest,
+#        the value is NaN
+
+# Events older than the calendar are not dropped or piled onto its first
+# day: the calendar is extended back to the earliest event (business
+# days stand in for the missing trading days), projected, and sliced,
+# so a sub-range projection carries the decayed, max_age-expired state
+# of the full one.
+
+# Re-scoring an event (same ticker, timestamp and source) in a later
+# append replaces its score.
+
+# Usage (from project/):
+#     python -m src.features.sentiment append scores.csv --source earnings_call
+#     python -m src.features.sentiment project --halflife 21
+# or
+#     store = SentimentStore()
+#     store.append(events)                      # ticker, timestamp, score, source
+#     panel = store.project(prices.index, prices.columns, halflife=21)
+
+
+from pathlib import Path
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.utils.metrics import timed
+from src.utils.store import PROCESSED_DIR, read_table, table_path, write_table
+
+SENTIMENT_DIR = PROCESSED_DIR / "sentiment_events"
+COLUMNS = ["ticker", "timestamp", "score", "source"]
+KEYS = ["ticker", "timestamp", "source"]
+AGGREGATIONS = ("mean", "sum", "last")
+
+
+def _normalize(events: pd.DataFrame) -> pd.DataFrame:
+    missing = sorted(set(COLUMNS) - set(events.columns))
+    if missing:
+        raise KeyError(f"sentiment events need columns {COLUMNS}; missing {missing}")
+    return pd.DataFrame({
+        "ticker": events["ticker"].astype(str).str.strip().str.upper().to_numpy(),
+        "timestamp": pd.to_datetime(events["timestamp"]).to_numpy(),
+        "score": events["score"].to_numpy(dtype=float),
+        "source": events["source"].astype(str).to_numpy(),
+    })
+
+
+# --------------------------------------------------------------------- #
+# Kernels
+# --------------------------------------------------------------------- #
+def event_rows(dates: pd.DatetimeIndex, timestamps: np.ndarray, lag: int = 1) -> np.ndarray:
+
+    # Calendar row each event is first usable on (len(dates) = never)
+
+    days = pd.DatetimeIndex(timestamps).normalize()
+    if lag == 0:
+        return dates.searchsorted(days, side="left")
+    return dates.searchsorted(days, side="right") + lag - 1
+
+
+def extended_calendar(dates: pd.DatetimeIndex, timestamps: np.ndarray) -> pd.DatetimeIndex:
+
+    # `dates` preceded by the business days from the earliest event up to
+    # dates[0], so every event lands on a row of its own
+
+    if not len(dates) or not len(timestamps):
+        return dates
+    first = pd.Timestamp(timestamps.min()).normalize()
+    if first >= dates[0]:
+        return dates
+    return pd.bdate_range(first, dates[0], inclusive="left").append(dates)
+
+
+def scatter_events(rows: np.ndarray, codes: np.ndarray, scores: np.ndarray,
+                   shape: tuple, how: str = "mean") -> np.ndarray:
+
+    # Dense (T, N) impulses, NaN where no event landed; events must be in
+    # time order for how="last"
+
+    if how not in AGGREGATIONS:
+        raise ValueError(f"unknown aggregation {how!r}")
+    # Aggregate over the occupied cells only, then scatter once into the
+    # dense array (bincount over every cell would touch T x N counters)
+    n_dates, n_assets = shape
+    flat = rows.astype(np.int64) * n_assets + codes
+    out = np.full(n_dates * n_assets, np.nan)
+    if how == "last":
+        # First occurrence in the reversed order = latest event per cell
+        cells, first = np.unique(flat[::-1], return_index=True)
+        out[cells] = scores[::-1][first]
+    else:
+        cells, inverse = np.unique(flat, return_inverse=True)
+        total = np.bincount(inverse, weights=scores, minlength=len(cells))
+        if how == "mean":
+            total /= np.bincount(inverse, minlength=len(cells))
+        out[cells] = total
+    return out.reshape(shape)
+
+
+def decay_events(impulses: np.ndarray, decay: float, mode: str = "replace",
+                 max_age: int = None) -> np.ndarray:
+
+    # Recursive decay of (T, N) impulses along T (see module comment).
+    # Only rows with an event do more than one multiply.
+
+    if mode not in ("replace", "accumulate"):
+        raise ValueError(f"unknown mode {mode!r}")
+    n_dates, n_assets = impulses.shape
+    out = np.empty((n_dates, n_assets))
+    has_event = ~np.isnan(impulses)
+    event_any = has_event.any(axis=1)
+    state = np.full(n_assets, np.nan)
+    age = np.zeros(n_assets, dtype=np.int64)
+    for t in range(n_dates):
+        row = out[t]
+        np.multiply(state, decay, out=row)
+        if event_any[t]:
+            hit = has_event[t]
+            if mode == "replace":
+                np.copyto(row, impulses[t], where=hit)
+            else:
+                np.copyto(row, np.where(np.isnan(row), 0.0, row) + impulses[t], where=hit)
+            age[hit] = 0
+        if max_age is not None:
+            # Stale: NaN from here on (an accumulation restarts from 0)
+            np.copyto(row, np.nan, where=age > max_age)
+            age += 1
+        state = row
+    return out
+
+
+# --------------------------------------------------------------------- #
+# Store
+# --------------------------------------------------------------------- #
+class SentimentStore:
+
+    def __init__(self, directory=SENTIMENT_DIR):
+        self.directory = Path(directory)
+        self._load()
+
+    def _parts(self) -> list[Path]:
+        return sorted(self.directory.glob("part-*.parquet"))
+
+    def _load(self) -> None:
+
+        # Latest score per event key, in time order, with tickers coded
+
+        parts = [pd.read_parquet(p) for p in self._parts()]
+        df = pd.concat(parts, ignore_index=True) if parts else _normalize(
+            pd.DataFrame(columns=COLUMNS))
+        df = df.drop_duplicates(KEYS, keep="last").sort_values("timestamp", kind="stable")
+        codes, assets = pd.factorize(df["ticker"], sort=True)
+        self.assets = pd.Index(assets)
+        self.codes = codes.astype(np.int32)
+        self.timestamps = df["timestamp"].to_numpy(dtype="datetime64[ns]")
+        self.scores = df["score"].to_numpy(dtype=float)
+        self.sources = pd.Categorical(df["source"])
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return (self.codes.nbytes + self.timestamps.nbytes + self.scores.nbytes
+                + self.sources.codes.nbytes)
+
+    def events(self) -> pd.DataFrame:
+        return pd.DataFrame({"ticker": self.assets[self.codes], "timestamp": self.timestamps,
+                             "score": self.scores, "source": np.asarray(self.sources)})
+
+    def append(self, events: pd.DataFrame) -> int:
+
+        # Add newly scored events (ticker, timestamp, score, source); an
+        # event already stored with the same score is skipped, a new
+        # score for it replaces the old one. Returns the rows written.
+
+        new = _normalize(events).drop_duplicates(KEYS, keep="last")
+        known = self.events().astype({"ticker": str, "source": str})
+        merged = new.merge(known, on=KEYS, how="left", suffixes=("", "_known"))
+        new = new[(merged["score"] != merged["score_known"]).to_numpy()]
+        if new.empty:
+            return 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        new.to_parquet(self.directory / f"part-{len(self._parts()):05d}.parquet", index=False)
+        self._load()
+        return len(new)
+
+    @timed("sentiment_project")
+    def project(self, dates, tickers=None, halflife: float = 21, lag: int = 1,
+                how: str = "mean", mode: str = "replace", max_age: int = None,
+                sources=None, knowledge_date=None) -> pd.DataFrame:
+
+        # dates:          trading calendar (e.g. prices.index)
+        # tickers:        output columns (default every ticker in the store)
+        # halflife:       in trading days; None = no decay
+        # lag / how / mode / max_age: see the module comment
+        # sources:        only these sources (e.g. ["earnings_call"])
+        # knowledge_date: ignore events stamped after it
+
+        # Returns the decayed date x ticker sentiment panel.
+
+        dates = pd.DatetimeIndex(dates).sort_values()
+        tickers = self.assets if tickers is None else pd.Index(tickers).astype(str).str.upper()
+        keep = np.ones(len(self), dtype=bool)
+        if sources is not None:
+            keep &= np.isin(np.asarray(self.sources), list(sources))
+        if knowledge_date is not None:
+            keep &= self.timestamps <= np.datetime64(pd.Timestamp(knowledge_date))
+
+        columns = tickers.get_indexer(self.assets)[self.codes[keep]]
+        calendar = extended_calendar(dates, self.timestamps[keep][columns >= 0])
+        rows = event_rows(calendar, self.timestamps[keep], lag)
+        used = (columns >= 0) & (rows < len(calendar))
+        impulses = scatter_events(rows[used], columns[used], self.scores[keep][used],
+                                  (len(calendar), len(tickers)), how)
+        decay = 1.0 if halflife is None else 0.5 ** (1.0 / halflife)
+        values = decay_events(impulses, decay, mode, max_age)[len(calendar) - len(dates):]
+        return pd.DataFrame(values, index=dates, columns=tickers)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("append", help="append scored events from a CSV")
+    add.add_argument("csv", help="ticker, timestamp, score[, source] columns")
+    add.add_argument("--source", default=None, help="source for rows without one")
+    proj = sub.add_parser("project", help="write the decayed daily panel")
+    proj.add_argument("--prices", default=str(table_path("r1000_cleaned_close_prices")))
+    proj.add_argument("--halflife", type=float, default=21)
+    proj.add_argument("--lag", type=int, default=1)
+    proj.add_argument("--how", choices=AGGREGATIONS, default="mean")
+    proj.add_argument("--mode", choices=("replace", "accumulate"), default="replace")
+    proj.add_argument("--max-age", type=int, default=None)
+    proj.add_argument("--out", default=str(table_path("sentiment_factor")))
+    for p in (add, proj):
+        p.add_argument("--directory", default=str(SENTIMENT_DIR))
+    args = ap.parse_args()
+
+    store = SentimentStore(args.directory)
+    if args.command == "append":
+        events = pd.read_csv(args.csv)
+        if "source" not in events.columns or args.source is not None:
+            events["source"] = args.source or "unknown"
+        added = store.append(events)
+        print(f"{added} events appended ({len(store)} stored, {store.nbytes / 2**20:.1f} MB)")
+    else:
+        prices = read_table(args.prices, tickers=[], index=True)
+        panel = store.project(prices.index, halflife=args.halflife, lag=args.lag,
+                              how=args.how, mode=args.mode, max_age=args.max_age)
+        write_table(panel, args.out)
+        print(f"sentiment {panel.shape} from {len(store)} events -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+
+# Cross-sectional standardization engine.
+
+# Works on a stacked (date x asset x factor) float array and, for each
+# block of dates at once, applies
+
+#     1. winsorization at cross-sectional quantiles
+#     2. optional neutralization: residuals of a per-date regression on
+#        exposures (sector dummies, log size, ...)
+#     3. z-scoring or percentile ranking
+
+# Every statistic is taken across assets on a single date, so nothing
+# leaks from the future (unlike z-scoring a ticker over its own full
+# history). Missing values are masked, never dropped: they stay NaN in
+# the output and are excluded from every cross-sectional statistic.
+
+# Usage:
+#     values, dates, assets, names = stack_factors({"roe": roe, "d2a": d2a})
+#     z = standardize(values, method="zscore", winsor=(0.01, 0.99))
+#     frames = unstack_factors(z, dates, assets, names)
+
+
+import pandas as pd
+import numpy as np
+
+
+# --------------------------------------------------------------------- #
+# Stacking helpers
+# --------------------------------------------------------------------- #
+def stack_factors(factors: dict):
+
+    # factors: {name: wide frame (dates x assets)}. Frames are aligned on
+    # the union of dates and assets.
+
+    # Returns (values[T, N, F], dates, assets, names)
+
+    names = list(factors)
+    dates = sorted(set().union(*(f.index for f in factors.values())))
+    assets = list(dict.fromkeys(a for f in factors.values() for a in f.columns))
+    dates, assets = pd.Index(dates), pd.Index(assets)
+    values = np.stack(
+        [factors[n].reindex(index=dates, columns=assets).to_numpy(dtype=float)
+         for n in names],
+        axis=-1,
+    )
+    return values, dates, assets, names
+
+
+def unstack_factors(values: np.ndarray, dates, assets, names) -> dict:
+    return {n: pd.DataFrame(values[..., i], index=dates, columns=assets)
+            for i, n in enumerate(names)}
+
+
+def sector_exposures(sectors: pd.Series, assets) -> np.ndarray:
+
+    # One-hot (N, K) sector matrix for `assets` from an asset -> sector
+    # mapping; unmapped assets get NaN rows (and so are masked out of the
+    # regression).
+
+    labels = pd.Series(sectors).reindex(pd.Index(assets))
+    dummies = pd.get_dummies(labels, dtype=float).to_numpy()
+    dummies[labels.isna().to_numpy()] = np.nan
+    return dummies
+
+
+# --------------------------------------------------------------------- #
+# Kernels (axis 1 = assets)
+# --------------------------------------------------------------------- #
+def _sorted_with_order(x: np.ndarray):
+
+    # Sort along assets with NaNs last; also return per-slice valid counts
+
+    order = np.argsort(x, axis=1, kind="stable")
+    return np.take_along_axis(x, order, axis=1), order, (~np.isnan(x)).sum(axis=1)
+
+
+def _quantile_sorted(s: np.ndarray, count: np.ndarray, q: float) -> np.ndarray:
+
+    # Linear-interpolated quantile (np.nanquantile's default) read straight
+    # from a NaN-last sorted array
+
+    pos = q * np.maximum(count - 1, 0)
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, np.maximum(count - 1, 0))
+    s_lo = np.take_along_axis(s, lo[:, None], axis=1)[:, 0]
+    s_hi = np.take_along_axis(s, hi[:, None], axis=1)[:, 0]
+    out = s_lo + (pos - lo) * (s_hi - s_lo)
+    out[count == 0] = np.nan
+    return out
+
+
+def _pct_rank_sorted(s: np.ndarray, order: np.ndarray,
+                     count: np.ndarray) -> np.ndarray:
+
+    # Average-tie percentile rank (pandas rank(pct=True)) from a sorted
+    # array, scattered back to the original asset order
+
+    n = s.shape[1]
+    position = np.broadcast_to(np.arange(1, n + 1, dtype=float), s.shape)
+    valid = np.arange(n) < count[:, None]
+
+    starts = np.ones(s.shape, dtype=bool)
+    starts[:, 1:] = s[:, 1:] != s[:, :-1]
+    ends = np.ones(s.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+
+    # First / last position of each tie group, spread over the group
+    first = np.maximum.accumulate(np.where(starts, position, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, position, n + 1)[:, ::-1],
+                                 axis=1)[:, ::-1]
+
+    ranks = np.where(valid, (first + last) / 2 / np.maximum(count, 1)[:, None],
+                     np.nan)
+    out = np.empty_like(ranks)
+    np.put_along_axis(out, order, ranks, axis=1)
+    return out
+
+
+def quantile_buckets(values: np.ndarray, n_quantiles: int) -> np.ndarray:
+
+    # Bucket 1..n_quantiles of every cell along axis 1 (any trailing
+    # axes), from its ordinal position in the cross-section (ties keep
+    # their input order). The bottom and top buckets hold
+    # max(n // n_quantiles, 1) names each, the middle buckets split the
+    # rest evenly; 0 = not bucketed (NaN, or fewer than 2 names)
+
+    _, order, count = _sorted_with_order(values)
+    n = values.shape[1]
+    shape = (1, n) + (1,) * (values.ndim - 2)
+    position = np.empty(values.shape, dtype=np.int64)
+    np.put_along_axis(position, order,
+                      np.broadcast_to(np.arange(n).reshape(shape), values.shape), axis=1)
+
+    count = np.expand_dims(count, 1)
+    size = np.maximum(count // n_quantiles, 1)
+    middle = np.maximum(count - 2 * size, 1)
+    inner = 2 + (position - size) * max(n_quantiles - 2, 0) // middle
+    bucket = np.where(position < size, 1, np.where(position >= count - size, n_quantiles, inner))
+    bucket[(position >= count) | (count < 2)] = 0
+    return bucket
+
+
+def _zscore(x: np.ndarray) -> np.ndarray:
+    mask = ~np.isnan(x)
+    n = mask.sum(axis=1, keepdims=True)
+    filled = np.where(mask, x, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = filled.sum(axis=1, keepdims=True) / n
+        dev = np.where(mask, x - mean, 0.0)
+        std = np.sqrt((dev * dev).sum(axis=1, keepdims=True) / (n - 1))
+        return np.where(mask, dev / std, np.nan)
+
+
+def regress(y: np.ndarray, exposures: np.ndarray):
+
+    # y: (B, N, F) values, exposures: (B, N, K). Per date and factor, a
+    # least-squares fit on the exposures using only assets where both the
+    # value and every exposure are present.
+
+    # Returns (coefficients (B, F, K), residuals (B, N, F)); residuals are
+    # NaN where the asset was not in the fit.
+
+    exposure_ok = ~np.isnan(exposures).any(axis=2)
+    mask = ~np.isnan(y) & exposure_ok[..., None]                # (B, N, F)
+    x = np.where(exposure_ok[..., None], exposures, 0.0)         # (B, N, K)
+    w = mask.astype(float)
+    yw = np.where(mask, y, 0.0)
+
+    # Normal equations per (date, factor) as batched matmuls; pinv copes
+    # with empty sectors
+    xt = x.transpose(0, 2, 1)                                   # (B, K, N)
+    xtx = (xt[:, None] * w.transpose(0, 2, 1)[:, :, None]) @ x[:, None]
+    xty = (xt @ yw).transpose(0, 2, 1)                          # (B, F, K)
+    beta = (np.linalg.pinv(xtx) @ xty[..., None])[..., 0]
+    fitted = x @ beta.transpose(0, 2, 1)
+    return beta, np.where(mask, y - fitted, np.nan)
+
+
+def _neutralize(y: np.ndarray, exposures: np.ndarray) -> np.ndarray:
+
+    # Residuals of the per-date regression of y on the exposures
+
+    return regress(y, exposures)[1]
+
+
+# --------------------------------------------------------------------- #
+# Engine
+# --------------------------------------------------------------------- #
+def standardize(values: np.ndarray,
+                method: str = "zscore",
+                winsor: tuple = None,
+                exposures: np.ndarray = None,
+                mask: np.ndarray = None,
+                block: int = 256) -> np.ndarray:
+
+    # values:    (T, N) or (T, N, F) array, dates x assets x factors
+    # method:    "zscore", "rank" (percentile in (0, 1]) or None
+    # winsor:    (lower, upper) cross-sectional quantiles to clip at
+    # exposures: (N, K) or (T, N, K) regressors to neutralize against
+    # mask:      (T, N) bool universe membership (utils/universe.py);
+    #            cells outside it are NaN in and out
+    # Non-finite values (NaN, +-inf) are missing: NaN out, and left out
+    # of every cross-sectional statistic
+    # block:     dates processed per vectorized step (bounds memory)
+
+    if method not in ("zscore", "rank", None):
+        raise ValueError(f"unknown method {method!r}")
+
+    squeeze = values.ndim == 2
+    values = np.asarray(values, dtype=float)
+    if squeeze:
+        values = values[..., None]
+    n_dates, n_assets, _ = values.shape
+
+    if exposures is not None:
+        exposures = np.asarray(exposures, dtype=float)
+        if exposures.ndim == 2:
+            exposures = np.broadcast_to(exposures, (n_dates,) + exposures.shape)
+
+    out = np.empty_like(values)
+    for start in range(0, n_dates, block):
+        x = values[start:start + block]
+        b = len(x)
+        # +-inf (e.g. a price over a zero book value) is missing, like NaN
+        finite = np.isfinite(x)
+        if mask is not None:
+            finite &= mask[start:start + b, :, None]
+        x = np.where(finite, x, np.nan)
+
+        if winsor is not None:
+            # Move factors next to dates so every kernel sees (slices, assets)
+            flat = x.transpose(0, 2, 1).reshape(-1, n_assets)
+            s, _, count = _sorted_with_order(flat)
+            lower = _quantile_sorted(s, count, winsor[0])[:, None]
+            upper = _quantile_sorted(s, count, winsor[1])[:, None]
+            flat = np.clip(flat, lower, upper)
+            x = flat.reshape(b, -1, n_assets).transpose(0, 2, 1)
+
+        if exposures is not None:
+            x = _neutralize(x, exposures[start:start + b])
+
+        flat = x.transpose(0, 2, 1).reshape(-1, n_assets)
+        if method == "zscore":
+            flat = _zscore(flat)
+        elif method == "rank":
+            flat = _pct_rank_sorted(*_sorted_with_order(flat))
+        out[start:start + b] = flat.reshape(b, -1, n_assets).transpose(0, 2, 1)
+
+    return out[..., 0] if squeeze else out
+
+
+def standardize_frames(factors: dict, **kwargs) -> dict:
+
+    # Convenience wrapper: {name: wide frame} in, {name: wide frame} out,
+    # all factors standardized in one stacked pass.
+
+    # A `universe` (utils/universe.Universe) becomes the mask over the
+    # stacked dates and assets
+
+    universe = kwargs.pop("universe", None)
+    values, dates, assets, names = stack_factors(factors)
+    if universe is not None:
+        kwargs["mask"] = universe.mask(dates, assets)
+    return unstack_factors(standardize(values, **kwargs), dates, assets, names)
@@ -0,0 +1,248 @@
+# Technical indicators over the full date x ticker panel.
+
+# RSI, MACD and moving-average crossovers are all exponential (or simple)
+# moving averages of one of three series, so the panel computes each of
+# those once and every indicator / parameter set reads from them:
+
+#     log_prices - MACD lines and MA crossovers (log space, so a
+#                  ticker's level does not scale its signal and values
+#                  compare across the cross-section)
+#     gains      - positive price changes  } RSI (Wilder smoothing,
+#     losses     - negative price changes  }  alpha = 1 / window)
+
+# EMAs come from one recursive kernel (ewm) that walks the dates once and
+# updates every requested smoothing constant at once, vectorized over
+# (parameter, ticker). EMAs of the log prices are cached by span, so a
+# grid of MACD (fast, slow, signal) combos and EMA crossovers computes
+# each distinct span exactly once.
+
+# NaN handling matches pandas ewm(adjust=False, ignore_na=True): a missing
+# price leaves the average unchanged, the first valid price seeds it, and
+# values need `span` (or `window`) valid observations. Outputs are NaN
+# where the price is missing and, like momentum, lagged 1 day.
+
+# Usage:
+#     panel = TechnicalPanel(prices)
+#     panel.rsi(14); panel.macd(12, 26, 9)["histogram"]; panel.ma_crossover(50, 200)
+#     signals = panel.grid(rsi=(9, 14, 21), macd=((12, 26, 9), (8, 21, 5)),
+#                          crossover=((50, 200), (20, 100)))
+#     signals["rsi_14"], signals["macd_8_21_5"], signals["ma_50_200"]
+
+
+import numpy as np
+import pandas as pd
+
+
+def ewm(values: np.ndarray, alphas) -> np.ndarray:
+
+    # Exponentially weighted means of `values` (..., T, N) along T for
+    # every smoothing constant in `alphas`, whose shape broadcasts against
+    # the leading dims of values: (K, 1) smooths each of M series in
+    # values (M, T, N) with all K constants, (M,) smooths series i with
+    # alphas[i]. Returns broadcast(leading dims) + (T, N).
+
+    # y_t = y_prev + alpha * (x_t - y_prev), seeded with the first valid
+    # x and carried unchanged over NaNs; NaN where x is missing. Warm-up
+    # (min periods) is left to the caller.
+
+    alphas = np.asarray(alphas, dtype=float)[..., None]
+    n_dates = values.shape[-2]
+    lead = np.broadcast_shapes(alphas.shape[:-1], values.shape[:-2])
+    # Date-major, so each step reads and writes one contiguous row block
+    out = np.empty((n_dates,) + lead + values.shape[-1:])
+    step = np.empty(lead + values.shape[-1:])
+    state = np.full_like(step, np.nan)
+    for t in range(n_dates):
+        x = values[..., t, :]
+        np.subtract(x, state, out=step)
+        step *= alphas
+        step += state                       # NaN if x or the state is missing
+        row = out[t]
+        np.copyto(row, state)
+        np.copyto(row, step, where=step == step)
+        np.copyto(row, x, where=row != row)
+        state = row
+    out = np.moveaxis(out, 0, -2)
+
+    out[np.broadcast_to(np.isnan(values), out.shape)] = np.nan
+    return out
+
+
+def cumulative(values: np.ndarray) -> np.ndarray:
+
+    # (2, T + 1, N) running (sum, count) of the valid values with a zero
+    # first row, so any trailing window is a difference of two rows
+
+    valid = ~np.isnan(values)
+    cum = np.zeros((2, len(values) + 1, values.shape[1]))
+    cum[0, 1:] = np.where(valid, values, 0.0)
+    cum[1, 1:] = valid
+    return np.cumsum(cum, axis=1, out=cum)
+
+
+def sma(cum: np.ndarray, window: int, missing: np.ndarray) -> np.ndarray:
+
+    # Mean of the valid values in the trailing `window` rows; NaN below
+    # `window` valid values or where the value itself is missing.
+
+    out = np.full(missing.shape, np.nan)
+    if window <= len(out):
+        total = cum[:, window:] - cum[:, :len(out) - window + 1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            np.divide(total[0], total[1], out=out[window - 1:])
+        out[window - 1:][total[1] < window] = np.nan
+    out[missing] = np.nan
+    return out
+
+
+def lagged(values: np.ndarray, lag: int) -> np.ndarray:
+    if lag == 0:
+        return values
+    out = np.full_like(values, np.nan)
+    out[lag:] = values[:-lag]
+    return out
+
+
+def span_alpha(span: float) -> float:
+    return 2.0 / (span + 1.0)
+
+
+class TechnicalPanel:
+
+    # prices: wide price table (index=Date, columns=tickers)
+
+    def __init__(self, prices: pd.DataFrame):
+        prices = prices.sort_index()
+        self.index, self.columns = prices.index, prices.columns
+        values = prices.to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.log_prices = np.log(values)
+
+        # Price changes split into gains / losses, stacked (2, T, N) so
+        # every RSI window smooths both in the same pass
+        change = np.full_like(values, np.nan)
+        change[1:] = values[1:] - values[:-1]
+        self.moves = np.stack([np.maximum(change, 0.0), np.maximum(-change, 0.0)])
+
+        # Running counts of valid prices / changes drive every warm-up
+        self.n_prices = np.cumsum(~np.isnan(values), axis=0)
+        self.n_moves = np.cumsum(~np.isnan(change), axis=0)
+        self._ema = {}
+        self._cum = None
+
+    def _frame(self, values: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(values, index=self.index, columns=self.columns)
+
+    # ------------------------------------------------------------ EMAs
+    def ema(self, spans) -> dict:
+
+        # {span: EMA of the log prices (T, N)}; spans not yet cached are
+        # computed together in one pass
+
+        spans = sorted(set(spans))
+        missing = [s for s in spans if s not in self._ema]
+        if missing:
+            alphas = np.array([span_alpha(s) for s in missing])[:, None]
+            stacked = ewm(self.log_prices[None], alphas)
+            for i, span in enumerate(missing):
+                out = stacked[i, 0]
+                out[self.n_prices < span] = np.nan
+                self._ema[span] = out
+        return {s: self._ema[s] for s in spans}
+
+    # ----------------------------------------------------- indicators
+    def _rsi(self, windows) -> dict:
+        windows = sorted(set(windows))
+        alphas = np.array([1.0 / w for w in windows])[:, None]
+        # (K, 2, T, N): Wilder averages of gains and losses per window
+        averages = ewm(self.moves, alphas)
+        out = {}
+        for i, window in enumerate(windows):
+            gain, loss = averages[i]
+            total = gain + loss
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rsi = np.where(total > 0, 100.0 * gain / total, 50.0)
+            rsi[np.isnan(total) | (self.n_moves < window)] = np.nan
+            out[window] = rsi
+        return out
+
+    def _macd(self, combos) -> dict:
+
+        # {(fast, slow, signal): (line, signal line)}; every combo's signal
+        # EMA runs in one stacked pass
+
+        combos = sorted(set(combos))
+        emas = self.ema([s for fast, slow, _ in combos for s in (fast, slow)])
+        lines = {(f, s): emas[f] - emas[s] for f, s, _ in combos}
+        smoothed = ewm(np.stack([lines[f, s] for f, s, _ in combos]),
+                       [span_alpha(g) for _, _, g in combos])
+        out = {}
+        for i, (fast, slow, signal) in enumerate(combos):
+            # The line has a value wherever the price has had max(fast, slow)
+            # valid observations, so its own count follows from n_prices
+            n_line = self.n_prices - max(fast, slow) + 1
+            signal_line = smoothed[i]
+            signal_line[n_line < signal] = np.nan
+            out[fast, slow, signal] = (lines[fast, slow], signal_line)
+        return out
+
+    def _crossover(self, pairs, kind: str) -> dict:
+
+        # {(fast, slow): fast MA - slow MA of the log prices}
+
+        if kind not in ("sma", "ema"):
+            raise ValueError(f"unknown moving average {kind!r}")
+        pairs = sorted(set(pairs))
+        spans = {s for pair in pairs for s in pair}
+        if kind == "ema":
+            averages = self.ema(spans)
+        else:
+            if self._cum is None:
+                self._cum = cumulative(self.log_prices)
+            missing = np.isnan(self.log_prices)
+            averages = {w: sma(self._cum, w, missing) for w in spans}
+        return {(fast, slow): averages[fast] - averages[slow] for fast, slow in pairs}
+
+    def rsi(self, window: int = 14, lag: int = 1) -> pd.DataFrame:
+
+        # Wilder RSI in [0, 100] (50 when the price has not moved)
+
+        return self._frame(lagged(self._rsi([window])[window], lag))
+
+    def macd(self, fast: int = 12, slow: int = 26, signal: int = 9,
+             lag: int = 1) -> dict:
+
+        # {"macd", "signal", "histogram"} frames; the line is
+        # EMA_fast - EMA_slow of log prices, i.e. a log-return spread
+
+        line, signal_line = self._macd([(fast, slow, signal)])[fast, slow, signal]
+        return {"macd": self._frame(lagged(line, lag)),
+                "signal": self._frame(lagged(signal_line, lag)),
+                "histogram": self._frame(lagged(line - signal_line, lag))}
+
+    def ma_crossover(self, fast: int = 50, slow: int = 200, kind: str = "sma",
+                     lag: int = 1) -> pd.DataFrame:
+
+        # log(MA_fast) - log(MA_slow) style spread: > 0 while the fast
+        # average is above the slow one, sign change == crossover
+
+        return self._frame(lagged(self._crossover([(fast, slow)], kind)[fast, slow], lag))
+
+    def grid(self, rsi=(), macd=(), crossover=(), kind: str = "sma",
+             lag: int = 1) -> dict:
+
+        # A whole parameter grid in one call:
+        #     rsi:       windows, e.g. (9, 14, 21)           -> "rsi_14"
+        #     macd:      (fast, slow, signal) tuples          -> "macd_12_26_9"
+        #                (the histogram, line - signal)
+        #     crossover: (fast, slow) moving-average pairs    -> "ma_50_200"
+        # Returns {name: DataFrame}, every output lagged `lag` days.
+
+        out = {f"rsi_{w}": v for w, v in self._rsi(rsi).items()} if rsi else {}
+        if macd:
+            for (fast, slow, signal), (line, signal_line) in self._macd(macd).items():
+                out[f"macd_{fast}_{slow}_{signal}"] = line - signal_line
+        if crossover:
+            for (fast, slow), spread in self._crossover(crossover, kind).items():
+                out[f"ma_{fast}_{slow}"] = spread
+        return {name: self._frame(lagged(values, lag)) for name, values in out.items()}
@@ -0,0 +1,415 @@
+# Batched Gaussian hidden Markov model for regime detection.
+
+# A K-state HMM with diagonal Gaussian emissions, fitted by Baum-Welch on
+# B sequences at once: every array carries the batch as its first axis
+# (start (B, K), trans (B, K, K), means / variances (B, K, D)), so the
+# forward and backward recursions are one loop over time whose steps are
+# (B, K) x (B, K, K) matrix products, not one loop per sequence. Both
+# recursions run in log space (each step shifts by its max before the
+# exp, so long sequences never underflow), and emissions come from three
+# batched matmuls instead of a (B, T, K, D) difference array.
+
+# Sequences of different lengths share one padded (B, T, D) array with a
+# validity mask; padded steps and NaN observations carry no likelihood
+# and no sufficient statistics. A missing dimension of an observation
+# only drops that dimension.
+
+# Regimes are refitted on expanding (or rolling) windows ending at every
+# rebalance date. Windows are fitted `batch` at a time as one batch, and
+# each batch starts from the previous batch's latest fit (warm start), so
+# EM only has to adjust to the new months instead of starting cold. After
+# every fit the states are sorted by variance, so state 0 is the calmest
+# and state K-1 the most volatile ("stress") in every window.
+
+# Regime probabilities are filtered (each date uses returns up to that
+# date only, with the parameters of the latest fit before it) and lagged
+# a day like the factors; they feed macro.factor_weights as soft regime
+# flags (README: rotate from momentum to quality in stressed regimes), so
+# the factor set must include both legs of macro.TILTS["stress"].
+
+# Usage (from project/):
+#     python -m src.models.hmm --states 2 --window 1260
+# or
+#     regimes = hmm_regimes(factor_returns, n_states=2)
+#     base = {"momentum": 1 / 3, "low_vol": 1 / 3, "quality": 1 / 3}
+#     weights = factor_weights(regimes["probabilities"], base)
+#     score = tilted_composite({"momentum": mom, "low_vol": vol, "quality": qual}, weights)
+
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.utils.metrics import timed
+
+LOG_2PI = np.log(2.0 * np.pi)
+MIN_PROB = 1e-12            # floor on start / transition probabilities
+MIN_VAR = 1e-3              # variance floor, as a share of each series' variance
+
+
+class HMMParams:
+
+    # start (B, K), trans (B, K, K), means (B, K, D), variances (B, K, D)
+
+    def __init__(self, start, trans, means, variances):
+        self.start = np.asarray(start, dtype=float)
+        self.trans = np.asarray(trans, dtype=float)
+        self.means = np.asarray(means, dtype=float)
+        self.variances = np.asarray(variances, dtype=float)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @property
+    def n_states(self) -> int:
+        return self.start.shape[1]
+
+    def take(self, rows) -> "HMMParams":
+        return HMMParams(self.start[rows], self.trans[rows], self.means[rows],
+                         self.variances[rows])
+
+    def put(self, rows, other: "HMMParams") -> None:
+        self.start[rows] = other.start
+        self.trans[rows] = other.trans
+        self.means[rows] = other.means
+        self.variances[rows] = other.variances
+
+    @classmethod
+    def concat(cls, parts) -> "HMMParams":
+        return cls(*(np.concatenate([getattr(p, name) for p in parts])
+                     for name in ("start", "trans", "means", "variances")))
+
+
+def state_names(n_states: int) -> list[str]:
+
+    # Variance-sorted states; the calmest and the most volatile get the
+    # names macro.TILTS knows
+
+    names = [f"state_{k}" for k in range(n_states)]
+    names[0], names[-1] = "calm", "stress"
+    return names
+
+
+# --------------------------------------------------------------------- #
+# Kernels
+# --------------------------------------------------------------------- #
+def _logsumexp(a: np.ndarray, axis: int) -> np.ndarray:
+    m = np.max(a, axis=axis, keepdims=True)
+    m = np.where(np.isfinite(m), m, 0.0)
+    return np.log(np.exp(a - m).sum(axis=axis)) + np.squeeze(m, axis=axis)
+
+
+def log_emissions(x: np.ndarray, valid: np.ndarray, params: HMMParams) -> np.ndarray:
+
+    # (B, T, K) log densities; NaN dimensions and invalid steps add 0
+
+    observed = ~np.isnan(x) & valid[:, :, None]
+    x0 = np.where(observed, x, 0.0)
+    o = observed.astype(float)
+    inv = 1.0 / params.variances                                  # (B, K, D)
+    const = np.log(params.variances) + LOG_2PI + params.means ** 2 * inv
+    quad = o @ const.transpose(0, 2, 1) + (x0 ** 2) @ inv.transpose(0, 2, 1) \
+        - 2.0 * x0 @ (params.means * inv).transpose(0, 2, 1)
+    return -0.5 * quad
+
+
+def forward(log_b: np.ndarray, params: HMMParams) -> tuple[np.ndarray, np.ndarray]:
+
+    # log alpha (B, T, K) and the log likelihood (B,)
+
+    n_seq, n_steps, _ = log_b.shape
+    log_alpha = np.empty_like(log_b)
+    log_alpha[:, 0] = np.log(params.start) + log_b[:, 0]
+    trans = params.trans
+    for t in range(1, n_steps):
+        prev = log_alpha[:, t - 1]
+        m = prev.max(axis=1, keepdims=True)
+        step = np.matmul(np.exp(prev - m)[:, None, :], trans)[:, 0]
+        log_alpha[:, t] = np.log(step) + m + log_b[:, t]
+    return log_alpha, _logsumexp(log_alpha[:, -1], axis=1)
+
+
+def backward(log_b: np.ndarray, params: HMMParams) -> np.ndarray:
+
+    # log beta (B, T, K)
+
+    log_beta = np.empty_like(log_b)
+    log_beta[:, -1] = 0.0
+    trans = params.trans
+    for t in range(log_b.shape[1] - 2, -1, -1):
+        nxt = log_b[:, t + 1] + log_beta[:, t + 1]
+        m = nxt.max(axis=1, keepdims=True)
+        step = np.matmul(trans, np.exp(nxt - m)[:, :, None])[:, :, 0]
+        log_beta[:, t] = np.log(step) + m
+    return log_beta
+
+
+def filtered(x: np.ndarray, valid: np.ndarray, params: HMMParams) -> np.ndarray:
+
+    # P(state at t | observations up to t), (B, T, K)
+
+    log_alpha, _ = forward(log_emissions(x, valid, params), params)
+    return np.exp(log_alpha - _logsumexp(log_alpha, axis=2)[:, :, None])
+
+
+def e_step(x: np.ndarray, valid: np.ndarray, params: HMMParams):
+
+    # Posterior state weights gamma (B, T, K), expected transition counts
+    # (B, K, K) and the log likelihood (B,)
+
+    log_b = log_emissions(x, valid, params)
+    log_alpha, loglik = forward(log_b, params)
+    log_beta = backward(log_b, params)
+    gamma = np.exp(log_alpha + log_beta - loglik[:, None, None]) * valid[:, :, None]
+
+    # xi summed over t: alpha_t(i) A_ij b_t+1(j) beta_t+1(j) / L, each
+    # side shifted by its own max per step so the exps stay finite
+    left = log_alpha[:, :-1]
+    right = log_b[:, 1:] + log_beta[:, 1:]
+    m_left = left.max(axis=2, keepdims=True)
+    m_right = right.max(axis=2, keepdims=True)
+    scale = np.exp(m_left + m_right - loglik[:, None, None]) * valid[:, 1:, None]
+    xi = np.exp(left - m_left) * scale
+    counts = params.trans * (xi.transpose(0, 2, 1) @ np.exp(right - m_right))
+    return gamma, counts, loglik
+
+
+def m_step(x: np.ndarray, valid: np.ndarray, gamma: np.ndarray, counts: np.ndarray,
+           params: HMMParams, var_floor: np.ndarray) -> HMMParams:
+
+    # Re-estimated parameters; a state without any weight keeps its old
+    # emissions
+
+    observed = ~np.isnan(x) & valid[:, :, None]
+    x0 = np.where(observed, x, 0.0)
+    g = gamma.transpose(0, 2, 1)                                  # (B, K, T)
+    weight = g @ observed.astype(float)                           # (B, K, D)
+    has = weight > 0
+    safe = np.where(has, weight, 1.0)
+    means = np.where(has, (g @ x0) / safe, params.means)
+    variances = np.where(has, (g @ x0 ** 2) / safe - means ** 2, params.variances)
+    variances = np.maximum(variances, var_floor[:, None, :])
+
+    start = np.maximum(gamma[:, 0], MIN_PROB)
+    trans = np.maximum(counts, MIN_PROB)
+    return HMMParams(start / start.sum(axis=1, keepdims=True),
+                     trans / trans.sum(axis=2, keepdims=True), means, variances)
+
+
+def sort_states(params: HMMParams) -> HMMParams:
+
+    # States ordered by their mean variance across dimensions
+
+    order = np.argsort(params.variances.mean(axis=2), axis=1, kind="stable")   # (B, K)
+    rows = np.arange(len(params))[:, None]
+    trans = params.trans[rows[:, :, None], order[:, :, None], order[:, None, :]]
+    return HMMParams(params.start[rows, order], trans,
+                     params.means[rows, order], params.variances[rows, order])
+
+
+def init_params(x: np.ndarray, valid: np.ndarray, n_states: int,
+                persistence: float = 0.95) -> HMMParams:
+
+    # Cold start: every state at the sequence's mean, variances spread
+    # geometrically from 1/2 to 2x its variance, sticky transitions
+
+    observed = ~np.isnan(x) & valid[:, :, None]
+    n = np.maximum(observed.sum(axis=1), 1)                       # (B, D)
+    mean = np.where(observed, x, 0.0).sum(axis=1) / n
+    var = np.where(observed, (x - mean[:, None]) ** 2, 0.0).sum(axis=1) / n
+    var = np.where(var > 0, var, 1.0)
+    spread = np.geomspace(0.5, 2.0, n_states) if n_states > 1 else np.ones(1)
+    n_seq = len(x)
+    trans = np.full((n_states, n_states), (1.0 - persistence) / max(n_states - 1, 1))
+    np.fill_diagonal(trans, persistence if n_states > 1 else 1.0)
+    return HMMParams(np.full((n_seq, n_states), 1.0 / n_states),
+                     np.broadcast_to(trans, (n_seq, n_states, n_states)).copy(),
+                     np.repeat(mean[:, None, :], n_states, axis=1),
+                     var[:, None, :] * spread[None, :, None])
+
+
+def fit_hmm(x: np.ndarray, n_states: int = 2, valid: np.ndarray = None,
+            init: HMMParams = None, n_iter: int = 100, tol: float = 1e-4):
+
+    # Baum-Welch on (B, T, D) sequences (a (T, D) array is one sequence).
+    # Sequences stop iterating once their log likelihood per observation
+    # improves by less than `tol`; the rest carry on as a smaller batch.
+
+    # Returns (params sorted by variance, log likelihood (B,), EM
+    # iterations per sequence (B,)).
+
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 2:
+        x = x[None]
+    valid = np.ones(x.shape[:2], dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+    params = init_params(x, valid, n_states) if init is None else init.take(slice(None))
+    n_obs = np.maximum(valid.sum(axis=1), 1)
+
+    observed = ~np.isnan(x) & valid[:, :, None]
+    n = np.maximum(observed.sum(axis=1), 1)
+    mean = np.where(observed, x, 0.0).sum(axis=1) / n
+    var_floor = MIN_VAR * np.maximum(
+        np.where(observed, (x - mean[:, None]) ** 2, 0.0).sum(axis=1) / n, 1e-12)
+
+    loglik = np.full(len(x), -np.inf)
+    iterations = np.zeros(len(x), dtype=np.int64)
+    active = np.arange(len(x))
+    for _ in range(n_iter):
+        xa, va, pa = x[active], valid[active], params.take(active)
+        gamma, counts, ll = e_step(xa, va, pa)
+        params.put(active, m_step(xa, va, gamma, counts, pa, var_floor[active]))
+        iterations[active] += 1
+        done = (ll - loglik[active]) / n_obs[active] < tol
+        loglik[active] = ll
+        active = active[~done]
+        if not len(active):
+            break
+    return sort_states(params), loglik, iterations
+
+
+# --------------------------------------------------------------------- #
+# Windows
+# --------------------------------------------------------------------- #
+def _stack_windows(x: np.ndarray, starts: np.ndarray, stops: np.ndarray):
+
+    # Rows [start, stop) of x for every window, left-aligned and padded
+
+    length = int((stops - starts).max())
+    offsets = np.arange(length)
+    rows = starts[:, None] + offsets
+    valid = offsets < (stops - starts)[:, None]
+    return x[np.minimum(rows, len(x) - 1)], valid
+
+
+def fit_windows(x: np.ndarray, ends: np.ndarray, n_states: int = 2, window: int = None,
+                batch: int = 12, warm_start: bool = True, **fit_kw):
+
+    # One fit per window of rows ending at (and including) each of `ends`
+    # (expanding from row 0, or the last `window` rows), `batch` windows
+    # per Baum-Welch call; with warm_start every batch starts from the
+    # previous batch's latest fit.
+
+    # Returns (params (W,), log likelihood (W,), iterations (W,)).
+
+    ends = np.asarray(ends)
+    starts = np.zeros_like(ends) if window is None else np.maximum(ends + 1 - window, 0)
+    fits, logliks, iterations = [], [], []
+    latest = None
+    for lo in range(0, len(ends), batch):
+        chunk = slice(lo, lo + batch)
+        xs, valid = _stack_windows(x, starts[chunk], ends[chunk] + 1)
+        init = None
+        if warm_start and latest is not None:
+            init = latest.take(np.zeros(len(xs), dtype=np.int64))
+        params, loglik, n_iter = fit_hmm(xs, n_states, valid, init, **fit_kw)
+        latest = params.take([-1])
+        fits.append(params)
+        logliks.append(loglik)
+        iterations.append(n_iter)
+    return HMMParams.concat(fits), np.concatenate(logliks), np.concatenate(iterations)
+
+
+def filtered_windows(x: np.ndarray, ends: np.ndarray, params: HMMParams, window: int = None,
+                     batch: int = 12) -> np.ndarray:
+
+    # (T, K) filtered probabilities: rows [ends[w], ends[w + 1]) use fit
+    # w, run forward from that window's first row; NaN before ends[0]
+
+    ends = np.asarray(ends)
+    starts = np.zeros_like(ends) if window is None else np.maximum(ends + 1 - window, 0)
+    stops = np.append(ends[1:], len(x))
+    out = np.full((len(x), params.n_states), np.nan)
+    for lo in range(0, len(ends), batch):
+        chunk = slice(lo, lo + batch)
+        xs, valid = _stack_windows(x, starts[chunk], stops[chunk])
+        probs = filtered(xs, valid, params.take(chunk))
+        for w, (start, end, stop) in enumerate(zip(starts[chunk], ends[chunk], stops[chunk])):
+            out[end:stop] = probs[w, end - start:stop - start]
+    return out
+
+
+@timed("hmm_regimes")
+def hmm_regimes(returns: pd.DataFrame, n_states: int = 2, freq: str = "M",
+                window: int = None, min_obs: int = 252, lag: int = 1, batch: int = 12,
+                warm_start: bool = True, **fit_kw) -> dict:
+
+    # returns:  dates x series daily returns (e.g. the factors' long/short
+    #           returns from backtest()); one regime path is fitted on
+    #           all series jointly. Leading rows that are all NaN or 0
+    #           (no positions yet) are skipped.
+    # freq:     refit on the last trading day of each period ("M", "Q", ...)
+    # window:   rows per fit (None = expanding)
+    # min_obs:  first refit once this many rows are available
+    # lag:      rows the probabilities are shifted by before use
+
+    # Returns a dict: probabilities (dates x state names), fit_dates,
+    # params (one set per fit), loglik and iterations per fit.
+
+    from src.portfolio.backtest import rebalance_positions
+
+    returns = returns.sort_index()
+    x = returns.to_numpy(dtype=float)
+    first = np.flatnonzero(np.nan_to_num(x).any(axis=1))
+    if not len(first):
+        raise ValueError("no returns to fit a regime model on")
+    x = x[first[0]:]
+    ends = rebalance_positions(returns.index[first[0]:], freq)
+    ends = ends[ends + 1 >= min_obs]
+    if not len(ends):
+        raise ValueError(f"fewer than min_obs={min_obs} rows before the last refit date")
+
+    with timed("fit") as m:
+        params, loglik, iterations = fit_windows(x, ends, n_states, window, batch,
+                                                 warm_start, **fit_kw)
+        m.add(fits=len(ends), iterations=int(iterations.sum()))
+    with timed("filter"):
+        probs = filtered_windows(x, ends, params, window, batch)
+
+    out = np.full((len(returns), n_states), np.nan)
+    out[first[0]:] = probs
+    probabilities = pd.DataFrame(out, index=returns.index,
+                                 columns=state_names(n_states)).shift(lag)
+    return {"probabilities": probabilities, "fit_dates": returns.index[first[0] + ends],
+            "params": params, "loglik": loglik, "iterations": iterations}
+
+
+def main():
+    from src.features.compute_factors import low_vol, momentum
+    from src.features.macro import factor_weights
+    from src.portfolio.backtest import backtest, daily_returns
+    from src.utils.store import read_table, table_path, write_table
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--prices", default=str(table_path("r1000_cleaned_close_prices")))
+    ap.add_argument("--quality", default=str(table_path("quality_factor_daily_zscore_only")))
+    ap.add_argument("--states", type=int, default=2)
+    ap.add_argument("--window", type=int, default=None, help="rows per fit (default expanding)")
+    ap.add_argument("--freq", default="M")
+    ap.add_argument("--min-obs", type=int, default=252)
+    ap.add_argument("--out", default=str(table_path("hmm_regimes")))
+    args = ap.parse_args()
+
+    # Regimes of the factors' long/short returns; their weights shift with
+    # the stress probability through macro.TILTS (momentum -> quality)
+    prices = read_table(args.prices, index=True)
+    factors = {"momentum": momentum(prices), "low_vol": low_vol(prices),
+               "quality": read_table(args.quality, index=True)}
+    factor_returns = backtest(factors, daily_returns(prices))["returns"]
+    # Until a factor's first book (quality starts later) its leg is not
+    # a zero return but missing, so that dimension drops out of the fit
+    factor_returns = factor_returns.where(factor_returns.fillna(0.0).ne(0.0).cummax())
+    regimes = hmm_regimes(factor_returns, args.states, args.freq, args.window, args.min_obs)
+    weights = factor_weights(regimes["probabilities"].fillna(0.0),
+                             {name: 1.0 / len(factors) for name in factors})
+
+    table = regimes["probabilities"].join(weights.add_suffix("_weight"))
+    write_table(table, args.out)
+    print(f"{len(regimes['fit_dates'])} fits, {regimes['iterations'].mean():.1f} EM iterations "
+          f"on average; mean state probabilities:")
+    print(regimes["probabilities"].mean().round(3).to_string())
+    print(f"Saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
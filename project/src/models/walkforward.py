@@ -0,0 +1,283 @@
+
+# Walk-forward model training.
+
+# Fits a scikit-learn-style estimator (fit(X, y) / predict(X)) on a
+# trailing window of the factor matrix and predicts the block of dates
+# after it, stepping forward one block at a time. The factor matrix is
+# sorted by date once and flattened into float arrays, so every train or
+# test window is a contiguous row range: folds are precomputed as integer
+# bounds and each worker process slices zero-copy views of memory-mapped
+# copies of the arrays, instead of re-filtering a DataFrame per step.
+
+# Labels are forward returns over `horizon` dates, so a training row at
+# date d is only known at d + horizon. Each fold purges the last
+# `horizon` dates before its test block (their labels overlap it) and
+# optionally embargoes `embargo` more.
+
+# Fitted models are pickled under data/cache/models/, keyed by a hash of
+# the estimator's class and parameters, the features, the training window
+# and the training data itself; reruns only fit the folds that changed.
+
+# Usage (from project/):
+#     python -m src.models.walkforward --model random_forest --jobs 4
+# or
+#     result = walk_forward(read_table(table_path("factor_matrix")), estimator)
+#     result["folds"]          # per-fold windows, row counts, fit seconds
+#     result["predictions"]    # date, asset, prediction, fwd_return (, price)
+
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import copy
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.store import PROJECT_DIR, read_table, table_path, write_table
+
+MODEL_CACHE_DIR = PROJECT_DIR / "data" / "cache" / "models"
+FEATURES = ("quality_z", "value_z")
+TARGET = "fwd_return"
+
+
+class Fold:
+
+    # train / test: [start, stop) positions in the sorted unique dates
+
+    def __init__(self, number, train, test):
+        self.number = number
+        self.train = train
+        self.test = test
+
+
+def walk_forward_folds(n_dates: int,
+                       train_window: int = 1000,
+                       test_window: int = 21,
+                       horizon: int = 63,
+                       embargo: int = 0,
+                       expanding: bool = False,
+                       min_train: int = None) -> list[Fold]:
+
+    # Test blocks of test_window dates from the first date with a full
+    # training window (min_train dates when expanding) through the end.
+    # Training for a block starting at t covers dates before
+    # t - horizon - embargo: the last train label ends before t.
+
+    gap = horizon + embargo
+    min_train = train_window if min_train is None else min_train
+    folds = []
+    for start in range(min_train + gap, n_dates, test_window):
+        stop = start - gap
+        train = (0 if expanding else max(stop - train_window, 0), stop)
+        folds.append(Fold(len(folds), train, (start, min(start + test_window, n_dates))))
+    return folds
+
+
+# --------------------------------------------------------------------- #
+# Workers
+# --------------------------------------------------------------------- #
+_ARRAYS = {}
+
+
+def _init_worker(arrays: dict) -> None:
+
+    # arrays: {name: ndarray} in-process, or {name: .npy path} to open as
+    # read-only memory maps (one mapping per worker, shared pages)
+
+    _ARRAYS.clear()
+    for name, value in arrays.items():
+        _ARRAYS[name] = np.load(value, mmap_mode="r") if isinstance(value, (str, Path)) \
+            else value
+
+
+def _fit_fold(estimator, train_rows: tuple, test_rows: tuple, cache_path):
+
+    # Fit on rows [train_rows), predict rows [test_rows) of the shared
+    # arrays; reuse the pickled model when cache_path exists.
+    # Returns (predictions, fit seconds, cached).
+
+    x, y = _ARRAYS["x"], _ARRAYS["y"]
+    cache_path = None if cache_path is None else Path(cache_path)
+    if cache_path is not None and cache_path.exists():
+        with cache_path.open("rb") as fh:
+            model = pickle.load(fh)
+        return model.predict(x[slice(*test_rows)]), 0.0, True
+
+    start = time.perf_counter()
+    estimator.fit(x[slice(*train_rows)], y[slice(*train_rows)])
+    secs = time.perf_counter() - start
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("wb") as fh:
+            pickle.dump(estimator, fh)
+        tmp.replace(cache_path)
+    return estimator.predict(x[slice(*test_rows)]), secs, False
+
+
+# --------------------------------------------------------------------- #
+# Harness
+# --------------------------------------------------------------------- #
+def _params(estimator) -> str:
+    params = estimator.get_params() if hasattr(estimator, "get_params") \
+        else vars(estimator)
+    return json.dumps(params, sort_keys=True, default=repr)
+
+
+def model_key(estimator, features, target, first_date, last_date,
+              x: np.ndarray, y: np.ndarray) -> str:
+
+    # Cache key of one fitted model: estimator class + parameters, feature
+    # and target names, the training window and the training rows
+
+    h = hashlib.sha256()
+    cls = type(estimator)
+    h.update(json.dumps([f"{cls.__module__}.{cls.__qualname__}", _params(estimator),
+                         list(features), target, str(first_date), str(last_date)]).encode())
+    h.update(np.ascontiguousarray(x).data)
+    h.update(np.ascontiguousarray(y).data)
+    return h.hexdigest()
+
+
+def walk_forward(factor_matrix: pd.DataFrame,
+                 estimator,
+                 features=FEATURES,
+                 target: str = TARGET,
+                 train_window: int = 1000,
+                 test_window: int = 21,
+                 horizon: int = 63,
+                 embargo: int = 0,
+                 expanding: bool = False,
+                 jobs: int = None,
+                 cache_dir=MODEL_CACHE_DIR) -> dict:
+
+    # factor_matrix: long (date, asset, features..., target) rows; rows
+    #                with a missing feature or target are dropped
+    # estimator:     unfitted scikit-learn-style estimator, copied per fold
+    # train_window / test_window / horizon / embargo: in dates of the
+    #                matrix (trading days); see walk_forward_folds
+    # jobs:          worker processes (1 = in-process, None = CPU count)
+    # cache_dir:     fitted model cache, None to disable
+
+    # Returns {"folds": per-fold DataFrame, "predictions": long DataFrame}
+
+    features = [features] if isinstance(features, str) else list(features)
+    cols = features + [target]
+    df = factor_matrix.dropna(subset=cols).sort_values("date", kind="stable")
+    codes, dates = pd.factorize(pd.to_datetime(df["date"]), sort=True)
+    x = np.ascontiguousarray(df[features].to_numpy(dtype=float))
+    y = np.ascontiguousarray(df[target].to_numpy(dtype=float))
+
+    # Row bounds of every date: dates [a, b) are rows [bounds[a], bounds[b])
+    bounds = np.searchsorted(codes, np.arange(len(dates) + 1))
+    folds = walk_forward_folds(len(dates), train_window, test_window, horizon,
+                               embargo, expanding)
+    if not folds:
+        raise ValueError(f"{len(dates)} dates is too short for a {train_window}-date "
+                         f"window plus a {horizon + embargo}-date purge")
+
+    tasks = []
+    for fold in folds:
+        train_rows = (bounds[fold.train[0]], bounds[fold.train[1]])
+        test_rows = (bounds[fold.test[0]], bounds[fold.test[1]])
+        cache_path = None
+        if cache_dir is not None:
+            key = model_key(estimator, features, target, dates[fold.train[0]],
+                            dates[fold.train[1] - 1], x[slice(*train_rows)],
+                            y[slice(*train_rows)])
+            cache_path = Path(cache_dir) / f"{key}.pkl"
+        tasks.append((train_rows, test_rows, cache_path))
+
+    if jobs == 1:
+        _init_worker({"x": x, "y": y})
+        outputs = [_fit_fold(copy.deepcopy(estimator), *task) for task in tasks]
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {}
+            for name, arr in (("x", x), ("y", y)):
+                paths[name] = str(Path(tmp) / f"{name}.npy")
+                np.save(paths[name], arr)
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                     initargs=(paths,)) as pool:
+                futures = [pool.submit(_fit_fold, estimator, *task) for task in tasks]
+                outputs = [f.result() for f in futures]
+
+    rows = []
+    for fold, (train_rows, test_rows, _), (_, secs, cached) in zip(folds, tasks, outputs):
+        rows.append({
+            "fold": fold.number,
+            "train_start": dates[fold.train[0]], "train_end": dates[fold.train[1] - 1],
+            "test_start": dates[fold.test[0]], "test_end": dates[fold.test[1] - 1],
+            "n_train": train_rows[1] - train_rows[0], "n_test": test_rows[1] - test_rows[0],
+            "fit_seconds": secs, "cached": cached,
+        })
+
+    first = tasks[0][1][0]
+    keep = ["date", "asset"] + (["price"] if "price" in df.columns else [])
+    predictions = df.iloc[first:][keep].reset_index(drop=True)
+    predictions["prediction"] = np.concatenate([pred for pred, _, _ in outputs])
+    predictions[target] = y[first:]
+    return {"folds": pd.DataFrame(rows), "predictions": predictions}
+
+
+# --------------------------------------------------------------------- #
+# CLI
+# --------------------------------------------------------------------- #
+def make_estimator(name: str, seed: int = 0):
+
+    # The README's model families; imported lazily so the harness itself
+    # only needs numpy / pandas
+
+    if name == "random_forest":
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(n_estimators=200, min_samples_leaf=100,
+                                     max_features=0.5, n_jobs=1, random_state=seed)
+    if name == "xgboost":
+        from xgboost import XGBRegressor
+        return XGBRegressor(n_estimators=300, max_depth=4, learning_rate=0.05,
+                            subsample=0.8, n_jobs=1, random_state=seed)
+    if name == "ridge":
+        from sklearn.linear_model import Ridge
+        return Ridge(alpha=1.0)
+    raise ValueError(f"unknown model {name!r}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="random_forest",
+                    choices=["random_forest", "xgboost", "ridge"])
+    ap.add_argument("--features", nargs="+", default=list(FEATURES))
+    ap.add_argument("--train-window", type=int, default=1000)
+    ap.add_argument("--test-window", type=int, default=21)
+    ap.add_argument("--horizon", type=int, default=63,
+                    help="forward return horizon in trading days (purge length)")
+    ap.add_argument("--embargo", type=int, default=0)
+    ap.add_argument("--expanding", action="store_true")
+    ap.add_argument("--jobs", type=int, default=None)
+    ap.add_argument("--no-cache", action="store_true")
+    args = ap.parse_args()
+
+    result = walk_forward(read_table(table_path("factor_matrix")),
+                          make_estimator(args.model), features=args.features,
+                          train_window=args.train_window, test_window=args.test_window,
+                          horizon=args.horizon, embargo=args.embargo,
+                          expanding=args.expanding, jobs=args.jobs,
+                          cache_dir=None if args.no_cache else MODEL_CACHE_DIR)
+
+    folds = result["folds"]
+    print(folds.to_string(index=False))
+    print(f"\n{len(folds)} folds, {int(folds['cached'].sum())} from cache, "
+          f"fit {folds['fit_seconds'].sum():.2f}s total")
+    out = write_table(result["predictions"], table_path(f"predictions_{args.model}"))
+    print(f"Saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+
+# ETL pipeline runner.
+
+# Declares every stage with its input and output tables, then runs the
+# DAG: a stage is skipped when the content hash of its inputs, its
+# parameters and its code - its own module plus every src module it
+# imports, directly or not - match the last successful run (and
+# its outputs are still intact); stages whose dependencies are done run
+# concurrently in a process pool (value and quality, for instance).
+# With --jobs 1 the stages run one after another in this process
+# instead, sharing its session table cache (utils/cache.py), so the
+# price panel is parsed once for the whole run. Each stage's metrics
+# record its table reads, cache hits and MB loaded from disk.
+
+# Usage (from project/):
+#     python -m src.pipeline                      # run everything stale
+#     python -m src.pipeline --until merge        # merge and its ancestors
+#     python -m src.pipeline --force value        # rerun value (and, if its
+#                                                 # outputs change, dependents)
+#     python -m src.pipeline --force all --jobs 2
+#     python -m src.pipeline --jobs 1             # in-process, shared cache
+
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+import argparse
+import ast
+import hashlib
+import json
+import runpy
+import sys
+import time
+
+from src.utils.cache import session_cache
+from src.utils.metrics import run_id, set_recording, timed
+from src.utils.store import PROJECT_DIR, RAW_EQUITY_DIR, table_path
+from src.utils.universe import UNIVERSE_DIR
+
+MANIFEST_PATH = PROJECT_DIR / "data" / "state" / "pipeline_manifest.json"
+SRC_DIR = Path(__file__).resolve().parent
+
+
+class Stage:
+
+    # module: run as `python -m <module> <args>` in a worker process
+    # inputs / outputs: files or dataset directories
+    # params: anything else that should invalidate the cache when changed
+
+    def __init__(self, name, module, inputs=(), outputs=(), args=(), params=None):
+        self.name = name
+        self.module = module
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.args = [str(a) for a in args]
+        self.params = params or {}
+
+
+PRICES = table_path("r1000_cleaned_close_prices")
+FORWARD_RETURNS = table_path("forward_returns")
+FORWARD_RETURNS_BY_HORIZON = table_path("forward_returns_by_horizon")
+HORIZONS = (21, 63, 126)
+
+STAGES = [
+    Stage("validate", "src.etl.validate_prices",
+          inputs=[RAW_EQUITY_DIR / "r1000_close_prices.csv"],
+          outputs=[PRICES]),
+    Stage("forward_returns", "src.etl.compute_forward_returns",
+          inputs=[PRICES],
+          outputs=[FORWARD_RETURNS, FORWARD_RETURNS_BY_HORIZON],
+          args=["--prices", PRICES, "--out", FORWARD_RETURNS, "--horizon", 63,
+                "--horizons", *HORIZONS, "--stacked-out", FORWARD_RETURNS_BY_HORIZON]),
+    Stage("value", "src.features.pb_ratios",
+          inputs=[PRICES, UNIVERSE_DIR],
+          outputs=[table_path("value_factor"), table_path("value_factor_z")]),
+    # Fundamentals come from the network (through the fundamentals cache),
+    # so this stage only reruns on price, code or param changes or --force
+    Stage("quality", "src.etl.load_quality_z",
+          inputs=[PRICES, UNIVERSE_DIR],
+          outputs=[table_path("quality_factor_daily_full"),
+                   table_path("quality_factor_daily_zscore_only")]),
+    Stage("merge", "src.etl.merge",
+          inputs=[table_path("quality_factor_daily_zscore_only"),
+                  table_path("value_factor_z"), PRICES, FORWARD_RETURNS],
+          outputs=[table_path("factor_matrix")]),
+    Stage("factor_ic", "src.features.ic",
+          inputs=[table_path("factor_matrix"), FORWARD_RETURNS_BY_HORIZON, UNIVERSE_DIR],
+          outputs=[table_path("factor_ic")]),
+]
+
+
+# --------------------------------------------------------------------- #
+# Hashing
+# --------------------------------------------------------------------- #
+def hash_path(path: Path) -> str:
+
+    # Content hash of a file, or of every file under a dataset directory
+    # (relative names included, so renamed partitions count as changes)
+
+    h = hashlib.sha256()
+    path = Path(path)
+    if not path.exists():
+        return "missing"
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    for f in files:
+        h.update(str(f.relative_to(path if path.is_dir() else path.parent)).encode())
+        with f.open("rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def module_file(module: str):
+
+    # Source file of a src.* module (package __init__ for packages), or
+    # None for anything else: third-party modules and names imported from
+    # a module rather than submodules of it
+
+    parts = module.split(".")
+    if parts[0] != SRC_DIR.name:
+        return None
+    base = SRC_DIR.joinpath(*parts[1:])
+    for path in (base.with_suffix(".py"), base / "__init__.py"):
+        if path.is_file():
+            return path
+    return None
+
+
+def code_dependencies(module: str) -> list[Path]:
+
+    # Every src source file `module` can execute: itself, the src modules
+    # it imports (function-level imports included) and theirs, plus the
+    # package __init__ files on the way. Found by parsing the sources, so
+    # nothing is imported.
+
+    seen: dict[str, Path] = {}
+    todo = [module]
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        path = module_file(name)
+        if path is None:
+            continue
+        seen[name] = path
+        parents = name.split(".")
+        todo += [".".join(parents[:i]) for i in range(1, len(parents))]
+        for node in ast.walk(ast.parse(path.read_text(), str(path))):
+            if isinstance(node, ast.Import):
+                todo += [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                todo.append(node.module)
+                todo += [f"{node.module}.{alias.name}" for alias in node.names]
+    return sorted(set(seen.values()))
+
+
+def stage_key(stage: Stage) -> str:
+
+    # Inputs + parameters + the source of every src module the stage runs
+
+    h = hashlib.sha256()
+    for source in code_dependencies(stage.module):
+        h.update(f"{source.relative_to(SRC_DIR)}:{hash_path(source)}".encode())
+    h.update(json.dumps([stage.module, stage.args, stage.params],
+                        sort_keys=True, default=str).encode())
+    for p in stage.inputs:
+        h.update(f"{p}:{hash_path(p)}".encode())
+    return h.hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH) -> dict:
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_manifest(manifest: dict, path=MANIFEST_PATH) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+
+
+def is_up_to_date(stage: Stage, key: str, manifest: dict) -> bool:
+    entry = manifest.get(stage.name)
+    if entry is None or entry["key"] != key:
+        return False
+    return all(hash_path(p) == entry["outputs"].get(str(p)) for p in stage.outputs)
+
+
+# --------------------------------------------------------------------- #
+# Scheduling
+# --------------------------------------------------------------------- #
+def dependencies(stages) -> dict:
+
+    # stage name -> names of the stages producing its inputs
+
+    producer = {p: s.name for s in stages for p in s.outputs}
+    return {s.name: {producer[p] for p in s.inputs if p in producer}
+            for s in stages}
+
+
+def select(stages, until=None) -> list:
+
+    # `until` and everything it transitively depends on
+
+    if until is None:
+        return list(stages)
+    deps = dependencies(stages)
+    if until not in deps:
+        raise SystemExit(f"unknown stage {until!r}; choose from {list(deps)}")
+    wanted, todo = set(), [until]
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(deps[name])
+    return [s for s in stages if s.name in wanted]
+
+
+def _run_stage(name: str, module: str, args: list) -> float:
+
+    # Worker: execute the stage module as __main__ with its argv; the
+    # stage's own timed() blocks nest under its name in the metrics
+
+    start = time.perf_counter()
+    argv, sys.argv = sys.argv, [module] + args
+    cache = session_cache()
+    before = cache.stats()
+    try:
+        with timed(name, module=module) as m:
+            try:
+                runpy.run_module(module, run_name="__main__", alter_sys=True)
+            finally:
+                after = cache.stats()
+                m.add(table_reads=after["reads"] - before["reads"],
+                      cache_hits=after["hits"] - before["hits"],
+                      read_mb=round(after["read_mb"] - before["read_mb"], 1))
+    finally:
+        sys.argv = argv
+    return time.perf_counter() - start
+
+
+class InlineExecutor:
+
+    # Stand-in for the process pool with jobs=1: a submitted stage runs
+    # right away in this process and returns an already finished future
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except (Exception, SystemExit) as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def run(stages=STAGES, until=None, force=(), jobs=None,
+        manifest_path=MANIFEST_PATH) -> dict:
+
+    # Returns {stage: (status, seconds)}; status is ran / skipped /
+    # failed / blocked (an upstream stage failed).
+
+    stages = select(stages, until)
+    by_name = {s.name: s for s in stages}
+    deps = dependencies(stages)
+    force = set(by_name) if "all" in force else set(force)
+    unknown = force - set(by_name)
+    if unknown:
+        raise SystemExit(f"unknown stage(s) to force: {sorted(unknown)}")
+
+    manifest = load_manifest(manifest_path)
+    results, running, keys = {}, {}, {}
+    run_id()            # exported before the workers start, so they share it
+
+    def ready():
+        return [n for n in by_name
+                if n not in results and n not in running.values()
+                and deps[n] <= set(results)]
+
+    pool = InlineExecutor() if jobs == 1 else ProcessPoolExecutor(max_workers=jobs)
+    with pool:
+        while len(results) < len(by_name):
+            for name in ready():
+                stage = by_name[name]
+                if any(results[d][0] in ("failed", "blocked") for d in deps[name]):
+                    results[name] = ("blocked", 0.0)
+                    continue
+                keys[name] = stage_key(stage)
+                if name not in force and is_up_to_date(stage, keys[name], manifest):
+                    results[name] = ("skipped", 0.0)
+                    continue
+                print(f"[pipeline] start {name}")
+                running[pool.submit(_run_stage, name, stage.module, stage.args)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    secs = future.result()
+                except BaseException as e:
+                    print(f"[pipeline] {name} failed: {e!r}")
+                    results[name] = ("failed", 0.0)
+                    continue
+                results[name] = ("ran", secs)
+                manifest[name] = {
+                    "key": keys[name],
+                    "outputs": {str(p): hash_path(p) for p in by_name[name].outputs},
+                }
+                save_manifest(manifest, manifest_path)
+
+    return {name: results[name] for name in by_name}
+
+
+def print_summary(results: dict) -> None:
+    print(f"\n{'stage':<18}{'status':<10}{'seconds':>9}")
+    for name, (status, secs) in results.items():
+        print(f"{name:<18}{status:<10}{secs:>9.2f}")
+    print(f"{'total':<28}{sum(s for _, s in results.values()):>9.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--until", help="run this stage and its ancestors only")
+    ap.add_argument("--force", nargs="*", default=[],
+                    help="stage names to rerun regardless of cache, or 'all'")
+    ap.add_argument("--jobs", type=int, default=None,
+                    help="worker processes (default: CPU count; 1 = run the "
+                         "stages in this process, sharing the table cache)")
+    args = ap.parse_args()
+
+    set_recording()
+    results = run(until=args.until, force=args.force, jobs=args.jobs)
+    print_summary(results)
+    if args.jobs == 1:
+        print(f"table cache: {session_cache().stats()}")
+    if any(status in ("failed", "blocked") for status, _ in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+
+# Vectorized long/short decile backtester.
+
+# At every rebalance date (last trading day of each month by default) the
+# cross-section of each signal is ranked into quantiles in one stacked
+# pass, the top bucket is bought and the bottom bucket sold short (equal
+# weight within each leg, dollar neutral), and positions then drift with
+# prices until the next rebalance. Nothing loops per date or per name:
+
+#     quantiles - one standardize.quantile_buckets call (ordinal, fixed
+#                 leg sizes) over every (rebalance date, asset, signal) cell
+#     drift     - cumulative log growth of each asset; a position opened at
+#                 rebalance r is worth w * exp(L[t] - L[r]) on day t, so a
+#                 holding period's NAV path is one matrix product with the
+#                 weights of every signal variant
+
+# Signals are used as observed on the rebalance date and trade at that
+# close; the first return earned is the next day's. Features from
+# compute_factors are already lagged a day, so no further lag is applied.
+
+# Usage:
+#     prices = read_table(table_path("r1000_cleaned_close_prices"), index=True)
+#     result = backtest({"momentum": momentum(prices), "low_vol": low_vol(prices)},
+#                       daily_returns(prices))
+#     result["summary"]
+
+
+import pandas as pd
+import numpy as np
+
+from src.features.standardize import quantile_buckets
+from src.utils.panel import Panel
+
+TRADING_DAYS = 252
+
+
+# --------------------------------------------------------------------- #
+# Inputs
+# --------------------------------------------------------------------- #
+def daily_returns(prices: pd.DataFrame) -> pd.DataFrame:
+
+    # Simple close-to-close returns; NaN where either close is missing
+
+    prices = prices.sort_index()
+    values = prices.to_numpy(dtype=float)
+    out = np.full(values.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = values[1:] / values[:-1] - 1.0
+    return pd.DataFrame(out, index=prices.index, columns=prices.columns)
+
+
+def from_factor_matrix(factor_matrix: pd.DataFrame, signals,
+                       price_col: str = "price"):
+
+    # Wide signal frames and daily returns from the long factor matrix
+    # (date, asset, *factors, price, fwd_return). Returns ({name: wide
+    # signal}, wide daily returns) ready for backtest().
+
+    signals = [signals] if isinstance(signals, str) else list(signals)
+    panel = Panel.from_long(factor_matrix, fields=signals + [price_col])
+    return ({name: panel.frame(name) for name in signals},
+            daily_returns(panel.frame(price_col)))
+
+
+def rebalance_positions(dates: pd.DatetimeIndex, freq: str = "M") -> np.ndarray:
+
+    # Row positions of the last trading day in each period ("M", "Q",
+    # "W", ...) present in `dates`. The final row is never a rebalance:
+    # its period may not be over yet.
+
+    periods = pd.DatetimeIndex(dates).to_period(freq).asi8
+    return np.flatnonzero(periods[1:] != periods[:-1])
+
+
+# --------------------------------------------------------------------- #
+# Kernels
+# --------------------------------------------------------------------- #
+def quantile_weights(signals: np.ndarray, n_quantiles: int = 10,
+                     leg: float = 0.5, mask: np.ndarray = None) -> np.ndarray:
+
+    # signals: (R, N, S) values on the rebalance dates. Names are
+    # bucketed by ordinal position (standardize.quantile_buckets), so the
+    # top and bottom buckets hold max(n // n_quantiles, 1) names each;
+    # the top gets +leg and the bottom -leg, split equally. A date with
+    # either leg empty holds nothing, so every book is dollar neutral.
+    # NaN signals and names outside the (R, N) membership mask are not
+    # held. Returns (R, N, S) weights.
+
+    if mask is not None:
+        signals = np.where(mask[:, :, None], signals, np.nan)
+    bucket = quantile_buckets(np.asarray(signals, dtype=float), n_quantiles)
+    long = bucket == n_quantiles
+    short = bucket == 1
+    n_long = long.sum(axis=1, keepdims=True)
+    n_short = short.sum(axis=1, keepdims=True)
+    held = (n_long > 0) & (n_short > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = (np.where(long & held, leg / n_long, 0.0)
+                   - np.where(short & held, leg / n_short, 0.0))
+    return weights
+
+
+def drift(returns: np.ndarray, positions: np.ndarray, weights: np.ndarray):
+
+    # returns:   (T, N) daily simple returns (NaN = flat that day)
+    # positions: (R,) rebalance rows
+    # weights:   (R, N, S) target weights set at the close of each row
+
+    # Returns (daily portfolio returns (T, S), turnover (R, S)). Turnover
+    # is one-way: half the summed |target - drifted| weight change, with
+    # the first rebalance trading out of cash.
+
+    n_dates, n_assets = returns.shape
+    n_signals = weights.shape[2]
+    log_growth = np.cumsum(np.log1p(np.nan_to_num(returns, nan=0.0)), axis=0)
+
+    port = np.full((n_dates, n_signals), np.nan)
+    turnover = np.empty((len(positions), n_signals))
+    held = np.zeros((n_assets, n_signals))
+    ends = np.append(positions[1:], n_dates - 1)
+
+    for k, (start, end) in enumerate(zip(positions, ends)):
+        turnover[k] = 0.5 * np.abs(weights[k] - held).sum(axis=0)
+        # Growth of each position since the rebalance close, then the
+        # holding period's NAV path (relative to NAV at `start`) for every
+        # signal at once
+        growth = np.exp(log_growth[start + 1:end + 1] - log_growth[start])
+        nav = 1.0 + (growth - 1.0) @ weights[k]
+        port[start + 1] = nav[0] - 1.0
+        port[start + 2:end + 1] = nav[1:] / nav[:-1] - 1.0
+        # Value weights just before the next rebalance
+        held = weights[k] * growth[-1][:, None] / nav[-1]
+
+    return port, turnover
+
+
+# --------------------------------------------------------------------- #
+# Engine
+# --------------------------------------------------------------------- #
+def performance(returns: pd.DataFrame, turnover: pd.DataFrame) -> pd.DataFrame:
+
+    # Annualized return / vol / Sharpe, max drawdown and mean turnover per
+    # signal (one row each)
+
+    r = returns.dropna(how="all")
+    nav = (1.0 + r.fillna(0.0)).cumprod()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ann_return = r.mean() * TRADING_DAYS
+        ann_vol = r.std() * np.sqrt(TRADING_DAYS)
+        summary = pd.DataFrame({
+            "ann_return": ann_return,
+            "ann_vol": ann_vol,
+            "sharpe": ann_return / ann_vol,
+            "max_drawdown": (nav / nav.cummax() - 1.0).min(),
+            "avg_turnover": turnover.mean(),
+        })
+    summary.index.name = "signal"
+    return summary
+
+
+def _results(returns: np.ndarray, positions: np.ndarray, weights: np.ndarray,
+             dates, assets, names) -> dict:
+    port, turnover = drift(returns, positions, weights)
+    port = pd.DataFrame(port, index=dates, columns=pd.Index(names, name="signal"))
+    turnover = pd.DataFrame(turnover, index=dates[positions], columns=port.columns)
+    nav = (1.0 + port.fillna(0.0)).cumprod()
+    return {
+        "returns": port,
+        "nav": nav,
+        "drawdown": nav / nav.cummax() - 1.0,
+        "turnover": turnover,
+        "summary": performance(port, turnover),
+        "weights": weights,
+        "assets": assets,
+    }
+
+
+def backtest(signals: dict, returns: pd.DataFrame, freq: str = "M",
+             n_quantiles: int = 10, leg: float = 0.5, universe=None) -> dict:
+
+    # signals:  {name: wide frame (dates x assets)}; any number of variants
+    #           run in one batched pass over the same returns
+    # returns:  wide daily simple returns (see daily_returns)
+    # freq:     rebalance period, rebalancing on its last trading day
+    # universe: utils/universe.Universe; deciles are formed among each
+    #           rebalance date's index members only
+
+    # Returns a dict of frames: returns / nav / drawdown (dates x signal),
+    # turnover (rebalance dates x signal), summary (signal x metric), and
+    # weights (rebalance date x asset x signal array) for cost models.
+
+    names = list(signals)
+    panel = Panel.from_frames({"returns": returns}, how="union")
+    for name in names:
+        panel.add(name, signals[name])
+
+    positions = rebalance_positions(panel.dates, freq)
+    stacked = np.stack([panel[name][positions] for name in names], axis=-1)
+    mask = None if universe is None else universe.mask(panel.dates[positions], panel.assets)
+    weights = quantile_weights(stacked, n_quantiles, leg, mask)
+    return _results(panel["returns"], positions, weights,
+                    panel.dates, panel.assets, names)
+
+
+def backtest_weights(weights: dict, returns: pd.DataFrame, rebalance_dates,
+                     assets) -> dict:
+
+    # Same outputs as backtest() for precomputed target weights, e.g. from
+    # optimizer.optimize: weights {name: (R, N) array} set at the close of
+    # each rebalance date, columns in `assets` order.
+
+    names = list(weights)
+    panel = Panel.from_frames({"returns": returns}, how="union")
+    positions = panel.dates.get_indexer(pd.DatetimeIndex(rebalance_dates))
+    if (positions < 0).any():
+        raise KeyError("rebalance dates missing from the returns index")
+    cols = panel.codes(pd.Index(assets).astype(str).str.upper())
+    stacked = np.zeros((len(positions), len(panel.assets), len(names)))
+    for i, name in enumerate(names):
+        stacked[:, cols[cols >= 0], i] = np.asarray(weights[name])[:, cols >= 0]
+    return _results(panel["returns"], positions, stacked,
+                    panel.dates, panel.assets, names)
@@ -0,0 +1,244 @@
+# Transaction-cost, turnover and rebalance-threshold simulator.
+
+# Takes target weights on rebalance dates (from backtest / optimizer)
+# and the price panel. Between rebalances positions drift with prices, as
+# in backtest.drift; on each rebalance close every position is traded
+# towards its target under
+
+#     band          - no-trade band in weight units: a name whose drifted
+#                     weight is within `band` of its target is not traded,
+#                     otherwise it is traded to the near edge of the band
+#     participation - partial fills: at most participation x ADV dollars
+#                     of a name trade per rebalance, the rest is left
+#                     unfilled (the next rebalance retargets it)
+#     spread_bps    - half the quoted spread paid on every traded dollar
+#     impact        - square-root market impact: a trade of q dollars costs
+#                     impact x sigma x sqrt(q / ADV) per dollar, with sigma
+#                     the name's trailing daily volatility
+#     aum           - starting capital in dollars, which sets the dollar
+#                     size of every weight change
+
+# Costs come out of NAV at the rebalance close, so they show up in the
+# next day's net return. Realized weights depend on the previous
+# rebalance, so the rebalances run in sequence. Each rebalance is a few
+# array ops over (assets, combos), where a combo is one (weights
+# variant, cost settings) pair, so a whole grid costs about one pass.
+
+# ADV is a dollar-volume panel (dates x assets) or a single dollar value
+# (the sample data has no volume); missing ADV / volatility cells take
+# the cross-sectional median of their date.
+
+# Usage:
+#     grid = cost_grid(band=(0, 0.001, 0.0025), spread_bps=(5, 10),
+#                      impact=(0.1, 0.3), aum=(1e8, 1e9))
+#     result = simulate_costs({"mv": weights}, prices, rebalance_dates, assets, grid)
+#     result["summary"].sort_values("sharpe")
+
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from src.features.rolling import RollingPanel
+from src.portfolio.backtest import TRADING_DAYS, daily_returns, performance
+from src.utils.panel import Panel
+
+COST_DEFAULTS = {
+    "band": 0.0,
+    "spread_bps": 10.0,
+    "impact": 0.1,
+    "participation": np.inf,
+    "aum": 1e9,
+}
+DEFAULT_ADV = 5e7            # dollars, when no volume panel is given
+VOL_WINDOW = 63
+
+
+def cost_grid(**values) -> pd.DataFrame:
+
+    # Every combination of the given settings (scalars or sequences),
+    # unspecified ones at COST_DEFAULTS. One row per setting.
+
+    unknown = sorted(set(values) - set(COST_DEFAULTS))
+    if unknown:
+        raise KeyError(f"unknown cost settings {unknown}")
+    axes = {k: np.atleast_1d(values.get(k, v)).astype(float)
+            for k, v in COST_DEFAULTS.items()}
+    return pd.DataFrame(list(itertools.product(*axes.values())), columns=list(axes))
+
+
+# --------------------------------------------------------------------- #
+# Kernels (arrays are (assets, combos))
+# --------------------------------------------------------------------- #
+def band_trades(held: np.ndarray, target: np.ndarray, band: np.ndarray,
+                max_trade: np.ndarray):
+
+    # Trades from the drifted weights to the edge of the no-trade band
+    # around target, capped at max_trade in absolute weight. Returns
+    # (trades, wanted) with wanted the uncapped trades.
+
+    gap = target - held
+    wanted = np.where(np.abs(gap) > band, gap - np.sign(gap) * band, 0.0)
+    return np.clip(wanted, -max_trade, max_trade), wanted
+
+
+def trading_costs(trades: np.ndarray, dollars: np.ndarray, spread: np.ndarray,
+                  impact: np.ndarray, sigma: np.ndarray, adv: np.ndarray):
+
+    # (spread cost, impact cost) per combo as a fraction of NAV, for
+    # trades in weight units worth |trades| x dollars
+
+    size = np.abs(trades)
+    spread_cost = (size * spread).sum(axis=0)
+    impact_cost = (size * impact * sigma * np.sqrt(size * dollars / adv)).sum(axis=0)
+    return spread_cost, impact_cost
+
+
+def _by_date(values: np.ndarray) -> np.ndarray:
+
+    # Missing cells take their date's cross-sectional median
+
+    with np.errstate(invalid="ignore"):
+        median = np.nanmedian(np.where(np.isfinite(values), values, np.nan),
+                              axis=1, keepdims=True)
+    return np.where(np.isfinite(values), values, np.nan_to_num(median))
+
+
+# --------------------------------------------------------------------- #
+# Engine
+# --------------------------------------------------------------------- #
+def simulate_costs(weights: dict, prices: pd.DataFrame, rebalance_dates, assets,
+                   grid: pd.DataFrame = None, adv=DEFAULT_ADV,
+                   vol_window: int = VOL_WINDOW, keep_weights: bool = True) -> dict:
+
+    # weights: {name: (R, N) target weights} set at the close of each
+    #          rebalance date, columns in `assets` order (as for
+    #          backtest_weights); NaN targets are flat
+    # prices:  wide closes; daily returns and trailing volatility come
+    #          from it
+    # grid:    cost settings, one per row (cost_grid(); default: one row
+    #          of COST_DEFAULTS)
+    # adv:     dollar ADV, a wide frame or one number for every name
+
+    # Every weights variant runs under every grid row. Returns
+    #     settings      combo x (signal, settings)
+    #     returns       dates x combo net daily returns (gross_returns: before costs)
+    #     nav           net NAV, starting at 1
+    #     turnover / traded / costs / fill_rate
+    #                   rebalance dates x combo: one-way turnover, traded
+    #                   dollars, cost as a fraction of NAV, filled share of
+    #                   the wanted trades
+    #     summary       combo x (settings, performance, cost metrics)
+    #     weights       (R, N, combos) realized post-trade weights
+
+    grid = cost_grid() if grid is None else grid.reset_index(drop=True)
+    grid = grid.reindex(columns=list(COST_DEFAULTS)).fillna(pd.Series(COST_DEFAULTS))
+    names = list(weights)
+
+    panel = Panel.from_frames({"price": prices}, how="union")
+    positions = panel.dates.get_indexer(pd.DatetimeIndex(rebalance_dates))
+    if (positions < 0).any():
+        raise KeyError("rebalance dates missing from the price index")
+    if (np.diff(positions) <= 0).any():
+        raise ValueError("rebalance dates must be increasing")
+    cols = panel.codes(pd.Index(assets).astype(str).str.upper())
+
+    # (R, N, combos) targets: variant-major, grid rows within a variant
+    n_reb, n_assets, n_grid = len(positions), len(panel.assets), len(grid)
+    n_combos = len(names) * n_grid
+    target = np.zeros((n_reb, n_assets, len(names)))
+    for i, name in enumerate(names):
+        target[:, cols[cols >= 0], i] = np.nan_to_num(np.asarray(weights[name])[:, cols >= 0])
+    target = np.repeat(target, n_grid, axis=2)
+    settings = {k: np.tile(grid[k].to_numpy(dtype=float), len(names)) for k in grid}
+
+    prices = panel.frame("price")
+    returns = daily_returns(prices).to_numpy()
+    log_growth = np.cumsum(np.log1p(np.nan_to_num(returns, nan=0.0)), axis=0)
+    sigma = _by_date(RollingPanel(prices).volatility(
+        vol_window, min_periods=min(20, vol_window), lag=0).to_numpy()[positions])
+    if isinstance(adv, pd.DataFrame):
+        panel.add("adv", adv)
+        adv = _by_date(panel["adv"][positions])
+    else:
+        adv = np.full((n_reb, n_assets), float(adv))
+
+    n_dates = len(panel.dates)
+    gross = np.full((n_dates, n_combos), np.nan)
+    net = np.full((n_dates, n_combos), np.nan)
+    turnover, traded, costs, fill_rate = (np.empty((n_reb, n_combos)) for _ in range(4))
+    realized = np.empty((n_reb, n_assets, n_combos)) if keep_weights else None
+
+    held = np.zeros((n_assets, n_combos))
+    nav_level = np.ones(n_combos)
+    spread = settings["spread_bps"] / 2e4
+    ends = np.append(positions[1:], n_dates - 1)
+    for k, (start, end) in enumerate(zip(positions, ends)):
+        # Dollar value of one unit of weight per combo, and the cap on
+        # each name's trade in weight units
+        dollars = settings["aum"] * nav_level
+        max_trade = settings["participation"] * adv[k][:, None] / dollars
+        trades, wanted = band_trades(held, target[k], settings["band"], max_trade)
+        weights_k = held + trades
+
+        spread_cost, impact_cost = trading_costs(trades, dollars, spread, settings["impact"],
+                                                 sigma[k][:, None], adv[k][:, None])
+        cost = spread_cost + impact_cost
+        size = np.abs(trades).sum(axis=0)
+        turnover[k] = 0.5 * size
+        traded[k] = size * dollars
+        costs[k] = cost
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fill_rate[k] = np.where(np.abs(wanted).sum(axis=0) > 0,
+                                    size / np.abs(wanted).sum(axis=0), 1.0)
+        if keep_weights:
+            realized[k] = weights_k
+
+        # Holding period as in backtest.drift; costs leave NAV at `start`
+        growth = np.exp(log_growth[start + 1:end + 1] - log_growth[start])
+        path = 1.0 + (growth - 1.0) @ weights_k
+        if len(path):
+            gross[start + 1] = path[0] - 1.0
+            net[start + 1] = (1.0 - cost) * path[0] - 1.0
+            gross[start + 2:end + 1] = net[start + 2:end + 1] = path[1:] / path[:-1] - 1.0
+            held = weights_k * growth[-1][:, None] / path[-1]
+            nav_level *= (1.0 - cost) * path[-1]
+        else:
+            held = weights_k
+            nav_level *= 1.0 - cost
+
+    combos = pd.Index(range(n_combos), name="combo")
+    table = lambda values, index: pd.DataFrame(values, index=index, columns=combos)
+    reb_index = panel.dates[positions]
+    result = {
+        "settings": pd.DataFrame({"signal": np.repeat(names, n_grid), **settings},
+                                 index=combos),
+        "returns": table(net, panel.dates),
+        "gross_returns": table(gross, panel.dates),
+        "turnover": table(turnover, reb_index),
+        "traded": table(traded, reb_index),
+        "costs": table(costs, reb_index),
+        "fill_rate": table(fill_rate, reb_index),
+        "weights": realized,
+        "assets": panel.assets,
+    }
+    result["nav"] = (1.0 + result["returns"].fillna(0.0)).cumprod()
+    result["summary"] = cost_summary(result)
+    return result
+
+
+def cost_summary(result: dict) -> pd.DataFrame:
+
+    # Settings, net performance, gross return and annualized cost drag
+    # per combo
+
+    net = performance(result["returns"], result["turnover"])
+    net.index.name = "combo"
+    gross = result["gross_returns"].dropna(how="all")
+    per_year = len(result["turnover"]) / max(len(gross) / TRADING_DAYS, 1e-9)
+    return result["settings"].join(net).assign(
+        gross_ann_return=gross.mean() * TRADING_DAYS,
+        ann_cost=result["costs"].mean() * per_year,
+        avg_fill=result["fill_rate"].mean(),
+    )
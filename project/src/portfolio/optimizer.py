@@ -0,0 +1,197 @@
+
+# Mean-variance optimizer on the structured risk model.
+
+# For every rebalance date r
+
+#     maximize    alpha' w - (risk_aversion / 2) w' Sigma w
+#     subject to  sum(w) = 0                     (dollar neutral)
+#                 S' w = 0                       (sector neutral)
+#                 beta' w = 0                    (beta neutral)
+#                 -max_weight <= w_i <= max_weight
+
+# solved by ADMM, splitting the box from the equality-constrained
+# quadratic. The quadratic step inverts diag(d) + B C B' by the Woodbury
+# identity (a K x K solve per date, factored once), so an iteration is
+# O(N K) and an N x N matrix is never formed. All dates of a block
+# iterate together as one batch, so the warm start is per block, not per
+# date: every date of a block starts from the solution (and dual) of the
+# last date of the block before it - for the first date that is the
+# previous month, for the twelfth a year back. block=1 warm-starts each
+# date from the one before it, at the cost of the batching. The final
+# state can be passed back in to warm-start the next call. Dates that
+# hit max_iter are flagged (converged=False) and reported by a warning.
+
+# Usage:
+#     risk = build_risk_model(returns, factors, rebalance_dates, sectors=sectors)
+#     result = optimize(alpha, risk, max_weight=0.02)
+#     result["weights"]   # (R, N)
+
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from src.portfolio.risk import RiskModel
+
+
+def _woodbury(d: np.ndarray, b: np.ndarray, c: np.ndarray):
+
+    # Factor (diag(d) + b c b')^-1 for batched d (R, N), b (R, N, K) and
+    # c (R, K, K) as D^-1 - D^-1 b (I + c b' D^-1 b)^-1 c b' D^-1.
+    # Returns (b / d, K x K core) for _apply.
+
+    bd = b / d[..., None]
+    eye = np.eye(b.shape[-1])
+    return bd, np.linalg.solve(eye + c @ (b.transpose(0, 2, 1) @ bd), c)
+
+
+def _apply(d, b, bd, core, v):
+
+    # (diag(d) + b c b')^-1 v for v (R, N, m), in O(N K m) per date
+
+    y = v / d[..., None]
+    return y - bd @ (core @ (b.transpose(0, 2, 1) @ y))
+
+
+def _constraints(risk: RiskModel, rows, betas, dollar_neutral, sector_neutral):
+
+    # (R, m, N) equality rows; all-zero rows are harmless (pinv below)
+
+    parts = []
+    if dollar_neutral:
+        parts.append(np.ones(risk.specific_var[rows].shape)[:, None])
+    if betas is not None:
+        parts.append(np.nan_to_num(betas[rows])[:, None])
+    if sector_neutral and risk.sector_names:
+        parts.append(risk.sector_loadings[rows].transpose(0, 2, 1))
+    if not parts:
+        return np.zeros(risk.specific_var[rows].shape)[:, None]
+    return np.concatenate(parts, axis=1)
+
+
+def _solve_block(alpha, b, c, d, a, bound, z, u, rho, tol, max_iter):
+
+    # ADMM on one batch of dates. alpha / d / bound / z / u: (R, N),
+    # b: (R, N, K), c: (R, K, K), a: (R, m, N), rho: (R,); bound 0 pins
+    # an asset. Dates drop out of the batch as they converge.
+    # Returns (z, u, iterations, converged).
+
+    d = d + rho[:, None]
+    bd, core = _woodbury(d, b, c)
+    h = _apply(d, b, bd, core, a.transpose(0, 2, 1))       # M^-1 A'  (R, N, m)
+    gram_inv = np.linalg.pinv(a @ h)                       # (A M^-1 A')^+
+
+    out_z, out_u = z.copy(), u.copy()
+    iterations = np.full(len(alpha), max_iter)
+    converged = np.zeros(len(alpha), dtype=bool)
+    live = np.arange(len(alpha))
+    for it in range(1, max_iter + 1):
+        # Quadratic step with the equalities held exactly (KKT via Schur)
+        x0 = _apply(d, b, bd, core, (alpha + rho[:, None] * (z - u))[..., None])
+        x = (x0 - h @ (gram_inv @ (a @ x0)))[..., 0]
+
+        # Box projection and dual update
+        z_new = np.clip(x + u, -bound, bound)
+        u = u + x - z_new
+
+        # Both residuals in weight units (the dual one without its rho
+        # factor, which would make the test depend on the variance scale)
+        done = (np.abs(x - z_new).max(axis=1) < tol) & (np.abs(z_new - z).max(axis=1) < tol)
+        z = z_new
+        if done.any():
+            out_z[live[done]], out_u[live[done]] = z[done], u[done]
+            iterations[live[done]] = it
+            converged[live[done]] = True
+            keep = ~done
+            live = live[keep]
+            alpha, b, d, bd, core, a, h, gram_inv, bound, z, u, rho = (
+                arr[keep] for arr in (alpha, b, d, bd, core, a, h, gram_inv, bound, z, u, rho))
+            if not len(live):
+                break
+
+    out_z[live], out_u[live] = z, u
+    return out_z, out_u, iterations, converged
+
+
+def optimize(alpha: np.ndarray,
+             risk: RiskModel,
+             risk_aversion: float = 1.0,
+             max_weight: float = 0.02,
+             dollar_neutral: bool = True,
+             sector_neutral: bool = True,
+             betas=None,
+             beta_neutral: bool = True,
+             warm_start: tuple = None,
+             warm: bool = True,
+             block: int = 12,
+             rho_scale: float = 3.0,
+             tol: float = 1e-6,
+             max_iter: int = 2000) -> dict:
+
+    # alpha:      (R, N) expected returns on the risk model's dates/assets
+    #             (daily units, like Sigma); NaN = not investable that date
+    # betas:      betas to neutralize: an (R, N) array on the model's
+    #             dates/assets, or a wide frame such as EWMAEstimator betas
+    #             (aligned by risk.align); default the model's beta to the
+    #             equal-weighted investable universe
+    # warm_start: (z, u) state returned by a previous call, for the first
+    #             block; later blocks start from the last date of the
+    #             block before them
+    # warm:       False starts every block from zero instead
+    # block:      dates solved together per batch (None = all at once;
+    #             1 = each date warm-started from the previous one)
+    # rho_scale:  ADMM penalty relative to risk_aversion x mean asset
+    #             variance of the date
+
+    # Returns {"weights": (R, N), "iterations": (R,), "converged": (R,)
+    # bool, "state": (z, u)}; a RuntimeWarning lists dates that hit max_iter
+
+    alpha = np.asarray(alpha, dtype=float)
+    investable = ~np.isnan(alpha)
+    if beta_neutral and betas is None:
+        betas = risk.market_beta(investable)
+    elif isinstance(betas, pd.DataFrame):
+        betas = risk.align(betas)
+    betas = betas if beta_neutral else None
+
+    n_dates, n_assets = alpha.shape
+    block = n_dates if block is None else block
+    diagonal = risk.diagonal()
+    weights = np.zeros((n_dates, n_assets))
+    iterations = np.zeros(n_dates, dtype=int)
+    converged = np.zeros(n_dates, dtype=bool)
+    z, u = warm_start if warm_start is not None \
+        else (np.zeros(n_assets), np.zeros(n_assets))
+
+    for start in range(0, n_dates, block):
+        rows = slice(start, min(start + block, n_dates))
+        ok = investable[rows]
+        b = risk.loadings[rows] * ok[..., None]
+        c = risk_aversion * risk.factor_cov[rows]
+        d = risk_aversion * risk.specific_var[rows]
+        a = _constraints(risk, rows, betas, dollar_neutral, sector_neutral) * ok[:, None]
+        with np.errstate(invalid="ignore"):
+            step = rho_scale * risk_aversion * np.nanmean(np.where(ok, diagonal[rows], np.nan), axis=1)
+        step = np.nan_to_num(step, nan=1.0)
+
+        shape = ok.shape
+        zb, ub, iterations[rows], converged[rows] = _solve_block(
+            np.where(ok, alpha[rows], 0.0), b, c, d, a,
+            np.where(ok, max_weight, 0.0),
+            np.where(ok, np.broadcast_to(z, shape), 0.0),
+            np.where(ok, np.broadcast_to(u, shape), 0.0),
+            step, tol, max_iter,
+        )
+        weights[rows] = zb
+        if warm:
+            z, u = zb[-1], ub[-1]
+
+    if not converged.all():
+        missed = risk.dates[~converged]
+        warnings.warn(f"optimizer hit max_iter={max_iter} on {len(missed)} of {n_dates} "
+                      f"dates (first {missed[0].date()}); weights there are not "
+                      f"converged to tol={tol}", RuntimeWarning, stacklevel=2)
+
+    return {"weights": weights, "iterations": iterations, "converged": converged,
+            "state": (z, u)}
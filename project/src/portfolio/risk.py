@@ -0,0 +1,218 @@
+
+# Structured (factor + specific) risk model.
+
+# Covariance is represented as
+
+#     Sigma = B F B' + diag(D)
+
+# with B the (N, K) loadings on the style factors from compute_factors
+# (cross-sectionally z-scored) plus sector dummies, F the (K, K) factor
+# covariance and D the (N,) specific variances. Nothing N x N is ever
+# formed: Sigma @ w is B (F (B' w)) + D * w, O(N K).
+
+# Daily factor returns come from per-date cross-sectional regressions of
+# returns on the previous day's loadings (one batched solve per block of
+# dates). F and D for every rebalance date are then read off cumulative
+# sums over a trailing window, like the rolling statistics in
+# features/rolling.py, so each rebalance costs O(K^2 + N) after one pass.
+
+# Usage:
+#     risk = build_risk_model(daily_returns(prices),
+#                             {"momentum": momentum(prices), "low_vol": low_vol(prices)},
+#                             rebalance_dates, sectors=sectors)
+#     risk.variance(weights)
+
+
+import pandas as pd
+import numpy as np
+
+from src.features.standardize import regress, sector_exposures, standardize
+from src.utils.panel import Panel
+
+
+class RiskModel:
+
+    # Per rebalance date r (arrays stacked on a leading R axis):
+    #     loadings     (R, N, K)  style exposures then sector dummies
+    #     factor_cov   (R, K, K)  daily factor covariance
+    #     specific_var (R, N)     daily residual variance
+
+    def __init__(self, dates, assets, factor_names, loadings, factor_cov,
+                 specific_var, sector_names=()):
+        self.dates = pd.DatetimeIndex(dates)
+        self.assets = pd.Index(assets)
+        self.factor_names = list(factor_names)
+        self.sector_names = list(sector_names)
+        self.loadings = loadings
+        self.factor_cov = factor_cov
+        self.specific_var = specific_var
+
+    @property
+    def sector_loadings(self) -> np.ndarray:
+
+        # (R, N, G) sector dummy block of the loadings
+
+        return self.loadings[..., len(self.factor_names) - len(self.sector_names):]
+
+    def cov_times(self, w: np.ndarray) -> np.ndarray:
+
+        # Sigma @ w for w of shape (R, N) or (R, N, S)
+
+        squeeze = w.ndim == 2
+        w = w[..., None] if squeeze else w
+        exposure = np.einsum("rnk,rns->rks", self.loadings, w)
+        out = np.einsum("rnk,rkl,rls->rns", self.loadings, self.factor_cov, exposure) \
+            + self.specific_var[..., None] * w
+        return out[..., 0] if squeeze else out
+
+    def variance(self, w: np.ndarray) -> np.ndarray:
+        return np.einsum("rn...,rn...->r...", w, self.cov_times(w))
+
+    def diagonal(self) -> np.ndarray:
+
+        # Per-asset total variance, (R, N)
+
+        return np.einsum("rnk,rkl,rnl->rn", self.loadings, self.factor_cov,
+                         self.loadings) + self.specific_var
+
+    def market_beta(self, universe: np.ndarray = None) -> np.ndarray:
+
+        # Beta of each asset to the equal-weighted portfolio of `universe`
+        # ((R, N) bool, default every asset) under this model, (R, N)
+
+        universe = np.ones(self.specific_var.shape, dtype=bool) if universe is None \
+            else universe
+        market = universe / np.maximum(universe.sum(axis=1, keepdims=True), 1)
+        cov = self.cov_times(market)
+        return cov / np.einsum("rn,rn->r", market, cov)[:, None]
+
+    def align(self, frame: pd.DataFrame) -> np.ndarray:
+
+        # A wide per-date frame (e.g. EWMAEstimator betas) as an (R, N)
+        # array on this model's rebalance dates and assets. Tickers are
+        # matched upper-cased like Panel's; assets the frame lacks are
+        # NaN, a missing rebalance date is an error.
+
+        frame = frame.set_axis(frame.columns.astype(str).str.upper(), axis=1)
+        missing = self.dates.difference(pd.DatetimeIndex(frame.index))
+        if len(missing):
+            raise KeyError(f"{len(missing)} rebalance dates missing from the frame, "
+                           f"first {missing[0].date()}")
+        return frame.reindex(index=self.dates, columns=self.assets).to_numpy(dtype=float)
+
+    def dense(self, r: int) -> np.ndarray:
+
+        # Full N x N covariance at rebalance r (for checks on small panels)
+
+        b = self.loadings[r]
+        return b @ self.factor_cov[r] @ b.T + np.diag(self.specific_var[r])
+
+
+def _window_moments(cum: np.ndarray, ends: np.ndarray, window: int):
+
+    # Totals over rows (end - window, end] from a cumulative array with a
+    # zero first row
+
+    starts = np.maximum(ends + 1 - window, 0)
+    return cum[ends + 1] - cum[starts]
+
+
+def build_risk_model(returns: pd.DataFrame,
+                     factors: dict,
+                     rebalance_dates,
+                     sectors: pd.Series = None,
+                     window: int = 252,
+                     min_periods: int = 63,
+                     winsor: tuple = (0.01, 0.99),
+                     universe=None,
+                     block: int = 256) -> RiskModel:
+
+    # returns:         wide daily simple returns (see backtest.daily_returns)
+    # factors:         {name: wide frame} style factors, e.g. compute_factors
+    #                  outputs; z-scored per date and missing values set to 0
+    #                  (the cross-sectional mean)
+    # rebalance_dates: dates to build a model for (must be in returns.index)
+    # sectors:         ticker -> sector labels; without them a single market
+    #                  (intercept) factor is used instead
+    # window:          trailing days of factor returns / residuals used
+    # min_periods:     residual observations below which an asset's specific
+    #                  variance falls back to the cross-sectional median
+    # universe:        utils/universe.Universe; style z-scores are taken
+    #                  over each date's index members (others load 0)
+
+    panel = Panel.from_frames({"returns": returns}, how="union")
+    style_names = list(factors)
+    for name in style_names:
+        panel.add(name, factors[name])
+    dates, assets = panel.dates, panel.assets
+    positions = dates.get_indexer(pd.DatetimeIndex(rebalance_dates))
+    if (positions < 0).any():
+        raise KeyError("rebalance dates missing from the returns index")
+
+    mask = None if universe is None else universe.mask(dates, assets)
+    style = standardize(np.stack([panel[n] for n in style_names], axis=-1),
+                        method="zscore", winsor=winsor, mask=mask)
+    np.nan_to_num(style, copy=False, nan=0.0)
+    if sectors is not None:
+        sectors = pd.Series(sectors).rename(index=lambda t: str(t).upper())
+        group = sector_exposures(sectors, assets)
+        group_names = sorted(sectors.reindex(assets).dropna().unique())
+    else:
+        group = np.ones((len(assets), 1))
+        group_names = []
+    names = style_names + (group_names or ["market"])
+
+    # Unmapped assets have NaN sector rows: left out of the regressions,
+    # zero loadings in the model
+    def loadings(rows):
+        return np.concatenate(
+            [style[rows], np.broadcast_to(group, (len(style[rows]),) + group.shape)],
+            axis=-1)
+
+    # Daily factor returns: returns on day t regressed on loadings at t-1
+    n_dates, n_assets = panel["returns"].shape
+    n_factors = len(names)
+    f = np.full((n_dates, n_factors), np.nan)
+    resid = np.full((n_dates, n_assets), np.nan)
+    for start in range(1, n_dates, block):
+        rows = slice(start, min(start + block, n_dates))
+        y = panel["returns"][rows][..., None]
+        beta, e = regress(y, loadings(slice(start - 1, rows.stop - 1)))
+        fitted_assets = (~np.isnan(e[..., 0])).sum(axis=1)
+        ok = fitted_assets > n_factors
+        f[rows] = np.where(ok[:, None], beta[:, 0], np.nan)
+        resid[rows] = np.where(ok[:, None], e[..., 0], np.nan)
+
+    # Factor covariance over the trailing window of complete days
+    f_ok = ~np.isnan(f).any(axis=1)
+    f0 = np.where(f_ok[:, None], f, 0.0)
+    cum_n = np.concatenate([[0], np.cumsum(f_ok)])
+    cum_f = np.concatenate([np.zeros((1, n_factors)), np.cumsum(f0, axis=0)])
+    cum_ff = np.concatenate([np.zeros((1, n_factors, n_factors)),
+                             np.cumsum(f0[:, :, None] * f0[:, None, :], axis=0)])
+    n = _window_moments(cum_n, positions, window).astype(float)[:, None, None]
+    s1 = _window_moments(cum_f, positions, window)
+    s2 = _window_moments(cum_ff, positions, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        factor_cov = (s2 - s1[:, :, None] * s1[:, None, :] / n) / (n - 1)
+    factor_cov = np.where(n >= 2, factor_cov, 0.0)
+
+    # Specific variance per asset, median fallback for short histories
+    e_ok = ~np.isnan(resid)
+    e0 = np.where(e_ok, resid, 0.0)
+    zero = np.zeros((1, n_assets))
+    m = _window_moments(np.concatenate([zero, np.cumsum(e_ok, axis=0)]), positions, window)
+    e1 = _window_moments(np.concatenate([zero, np.cumsum(e0, axis=0)]), positions, window)
+    e2 = _window_moments(np.concatenate([zero, np.cumsum(e0 * e0, axis=0)]), positions, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        specific = (e2 - e1 * e1 / m) / (m - 1)
+    specific[m < max(min_periods, 2)] = np.nan
+    with np.errstate(invalid="ignore"):
+        specific = np.maximum(specific, 0.0)
+        fallback = np.nanmedian(np.where(np.isnan(specific).all(axis=1, keepdims=True),
+                                         np.nanmedian(specific), specific), axis=1)
+    specific = np.where(np.isnan(specific), fallback[:, None], specific)
+
+    return RiskModel(dates[positions], assets, names,
+                     np.nan_to_num(loadings(positions), nan=0.0),
+                     factor_cov, specific, sector_names=group_names)
@@ -0,0 +1,142 @@
+# Session cache for processed tables.
+
+# read_table keeps what it loads from the Parquet store in one LRU cache
+# per process, so stages run in the same process (`python -m src.pipeline
+# --jobs 1`, notebooks, benchmarks) parse r1000_cleaned_close_prices
+# once instead of once per stage. Entries are keyed on the dataset path,
+# its files' (name, size, mtime) fingerprint and the read arguments, so a
+# rewritten table is never served stale; the store also drops a table's
+# entries when it writes it.
+
+# read_table answers a wide-table read with a ticker subset (tickers=[]
+# for the calendar only) from a cached full read of the same date range
+# without touching disk. Hits return copies: callers may mutate freely.
+
+# The cache holds at most R1000_CACHE_MB megabytes (default 1024; 0
+# turns it off), evicting the least recently used tables first; a table
+# larger than the cap is read but not kept.
+
+# Usage:
+#     from src.utils.cache import session_cache
+#     session_cache().stats()    # reads, hits, misses, read_mb, held_mb
+#     session_cache().clear()
+
+
+from collections import OrderedDict
+from pathlib import Path
+import os
+
+DEFAULT_CACHE_MB = 1024
+
+
+def fingerprint(path: Path) -> tuple:
+
+    # (relative name, size, mtime_ns) of every file under a dataset;
+    # changes whenever write_table / upsert_table swap anything in
+
+    path = Path(path)
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    return tuple((str(f.relative_to(path)) if path.is_dir() else f.name,
+                  f.stat().st_size, f.stat().st_mtime_ns) for f in files)
+
+
+def frame_nbytes(df) -> int:
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+class TableCache:
+
+    # key = (path, fingerprint, start, end, tickers, columns) -> DataFrame
+    # with the date column still a column (index= is applied on the way out)
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._frames: OrderedDict = OrderedDict()
+        self._sizes: dict = {}
+        self.nbytes = 0
+        self.reads = self.hits = self.misses = 0
+        self.read_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # -------------------------------------------------------- lookup
+    def peek(self, key: tuple):
+
+        # The cached frame itself (not a copy, not counted), or None
+
+        return self._frames.get(key)
+
+    def get(self, key: tuple, columns=None):
+
+        # Copy of the cached frame for `key` (only `columns` of it if
+        # given), or None on a miss
+
+        self.reads += 1
+        df = self._frames.get(key)
+        if df is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._frames.move_to_end(key)
+        return df.copy() if columns is None else df[list(columns)].copy()
+
+    def put(self, key: tuple, df) -> None:
+        size = frame_nbytes(df)
+        self.read_bytes += size
+        if not self.enabled or size > self.max_bytes:
+            return
+        self._drop(key)
+        while self._frames and self.nbytes + size > self.max_bytes:
+            self._drop(next(iter(self._frames)))
+        self._frames[key] = df.copy()
+        self._sizes[key] = size
+        self.nbytes += size
+
+    # -------------------------------------------------------- eviction
+    def _drop(self, key: tuple) -> None:
+        if key in self._frames:
+            del self._frames[key]
+            self.nbytes -= self._sizes.pop(key)
+
+    def invalidate(self, path) -> None:
+
+        # Forget every entry of the dataset at `path`
+
+        path = str(Path(path).resolve())
+        for key in [k for k in self._frames if k[0] == path]:
+            self._drop(key)
+
+    def clear(self) -> None:
+        for key in list(self._frames):
+            self._drop(key)
+
+    def reset(self) -> None:
+
+        # Empty, with the counters zeroed
+
+        self.clear()
+        self.reads = self.hits = self.misses = 0
+        self.read_bytes = 0
+
+    def stats(self) -> dict:
+        return {"reads": self.reads, "hits": self.hits, "misses": self.misses,
+                "read_mb": round(self.read_bytes / 2 ** 20, 1),
+                "held_mb": round(self.nbytes / 2 ** 20, 1), "tables": len(self)}
+
+
+_session = None
+
+
+def session_cache() -> TableCache:
+
+    # The process-wide cache, sized from R1000_CACHE_MB on first use
+
+    global _session
+    if _session is None:
+        _session = TableCache(float(os.environ.get("R1000_CACHE_MB", DEFAULT_CACHE_MB)) * 2 ** 20)
+    return _session
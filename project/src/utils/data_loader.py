@@ -1,20 +1,66 @@
-import yfinance as yf
+# Raw close-price download (yfinance).
+
+# Writes data/raw/equity/r1000_close_prices.csv, the validate stage's
+# input. yfinance is imported only when a download actually runs, so
+# importing this module (or `python -m src --help`) stays cheap.
+
+# Usage (from project/):
+#     python -m src download                        # universe or sample tickers
+#     python -m src download --tickers AAPL MSFT --start 2020-01-01
+# or
+#     prices = download_prices(["AAPL", "MSFT"])
+
+
+from pathlib import Path
+import argparse
+
 import pandas as pd
 
-# Sample list of Russell 1000 tickers (use full list later)
-tickers = [
-    "AAPL", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "BRK.B", "TSLA", "UNH", "JNJ"
-    # Add more tickers here, or load from a file
-]
+from src.utils.store import RAW_EQUITY_DIR
+from src.utils.universe import load_universe
+
+RAW_PRICES = RAW_EQUITY_DIR / "r1000_close_prices.csv"
+SAMPLE_TICKERS = ["AAPL", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "BRK.B", "TSLA", "UNH", "JNJ"]
+START, END = "2015-01-01", "2024-12-31"
+
+
+def default_tickers() -> list[str]:
+
+    # Every ticker that was ever an index member (point-in-time constituents
+    # in data/raw/universe, see utils/universe.py), so names that left the
+    # index are downloaded too; the sample list when those files are absent
+
+    universe = load_universe(missing_ok=True)
+    return list(universe.assets) if universe is not None else list(SAMPLE_TICKERS)
+
+
+def download_prices(tickers=None, start=START, end=END) -> pd.DataFrame:
+
+    # Daily closes, index=Date, one column per ticker
+
+    import yfinance as yf
+
+    # Clean up any tickers with dash
+    tickers = [t.replace("-", ".") for t in (tickers or default_tickers())]
+    return yf.download(tickers, start=start, end=end)["Close"]
+
 
-# Clean up any tickers with dash
-tickers = [t.replace("-", ".") for t in tickers]
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", nargs="*", default=None,
+                    help="default: every universe member, else a sample list")
+    ap.add_argument("--start", default=START)
+    ap.add_argument("--end", default=END)
+    ap.add_argument("--out", default=str(RAW_PRICES))
+    args = ap.parse_args()
 
-# Download
-print("Downloading data...")
-data = yf.download(tickers, start="2015-01-01", end="2024-12-31")['Close']
+    print("Downloading data...")
+    data = download_prices(args.tickers, args.start, args.end)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    data.to_csv(out)
+    print(f"Saved {data.shape} to {out}")
 
-# Save
-data.to_csv("r1000_close_prices.csv")
-print("Saved to r1000_close_prices.csv")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+
+# Shared fundamentals client.
+
+# One place that downloads annual financial statements for every
+# consumer (pb_ratios book values, the verification CSV, load_quality_z).
+# Tickers are fetched in batches across a bounded thread pool and cached
+# on disk, one row per (ticker, statement, asOfDate), so reruns and the
+# different consumers share a single download.
+
+# Cached tickers are revalidated once their fetch is older than `ttl`;
+# a refetch upserts rows by asOfDate, so restated filings replace the
+# stale ones while older history is kept.
+
+# Several processes share the cache (the pipeline runs the value and
+# quality stages side by side): a save re-reads and merges the files on
+# disk under a per-statement file lock, then swaps each one in through a
+# temp file, so readers never see a half-written file and concurrent
+# fetches never drop each other's rows.
+
+# The data source is pluggable:
+#     YahooQueryBackend - live yahooquery requests (default)
+#     FixtureBackend    - local <statement>.csv files, for offline runs
+
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: the lock is in-process only
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from src.utils.store import PROJECT_DIR
+
+CACHE_DIR = PROJECT_DIR / "data" / "cache" / "fundamentals"
+
+# all_financial_data is a superset of balance_sheet (it carries
+# StockholdersEquity, OrdinarySharesNumber, NetIncome, TotalDebt, ...),
+# so every consumer asks for it and one download serves them all.
+ANNUAL_FINANCIALS = "all_financial_data"
+
+KEY_COLS = ["symbol", "asOfDate"]
+
+# Annual filings are not public on the fiscal year end; 10-Ks are due
+# 60-90 calendar days later, so statement values only become usable then.
+REPORTING_LAG_DAYS = 90
+
+
+# --------------------------------------------------------------------- #
+# Backends
+# --------------------------------------------------------------------- #
+class YahooQueryBackend:
+
+    # Fetches annual statements for a batch of tickers in one yahooquery
+    # request. yahooquery is imported lazily so the client (and anything
+    # that imports it) loads without the package when a fixture is used.
+
+    def __init__(self, frequency: str = "a"):
+        self.frequency = frequency
+
+    def fetch(self, tickers: list[str], statement: str) -> pd.DataFrame:
+        from yahooquery import Ticker
+
+        result = getattr(Ticker(tickers), statement)(frequency=self.frequency)
+
+        # yahooquery returns a str / dict instead of a frame when nothing
+        # in the batch resolved
+        if not isinstance(result, pd.DataFrame):
+            return pd.DataFrame(columns=KEY_COLS)
+
+        df = result.reset_index()
+        # Annual requests also carry trailing-twelve-month rows
+        if "periodType" in df.columns:
+            df = df[df["periodType"] != "TTM"]
+        return df
+
+
+class FixtureBackend:
+
+    # Serves <directory>/<statement>.csv (long format with symbol and
+    # asOfDate columns) as if it were the remote API.
+
+    def __init__(self, directory, latency: float = 0.0):
+        self.directory = Path(directory)
+        self.latency = latency
+        self.calls = 0
+
+    def fetch(self, tickers: list[str], statement: str) -> pd.DataFrame:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        df = pd.read_csv(self.directory / f"{statement}.csv")
+        return df[df["symbol"].isin(tickers)]
+
+
+# --------------------------------------------------------------------- #
+# Client
+# --------------------------------------------------------------------- #
+class FundamentalsClient:
+
+    def __init__(self,
+                 backend=None,
+                 cache_dir=CACHE_DIR,
+                 ttl: timedelta = timedelta(days=7),
+                 batch_size: int = 50,
+                 max_workers: int = 4):
+        self.backend = backend if backend is not None else YahooQueryBackend()
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+        self.hits = 0
+        self.misses = 0
+        self.latencies: list[float] = []
+        self.errors: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    # ------------------------------------------------------------- cache
+    def _rows_path(self, statement: str) -> Path:
+        return self.cache_dir / f"{statement}.parquet"
+
+    def _index_path(self, statement: str) -> Path:
+        return self.cache_dir / f"{statement}.index.json"
+
+    def _lock_path(self, statement: str) -> Path:
+        return self.cache_dir / f"{statement}.lock"
+
+    @contextmanager
+    def _file_lock(self, statement: str):
+
+        # Exclusive across processes (flock) and across this client's threads
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self._save_lock, open(self._lock_path(statement), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self, statement: str):
+        rows_path = self._rows_path(statement)
+        index_path = self._index_path(statement)
+        rows = (pd.read_parquet(rows_path) if rows_path.exists()
+                else pd.DataFrame(columns=KEY_COLS))
+        fetched_at = (json.loads(index_path.read_text())
+                      if index_path.exists() else {})
+        return rows, fetched_at
+
+    def _save(self, statement: str, rows: pd.DataFrame, fetched_at: dict):
+
+        # Write-then-rename, rows before the index, so a concurrent _load
+        # sees old or new files (never a partial one) and never an index
+        # entry for rows that are not on disk yet
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        rows_path, index_path = self._rows_path(statement), self._index_path(statement)
+        tmp = rows_path.with_name(rows_path.name + suffix)
+        rows.reset_index(drop=True).to_parquet(tmp, index=False)
+        tmp.replace(rows_path)
+        tmp = index_path.with_name(index_path.name + suffix)
+        tmp.write_text(json.dumps(fetched_at, indent=1))
+        tmp.replace(index_path)
+
+    def _merge(self, statement: str, fetched: list, stamps: dict):
+
+        # Upsert freshly fetched rows into whatever is on disk *now* (another
+        # process may have saved since get() loaded), under the file lock.
+        # Returns the merged (rows, fetched_at).
+
+        with self._file_lock(statement):
+            rows, fetched_at = self._load(statement)
+            # Upsert by (symbol, asOfDate): restatements win, history stays
+            parts = [df for df in [rows] + fetched if len(df)]
+            if parts:
+                rows = pd.concat(parts, ignore_index=True)
+                rows["asOfDate"] = pd.to_datetime(rows["asOfDate"])
+                rows = (rows.drop_duplicates(subset=KEY_COLS, keep="last")
+                        .sort_values(KEY_COLS, kind="stable"))
+            fetched_at.update(stamps)
+            self._save(statement, rows, fetched_at)
+        return rows, fetched_at
+
+    # ------------------------------------------------------------- fetch
+    def _fetch_batch(self, batch: list[str], statement: str) -> pd.DataFrame:
+        start = time.perf_counter()
+        try:
+            df = self.backend.fetch(batch, statement)
+        except Exception as e:
+            with self._lock:
+                for ticker in batch:
+                    self.errors[ticker] = str(e)
+            return pd.DataFrame(columns=KEY_COLS)
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+        with self._lock:
+            for ticker in batch:
+                self.errors.pop(ticker, None)
+        return df
+
+    def get(self, tickers, statement: str = ANNUAL_FINANCIALS,
+            refresh: bool = False) -> pd.DataFrame:
+
+        # Long frame (symbol, asOfDate, <fields>) for the requested tickers,
+        # served from cache where fresh and fetched in parallel batches
+        # otherwise.
+
+        tickers = list(dict.fromkeys(tickers))
+        rows, fetched_at = self._load(statement)
+
+        now = datetime.now()
+        stale = [
+            t for t in tickers
+            if refresh or t not in fetched_at
+            or now - datetime.fromisoformat(fetched_at[t]) > self.ttl
+        ]
+        self.hits += len(tickers) - len(stale)
+        self.misses += len(stale)
+
+        if stale:
+            batches = [stale[i:i + self.batch_size]
+                       for i in range(0, len(stale), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                fetched = list(pool.map(
+                    lambda batch: self._fetch_batch(batch, statement), batches
+                ))
+
+            stamp = now.isoformat(timespec="seconds")
+            stamps = {t: stamp for t in stale if t not in self.errors}
+            rows, fetched_at = self._merge(statement, fetched, stamps)
+
+        out = rows[rows["symbol"].isin(tickers)].reset_index(drop=True)
+        if len(out):
+            out["asOfDate"] = pd.to_datetime(out["asOfDate"])
+        return out
+
+    # ------------------------------------------------------------- stats
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        latencies = np.array(self.latencies)
+        return {
+            "requests": requests,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else float("nan"),
+            "batches": len(latencies),
+            "fetch_mean_s": latencies.mean() if len(latencies) else float("nan"),
+            "fetch_p95_s": (np.percentile(latencies, 95) if len(latencies)
+                            else float("nan")),
+            "errors": len(self.errors),
+        }
+
+    def report(self) -> None:
+        s = self.stats()
+        line = (f"fundamentals cache: {s['hits']}/{s['requests']} hits "
+                f"({s['hit_rate']:.0%}), {s['batches']} batch fetches")
+        if s["batches"]:
+            line += (f", mean {s['fetch_mean_s']:.2f}s / "
+                     f"p95 {s['fetch_p95_s']:.2f}s")
+        print(f"{line}, {s['errors']} errors")
+
+
+_default_client = None
+
+
+def get_client() -> FundamentalsClient:
+
+    # Process-wide client so every consumer in one run shares its cache
+    # and counters.
+
+    global _default_client
+    if _default_client is None:
+        _default_client = FundamentalsClient()
+    return _default_client
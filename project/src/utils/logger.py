@@ -1,18 +1,58 @@
 from pathlib import Path
 from datetime import datetime
+import json
+
 import pandas as pd
 
-LOG_FILE = Path("project/logs/data_validation_log.txt")
+from src.utils.store import PROJECT_DIR
+
+LOG_FILE = PROJECT_DIR / "logs" / "data_validation_log.txt"
+AUDIT_FILE = PROJECT_DIR / "logs" / "validation_audit.jsonl"
+
+
+def _shape(table) -> tuple:
+    return tuple(table.shape) if hasattr(table, "shape") else tuple(table)
+
+
+def append_validation_entry(raw, clean, dropped: list[str], nulls: int = None) -> None:
 
-def append_validation_entry(raw: pd.DataFrame, clean: pd.DataFrame,
-                            dropped: list[str]) -> None:
-    
     # Append a single-line audit entry after every validation run.
+    # raw / clean: the frames, or just their (rows, columns) shapes when
+    # the data was streamed (then pass the remaining null count).
     LOG_FILE.parent.mkdir(exist_ok=True, parents=True)
+    if nulls is None:
+        nulls = clean.isna().sum().sum()
     line = (
         f"[{datetime.now():%Y-%m-%d %H:%M:%S}] "
-        f"raw={raw.shape} clean={clean.shape} "
-        f"dropped={dropped} nulls={clean.isna().sum().sum()}"
+        f"raw={_shape(raw)} clean={_shape(clean)} "
+        f"dropped={dropped} nulls={nulls}"
     )
     with LOG_FILE.open("a") as f:
-        f.write(line + "\n")
\ No newline at end of file
+        f.write(line + "\n")
+
+
+def _default(value):
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def append_jsonl(records: list[dict], path) -> None:
+
+    # One JSON object per line; numpy scalars and timestamps are converted
+
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with path.open("a") as f:
+        for record in records:
+            f.write(json.dumps(record, default=_default) + "\n")
+
+
+def append_audit_records(records: list[dict], path=AUDIT_FILE) -> None:
+
+    # Structured audit trail: one JSON object per line, each stamped with
+    # the run time so the records of one run can be grouped.
+    run = f"{datetime.now():%Y-%m-%dT%H:%M:%S}"
+    append_jsonl([{"run": run, **record} for record in records], path)
@@ -0,0 +1,329 @@
+# Hot-path instrumentation.
+
+# timed() measures a block of work, either as a context manager or as a
+# decorator, and appends one JSON line per block to logs/metrics.jsonl
+# (through utils/logger):
+
+#     run      - id shared by every block of one run (R1000_RUN_ID; the
+#                pipeline sets it so its worker processes share one)
+#     step     - the block's name prefixed by the blocks it is nested in,
+#                e.g. "validate/scan"; stage is the outermost name
+#     seconds  - wall time
+#     rss_mb / rss_delta_mb / peak_rss_mb
+#              - resident set size at exit, its change over the block and
+#                the process high-water mark (getrusage) at exit
+#     traced_peak_mb
+#              - with tracemalloc on (memory="tracemalloc" or
+#                R1000_TRACEMALLOC=1): peak Python + NumPy allocations
+#                inside the block, nested blocks included
+#     rows / nans / ... - counters added through the yielded record
+#     extra keyword fields passed to timed()
+
+# Recording is for command-line runs: blocks are measured and written
+# only when R1000_METRICS is on. `python -m src ...` / `python -m
+# src.<module>` (and the pipeline, whose workers inherit it) turn it on;
+# unset, library calls from tests, benchmarks, notebooks or map_columns
+# shards run the wrapped code bare - no timing, no NaN count, no log line.
+# R1000_METRICS=1 or 0 forces it either way.
+
+# With profile=True (or R1000_PROFILE=1 for every outermost block) the
+# block also runs under cProfile and the stats go to
+# logs/profiles/<step>-<run>.prof (open with pstats or snakeviz).
+
+# Usage:
+#     with timed("scan", path=str(raw_path)) as m:
+#         ...
+#         m.count(frame)                 # rows and NaNs of a frame / array
+#         m.add(chunks=3)
+#
+#     @timed()                           # step name = function name
+#     def momentum(prices, ...): ...
+#
+# Report (from project/):
+#     python -m src.utils.metrics                # totals per step over all runs
+#     python -m src.utils.metrics --last 5 --stage validate
+
+
+from contextvars import ContextVar
+from datetime import datetime
+import argparse
+import cProfile
+import functools
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src.utils.logger import append_jsonl
+from src.utils.store import PROJECT_DIR
+
+METRICS_FILE = PROJECT_DIR / "logs" / "metrics.jsonl"
+PROFILE_DIR = PROJECT_DIR / "logs" / "profiles"
+METRICS_ENV = "R1000_METRICS"
+
+_stack: ContextVar[tuple] = ContextVar("metrics_stack", default=())
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def run_id() -> str:
+
+    # Stable for the process (and its children when exported)
+
+    if "R1000_RUN_ID" not in os.environ:
+        os.environ["R1000_RUN_ID"] = f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+    return os.environ["R1000_RUN_ID"]
+
+
+def rss_mb() -> float:
+
+    # Current resident set size (Linux /proc; the high-water mark elsewhere)
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if os.uname().sysname == "Darwin" else peak / 2 ** 10
+
+
+def _flag(name: str) -> bool:
+    return os.environ.get(name, "") not in ("", "0")
+
+
+def _run_as_command() -> bool:
+
+    # Started as `python -m src ...` or `python -m src.<module>`
+
+    spec = getattr(sys.modules.get("__main__"), "__spec__", None)
+    return spec is not None and spec.name.split(".")[0] == "src"
+
+
+def recording() -> bool:
+
+    # Whether timed() blocks measure and log. Decided once per process
+    # (R1000_METRICS, else whether this is a src command) and exported, so
+    # child processes follow their parent
+
+    if METRICS_ENV not in os.environ:
+        os.environ[METRICS_ENV] = "1" if _run_as_command() else "0"
+    return _flag(METRICS_ENV)
+
+
+def set_recording(on: bool = True) -> None:
+
+    # Entry points: record (unless R1000_METRICS is set explicitly).
+    # Workers of a parallel library call: don't (a line per shard)
+
+    if on:
+        os.environ.setdefault(METRICS_ENV, "1")
+    else:
+        os.environ[METRICS_ENV] = "0"
+
+
+class Metric:
+
+    # One measured block; the object a `with timed(...)` yields. With
+    # recording off it measures nothing and add / count are no-ops
+
+    def __init__(self, name: str, fields: dict, memory: str = None,
+                 profile: bool = None, path=METRICS_FILE):
+        self.name = name
+        self.fields = dict(fields)
+        self.counters: dict = {}
+        self.memory = memory or ("tracemalloc" if _flag("R1000_TRACEMALLOC") else "rss")
+        self.profile = profile
+        self.path = path
+        self.child_peak = 0
+        self.enabled = recording()
+
+    # --------------------------------------------------------- counters
+    def add(self, **counts) -> "Metric":
+        if not self.enabled:
+            return self
+        for key, value in counts.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        return self
+
+    def count(self, data) -> "Metric":
+
+        # rows and NaN cells of a DataFrame / Series / ndarray
+
+        if not self.enabled:
+            return self
+        if isinstance(data, (pd.DataFrame, pd.Series)):
+            nans = int(data.isna().to_numpy().sum())
+        else:
+            data = np.asarray(data)
+            nans = int(np.isnan(data).sum()) if data.dtype.kind == "f" else 0
+        return self.add(rows=len(data), nans=nans)
+
+    # ------------------------------------------------------ lifecycle
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        parents = _stack.get()
+        self.run = run_id()                 # exported before any worker starts
+        self.step = "/".join([m.name for m in parents] + [self.name])
+        self.stage = parents[0].name if parents else self.name
+        if self.profile is None:
+            self.profile = not parents and _flag("R1000_PROFILE")
+
+        self._own_tracing = False
+        if self.memory == "tracemalloc":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_tracing = True
+            elif parents:
+                # reset_peak below would lose the parent's peak so far
+                parents[-1].child_peak = max(parents[-1].child_peak,
+                                             tracemalloc.get_traced_memory()[1])
+            self._traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        self._token = _stack.set(parents + (self,))
+        self._profiler = cProfile.Profile() if self.profile else None
+        self._rss_start = rss_mb()
+        self._start = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.enabled:
+            return False
+        if self._profiler is not None:
+            self._profiler.disable()
+        seconds = time.perf_counter() - self._start
+        _stack.reset(self._token)
+        rss = rss_mb()
+        record = {
+            "run": self.run, "ts": f"{datetime.now():%Y-%m-%dT%H:%M:%S}",
+            "stage": self.stage, "step": self.step, "pid": os.getpid(),
+            "seconds": round(seconds, 6),
+            "rss_mb": round(rss, 1), "rss_delta_mb": round(rss - self._rss_start, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        if self.memory == "tracemalloc" and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            record["traced_peak_mb"] = round((peak - self._traced_start) / 2 ** 20, 1)
+            parents = _stack.get()
+            if parents:
+                parents[-1].child_peak = max(parents[-1].child_peak, peak)
+            if self._own_tracing:
+                tracemalloc.stop()
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.counters)
+        record.update(self.fields)
+        if self._profiler is not None:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            dump = PROFILE_DIR / f"{self.step.replace('/', '.')}-{record['run']}.prof"
+            self._profiler.dump_stats(dump)
+            record["profile"] = str(dump)
+        append_jsonl([record], self.path)
+        return False
+
+
+class timed:
+
+    # Context manager (`with timed("name"):`) or decorator (`@timed()`,
+    # step name = function name); each entry creates a fresh Metric
+
+    def __init__(self, name: str = None, memory: str = None, profile: bool = None,
+                 path=METRICS_FILE, **fields):
+        self.name = name
+        self.memory = memory
+        self.profile = profile
+        self.path = path
+        self.fields = fields
+
+    def _metric(self, name: str) -> Metric:
+        return Metric(name, self.fields, self.memory, self.profile, self.path)
+
+    def __enter__(self) -> Metric:
+        self._metric_cm = self._metric(self.name or "block")
+        return self._metric_cm.__enter__()
+
+    def __exit__(self, *exc):
+        return self._metric_cm.__exit__(*exc)
+
+    def __call__(self, func):
+        name = self.name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not recording():
+                return func(*args, **kwargs)
+            with self._metric(name) as metric:
+                result = func(*args, **kwargs)
+                if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+                    metric.count(result)
+                return result
+
+        return wrapper
+
+
+# --------------------------------------------------------------------- #
+# Report
+# --------------------------------------------------------------------- #
+def load_metrics(path=METRICS_FILE) -> pd.DataFrame:
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["run", "stage", "step", "seconds"])
+    return pd.read_json(path, lines=True, dtype={"run": str})
+
+
+def report(path=METRICS_FILE, last: int = None, stage: str = None) -> pd.DataFrame:
+
+    # Per step over the selected runs: number of calls, total / mean /
+    # median / max seconds, share of the outermost blocks' time, the
+    # highest peak RSS and the latest rows count. Sorted by total time.
+
+    df = load_metrics(path)
+    if stage is not None:
+        df = df[df["stage"] == stage]
+    if last is not None:
+        df = df[df["run"].isin(df["run"].drop_duplicates().iloc[-last:])]
+    if df.empty:
+        return pd.DataFrame()
+    columns = {"calls": ("seconds", "size"), "total_s": ("seconds", "sum"),
+               "mean_s": ("seconds", "mean"), "median_s": ("seconds", "median"),
+               "max_s": ("seconds", "max"), "peak_rss_mb": ("peak_rss_mb", "max")}
+    if "rows" in df.columns:
+        columns["rows"] = ("rows", "last")
+    for counter in ("table_reads", "cache_hits", "read_mb"):
+        if counter in df.columns:
+            columns[counter] = (counter, "sum")
+    out = df.groupby("step").agg(**columns)
+    top = df.loc[~df["step"].str.contains("/"), "seconds"].sum()
+    out.insert(2, "share", out["total_s"] / top if top else np.nan)
+    out.insert(0, "runs", df.groupby("step")["run"].nunique())
+    return out.sort_values("total_s", ascending=False)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", default=str(METRICS_FILE))
+    ap.add_argument("--last", type=int, default=None, help="only the last N runs")
+    ap.add_argument("--stage", default=None)
+    args = ap.parse_args()
+
+    table = report(args.path, args.last, args.stage)
+    if table.empty:
+        print(f"no metrics in {args.path}")
+        return
+    with pd.option_context("display.width", 200, "display.max_rows", 200):
+        print(table.round({"total_s": 3, "mean_s": 3, "median_s": 3, "max_s": 3,
+                           "share": 3, "peak_rss_mb": 1}).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+
+# Aligned date x asset x field panel.
+
+# One sorted date index and one integer-coded asset dictionary shared by
+# every field; each field is a C-contiguous float64 (dates x assets)
+# array. Adding a field aligns it to the panel once (O(1) insert after
+# the reindex), and nothing is melted to long format until a model asks
+# for it via to_long(), which reuses the field arrays as flat views.
+
+# Usage:
+#     panel = Panel.from_frames({"price": prices, "fwd_return": returns},
+#                               how="intersection")
+#     panel.add("value_z", value)
+#     long = panel.to_long(dropna=True)
+
+
+import pandas as pd
+import numpy as np
+
+DATE_COLS = ("Date", "date")
+
+
+def _as_wide(frame: pd.DataFrame) -> pd.DataFrame:
+
+    # Accept wide frames with either a DatetimeIndex or a Date column, and
+    # normalise ticker labels once on the columns (not row by row)
+
+    for col in DATE_COLS:
+        if col in frame.columns:
+            frame = frame.set_index(col)
+            break
+    frame = frame.set_axis(pd.DatetimeIndex(pd.to_datetime(frame.index)), axis=0)
+    return frame.set_axis(frame.columns.astype(str).str.upper(), axis=1)
+
+
+def _indexer(target: pd.Index, labels: pd.Index) -> np.ndarray:
+    return labels.get_indexer(target) if not labels.equals(target) else None
+
+
+class Panel:
+
+    def __init__(self, dates, assets):
+        self.dates = pd.DatetimeIndex(dates).sort_values()
+        if self.dates.has_duplicates:
+            raise ValueError("panel dates must be unique")
+        self.assets = pd.Index(assets)
+        if self.assets.has_duplicates:
+            raise ValueError("panel assets must be unique")
+        self.fields: dict[str, np.ndarray] = {}
+
+    @property
+    def shape(self) -> tuple:
+        return len(self.dates), len(self.assets), len(self.fields)
+
+    def codes(self, assets) -> np.ndarray:
+
+        # Integer asset codes (-1 for assets not in the panel)
+
+        return self.assets.get_indexer(pd.Index(assets))
+
+    # -------------------------------------------------------- building
+    @classmethod
+    def from_frames(cls, frames: dict, how: str = "union"):
+
+        # frames: {field: wide frame}. how="union" keeps every date/asset
+        # seen (missing cells NaN); "intersection" keeps only those in all.
+
+        frames = {name: _as_wide(f) for name, f in frames.items()}
+        combine = {"union": pd.Index.union,
+                   "intersection": pd.Index.intersection}[how]
+        dates = assets = None
+        for f in frames.values():
+            dates = f.index if dates is None else combine(dates, f.index)
+            assets = f.columns if assets is None else combine(assets, f.columns)
+        panel = cls(dates, assets)
+        for name, f in frames.items():
+            panel.add(name, f)
+        return panel
+
+    @classmethod
+    def from_long(cls, df: pd.DataFrame, fields=None,
+                  date_col: str = "date", asset_col: str = "asset"):
+
+        # Inverse of to_long: scatter a long (date, asset, *fields) table
+        # into field arrays via integer codes, without a pivot per field.
+
+        fields = [c for c in df.columns if c not in (date_col, asset_col)] \
+            if fields is None else list(fields)
+        date_codes, dates = pd.factorize(pd.to_datetime(df[date_col]), sort=True)
+        asset_codes, assets = pd.factorize(df[asset_col].astype(str), sort=True)
+        panel = cls(dates, assets)
+        for name in fields:
+            values = np.full((len(dates), len(assets)), np.nan)
+            values[date_codes, asset_codes] = df[name].to_numpy(dtype=float)
+            panel.fields[name] = values
+        return panel
+
+    def add(self, name: str, data) -> "Panel":
+
+        # Add (or replace) a field. DataFrames are aligned to the panel's
+        # dates and assets (extra rows/columns dropped, gaps NaN); bare
+        # arrays must already have the panel's shape.
+
+        if isinstance(data, pd.DataFrame):
+            data = _as_wide(data)
+            values = data.to_numpy(dtype=float)
+            rows = _indexer(self.dates, data.index)
+            cols = _indexer(self.assets, data.columns)
+            if rows is not None:
+                values = np.where((rows >= 0)[:, None], values[rows], np.nan)
+            if cols is not None:
+                values = np.where(cols >= 0, values[:, cols], np.nan)
+        else:
+            values = np.asarray(data, dtype=float)
+            if values.shape != (len(self.dates), len(self.assets)):
+                raise ValueError(f"{name}: shape {values.shape} does not match "
+                                 f"panel {(len(self.dates), len(self.assets))}")
+        self.fields[name] = np.ascontiguousarray(values)
+        return self
+
+    # -------------------------------------------------------- access
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.fields[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.fields
+
+    def frame(self, name: str) -> pd.DataFrame:
+
+        # Wide DataFrame over the field array (no copy)
+
+        return pd.DataFrame(self.fields[name], index=self.dates,
+                            columns=self.assets, copy=False)
+
+    def select(self, start=None, end=None, assets=None) -> "Panel":
+
+        # Sub-panel for a date range (array views) and optional asset subset
+
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), "left")
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), "right")
+        cols = slice(None) if assets is None else self.codes(assets)
+        if assets is not None and (cols < 0).any():
+            raise KeyError(f"assets not in panel: {list(pd.Index(assets)[cols < 0])}")
+
+        sub = Panel(self.dates[lo:hi],
+                    self.assets if assets is None else self.assets[cols])
+        for name, values in self.fields.items():
+            sub.fields[name] = values[lo:hi, cols]
+        return sub
+
+    def to_long(self, fields=None, dropna: bool = True,
+                date_col: str = "date", asset_col: str = "asset") -> pd.DataFrame:
+
+        # Long (date, asset, *fields) table, date-major. Field columns are
+        # flat views of the panel arrays unless dropna has to filter rows;
+        # assets come out as a categorical over the integer codes.
+
+        fields = list(self.fields) if fields is None else list(fields)
+        n_dates, n_assets = len(self.dates), len(self.assets)
+
+        keep = None
+        if dropna:
+            keep = np.ones(n_dates * n_assets, dtype=bool)
+            for name in fields:
+                keep &= ~np.isnan(self.fields[name].reshape(-1))
+            rows = np.flatnonzero(keep)
+            date_pos, codes = np.divmod(rows, n_assets)
+        else:
+            date_pos = np.repeat(np.arange(n_dates), n_assets)
+            codes = np.tile(np.arange(n_assets), n_dates)
+
+        columns = {
+            date_col: self.dates.to_numpy()[date_pos],
+            asset_col: pd.Categorical.from_codes(codes, categories=self.assets),
+        }
+        for name in fields:
+            flat = self.fields[name].reshape(-1)
+            columns[name] = flat if keep is None else flat[keep]
+        return pd.DataFrame(columns, copy=False)
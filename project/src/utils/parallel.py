@@ -0,0 +1,163 @@
+
+# Ticker-sharded multiprocess execution.
+
+# Runs a column-independent factor function (each ticker's output depends
+# only on that ticker's input: momentum, low_vol, forward_log_returns, ...)
+# over a wide date x ticker frame in a process pool. The panel is copied
+# once into multiprocessing.shared_memory, ticker-major, so a shard of
+# columns is one contiguous block; workers attach to it by name, wrap
+# their shard in a DataFrame without copying, and write results straight
+# into a preallocated shared output buffer. Nothing but shard bounds and
+# labels is pickled.
+
+# Shard width comes from a memory budget: each column costs about
+# OVERHEAD working copies of its dates across the concurrently running
+# workers, and there is at least one shard per worker.
+
+# Cross-sectional functions (quality ranks, z-scores, pb_ratios) are NOT
+# column independent and must not be sharded.
+
+# Usage:
+#     from src.features.compute_factors import momentum
+#     mom = map_columns(momentum, prices, workers=4, memory_budget="2GB")
+#     mom = map_columns(low_vol, prices, workers=4, window=126)
+
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import math
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.metrics import set_recording
+
+DEFAULT_BUDGET = 1 << 30
+
+# Input view + output + pandas temporaries (rolling sums, diff, shift)
+OVERHEAD = 4
+
+_UNITS = {"": 1, "B": 1, "KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "TB": 1 << 40}
+
+
+def parse_bytes(size) -> int:
+
+    # 1048576, "512MB", "1.5GB" -> bytes (binary units)
+
+    if isinstance(size, (int, np.integer)):
+        return int(size)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?B?)\s*", str(size).upper())
+    if not match:
+        raise ValueError(f"cannot parse memory size {size!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+
+class SharedArray:
+
+    # An ndarray backed by a named shared-memory block. Created by the
+    # parent (owner, unlinks on exit) and attached by workers via spec.
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(*spec[1:], name=spec[0])
+
+    @property
+    def spec(self) -> tuple:
+        return self.shm.name, self.shape, self.dtype.str
+
+    def close(self) -> None:
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def shard_bounds(n_rows: int, n_columns: int, itemsize: int, workers: int,
+                 memory_budget=DEFAULT_BUDGET) -> list[tuple]:
+
+    # [lo, hi) column ranges: as wide as the budget allows with `workers`
+    # shards in flight, but never fewer shards than workers
+
+    per_column = max(n_rows * itemsize * OVERHEAD, 1)
+    width = max(parse_bytes(memory_budget) // (workers * per_column), 1)
+    width = min(width, max(math.ceil(n_columns / workers), 1))
+    return [(lo, min(lo + width, n_columns)) for lo in range(0, n_columns, width)]
+
+
+def _run_shard(func, src_spec, out_spec, lo, hi, index, columns, kwargs) -> float:
+
+    # Worker: func on columns [lo, hi) of the shared input, result written
+    # into the same columns of the shared output. Returns seconds.
+
+    start = time.perf_counter()
+    src, out = SharedArray.attach(src_spec), SharedArray.attach(out_spec)
+    try:
+        # (hi - lo, T) contiguous block -> its transpose is exactly the
+        # layout pandas keeps a float block in, so no copy is made
+        frame = pd.DataFrame(src.array[lo:hi].T, index=index, columns=columns[lo:hi],
+                             copy=False)
+        result = func(frame, **kwargs)
+        result = result.reindex(index=index, columns=columns[lo:hi])
+        out.array[lo:hi] = result.to_numpy(dtype=out.dtype).T
+        del frame, result
+    finally:
+        src.close()
+        out.close()
+    return time.perf_counter() - start
+
+
+def map_columns(func, frame: pd.DataFrame,
+                workers: int = None,
+                memory_budget=DEFAULT_BUDGET,
+                dtype=np.float64,
+                **kwargs) -> pd.DataFrame:
+
+    # func:          column-independent function of a wide frame returning
+    #                a frame on the same index / columns (module level, so
+    #                it can be sent to the workers)
+    # workers:       processes (None = CPU count, 1 = in-process)
+    # memory_budget: bytes or "512MB"-style string across all workers
+    # dtype:         float32 halves the shared panel and output
+    # kwargs:        passed to func
+
+    # Returns func(frame, **kwargs), assembled from the shards.
+
+    workers = workers or os.cpu_count() or 1
+    dtype = np.dtype(dtype)
+    index, columns = frame.index, frame.columns
+    bounds = shard_bounds(len(index), len(columns), dtype.itemsize, workers, memory_budget)
+
+    with SharedArray((len(columns), len(index)), dtype) as src, \
+            SharedArray((len(columns), len(index)), dtype) as out:
+        src.array[:] = frame.to_numpy(dtype=dtype).T
+        out.array[:] = np.nan
+        tasks = [(func, src.spec, out.spec, lo, hi, index, columns, kwargs)
+                 for lo, hi in bounds]
+        if workers == 1:
+            for task in tasks:
+                _run_shard(*task)
+        else:
+            # Shards are not separate blocks: the caller's timed() covers them
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                     initializer=set_recording, initargs=(False,)) as pool:
+                for future in [pool.submit(_run_shard, *task) for task in tasks]:
+                    future.result()
+        result = pd.DataFrame(out.array.T.copy(), index=index, columns=columns)
+    return result
@@ -0,0 +1,401 @@
+
+# Columnar storage layer for processed tables.
+
+# Tables are written as date-partitioned Parquet datasets
+# (data/processed/<name>.parquet/period=YYYY/part-0.parquet, one
+# partition per PARTITION_YEARS-year block) and read back
+# with memory mapping, partition pruning + row-group predicate pushdown on
+# the date range, and column pruning on the ticker subset.
+
+# Two table shapes are supported:
+#     wide - one date column ("Date") plus one float column per ticker
+#     long - "date" / "asset" key columns plus value columns (factor_matrix)
+# For wide tables a ticker subset prunes columns; for long tables it is
+# pushed down as a row filter on "asset".
+
+# Reads go through the per-process session cache (utils/cache.py), so a
+# table read twice in one process is parsed once; writes drop the
+# table's cached copies.
+
+# Usage (from project/):
+#     python -m src.utils.store migrate      # one-time CSV -> Parquet
+
+
+from pathlib import Path
+import argparse
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.utils.cache import fingerprint, session_cache
+
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+PROCESSED_DIR = PROJECT_DIR / "data" / "processed"
+RAW_EQUITY_DIR = PROJECT_DIR / "data" / "raw" / "equity"
+
+PARTITION_COL = "period"
+# Every partition file repeats one column chunk per ticker, so one-year
+# partitions of a 1000-ticker panel spend more time on metadata than on
+# data. Five-year blocks keep date pruning useful without that overhead.
+PARTITION_YEARS = 5
+DATE_COLS = ("Date", "date")
+ASSET_COL = "asset"
+
+
+def table_path(name: str, root: Path = PROCESSED_DIR) -> Path:
+
+    # Location of a named processed table, e.g. "forward_returns" ->
+    # data/processed/forward_returns.parquet
+
+    return Path(root) / f"{name}.parquet"
+
+
+def _date_col(names) -> str:
+    for col in DATE_COLS:
+        if col in names:
+            return col
+    raise KeyError(f"no date column ({' / '.join(DATE_COLS)}) in {list(names)}")
+
+
+def _period(year):
+    return year - year % PARTITION_YEARS
+
+
+def _prepare(df: pd.DataFrame) -> tuple[pd.DataFrame, str]:
+
+    # df may carry its dates either as a "Date"/"date" column or as the
+    # index (as the wide price/factor frames do); float columns are kept
+    # as float64 so values round-trip exactly.
+
+    if not any(col in df.columns for col in DATE_COLS):
+        df = df.rename_axis(df.index.name if df.index.name in DATE_COLS
+                            else "Date").reset_index()
+    date_col = _date_col(df.columns)
+
+    df = df.copy()
+    df[date_col] = pd.to_datetime(df[date_col])
+    df = df.sort_values(date_col, kind="stable")
+    df[PARTITION_COL] = _period(df[date_col].dt.year).astype("int32")
+    df.columns = [str(col) for col in df.columns]
+    return df, date_col
+
+
+def _swap_in(tmp_path: Path, path: Path) -> None:
+    if path.exists():
+        shutil.rmtree(path)
+    tmp_path.rename(path)
+    session_cache().invalidate(path)
+
+
+def write_table(df: pd.DataFrame, path) -> Path:
+
+    # Overwrite the dataset at `path` with `df`.
+
+    path = Path(path)
+    df, _ = _prepare(df)
+
+    # Write next to the target and swap in, so a reader (or a caller
+    # rewriting the table it just read) never sees a half-written dataset
+    tmp_path = path.with_name(path.name + ".tmp")
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if len(df):
+        pq.write_to_dataset(
+            table,
+            root_path=str(tmp_path),
+            partition_cols=[PARTITION_COL],
+            basename_template="part-{i}.parquet",
+        )
+    else:
+        # No rows means no partitions; keep one file (partition column
+        # included) so the schema survives
+        tmp_path.mkdir()
+        pq.write_table(table, str(tmp_path / "part-0.parquet"))
+    _swap_in(tmp_path, path)
+    return path
+
+
+class TableWriter:
+
+    # Streams date-sorted chunks into a new dataset at `path` without
+    # holding the whole table in memory: each period's partition is one
+    # Parquet file, written a row group per chunk while the chunks are in
+    # that period, and the dataset replaces `path` on close() (like
+    # write_table, readers never see a half-written table).
+
+    # Usage:
+    #     with TableWriter(table_path("r1000_cleaned_close_prices")) as writer:
+    #         for chunk in chunks:
+    #             writer.write(chunk)
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        if self.tmp_path.exists():
+            shutil.rmtree(self.tmp_path)
+        self.tmp_path.mkdir(parents=True)
+        self.rows = 0
+        self._writer = None
+        self._period = None
+        self._schema = None
+        self._empty = None
+
+    @staticmethod
+    def _to_arrow(df: pd.DataFrame) -> pa.Table:
+
+        # Wide chunks are one date column plus thousands of float columns;
+        # building the arrays from one transposed block skips pandas'
+        # per-column conversion
+
+        is_float = (df.dtypes == "float64").to_numpy()
+        if is_float.sum() < len(df.columns) - 1:
+            return pa.Table.from_pandas(df, preserve_index=False)
+        floats, others = list(df.columns[is_float]), list(df.columns[~is_float])
+        block = np.ascontiguousarray(df.iloc[:, is_float].to_numpy().T)
+        arrays = [pa.array(df[c].to_numpy()) for c in others] + [pa.array(v) for v in block]
+        return pa.Table.from_arrays(arrays, names=others + floats)
+
+    def _open(self, period) -> None:
+        self._close_period()
+        part_dir = self.tmp_path / f"{PARTITION_COL}={period}"
+        part_dir.mkdir()
+        self._writer = pq.ParquetWriter(str(part_dir / "part-0.parquet"), self._schema)
+        self._period = period
+
+    def _close_period(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        df, _ = _prepare(df)
+        if self._empty is None:
+            self._empty = pa.Table.from_pandas(df.iloc[:0], preserve_index=False)
+        for period, rows in df.groupby(PARTITION_COL, sort=False):
+            table = self._to_arrow(rows.drop(columns=PARTITION_COL))
+            if self._schema is None:
+                self._schema = table.schema
+            if period != self._period:
+                if self._period is not None and period < self._period:
+                    raise ValueError("TableWriter chunks must be sorted by date")
+                self._open(period)
+            self._writer.write_table(table.cast(self._schema))
+        self.rows += len(df)
+
+    def close(self) -> Path:
+        self._close_period()
+        if self._schema is None:
+            # No rows: one empty file (partition column included) so the
+            # schema survives, as write_table leaves
+            empty = self._empty if self._empty is not None else pa.table({})
+            pq.write_table(empty, str(self.tmp_path / "part-0.parquet"))
+        _swap_in(self.tmp_path, self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_period()
+            shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+def table_columns(path) -> list[str]:
+
+    # Column names of the dataset at `path` (partition column excluded),
+    # from the schema alone
+
+    return [n for n in ds.dataset(str(path), partitioning="hive").schema.names
+            if n != PARTITION_COL]
+
+
+def upsert_table(df: pd.DataFrame, path) -> Path:
+
+    # Insert or replace rows of `df` in the dataset at `path`, keyed on the
+    # date (wide tables) or (date, asset) (long tables). Only partitions
+    # that df touches are read and rewritten, so appending a day costs one
+    # partition, not the whole history.
+
+    path = Path(path)
+    if not path.exists():
+        return write_table(df, path)
+
+    df, date_col = _prepare(df)
+    existing_cols = table_columns(path)
+    unknown = sorted(set(df.columns) - set(existing_cols) - {PARTITION_COL})
+    if unknown:
+        raise KeyError(f"columns not in {path.name}: {unknown}; "
+                       "rewrite the table with write_table")
+    keys = [date_col, ASSET_COL] if ASSET_COL in existing_cols else [date_col]
+
+    for period, rows in df.groupby(PARTITION_COL):
+        part_dir = path / f"{PARTITION_COL}={period}"
+        rows = rows.drop(columns=PARTITION_COL)
+        if part_dir.exists():
+            current = pq.read_table(str(part_dir)).to_pandas()
+            rows = (pd.concat([current, rows], ignore_index=True)
+                    .drop_duplicates(subset=keys, keep="last")
+                    .sort_values(keys, kind="stable"))
+        rows = rows.reindex(columns=existing_cols)
+
+        # "_"-prefixed paths are skipped by dataset discovery
+        tmp_dir = part_dir.with_name("_" + part_dir.name + ".tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+        pq.write_table(pa.Table.from_pandas(rows, preserve_index=False),
+                       str(tmp_dir / "part-0.parquet"))
+        _swap_in(tmp_dir, part_dir)
+    session_cache().invalidate(path)
+    return path
+
+
+def read_table(path,
+               start=None,
+               end=None,
+               tickers=None,
+               columns=None,
+               index: bool = False,
+               cache: bool = True) -> pd.DataFrame:
+
+    # Read a dataset written by write_table.
+
+    # start / end: inclusive date bounds, pushed down to partitions and
+    #              row groups so untouched years are never opened
+    # tickers:     wide tables -> only these ticker columns are read;
+    #              long tables -> rows filtered on "asset"
+    # columns:     extra explicit column projection (long tables)
+    # index:       return the date column as a DatetimeIndex
+    # cache:       serve / keep the result in the session cache
+
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"{path} does not exist "
+                                "(run `python -m src.utils.store migrate`?)")
+
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    tickers = None if tickers is None else [str(t) for t in tickers]
+    if not cache:
+        return _finish(_read_table(path, start, end, tickers, columns), index)
+
+    # A wide ticker subset is a column selection of the cached full read
+    store = session_cache()
+    key = (str(path.resolve()), fingerprint(path), start, end,
+           None if tickers is None else tuple(tickers),
+           None if columns is None else tuple(columns))
+    full = store.peek(key[:4] + (None, key[5]))
+    if tickers is not None and columns is None and full is not None \
+            and ASSET_COL not in full.columns:
+        date_col = _date_col(full.columns)
+        missing = sorted(set(tickers) - set(full.columns))
+        if missing:
+            raise KeyError(f"tickers not in {path.name}: {missing}")
+        df = store.get(key[:4] + (None, key[5]), [date_col] + tickers)
+    else:
+        df = store.get(key)
+    if df is None:
+        df = _read_table(path, start, end, tickers, columns)
+        store.put(key, df)
+    return _finish(df, index)
+
+
+def _finish(df: pd.DataFrame, index: bool) -> pd.DataFrame:
+    return df.set_index(_date_col(df.columns)) if index else df
+
+
+def _read_table(path: Path, start, end, tickers, columns) -> pd.DataFrame:
+
+    # Uncached read_table body; the frame keeps its date column
+
+    dataset = ds.dataset(str(path), format="parquet", partitioning="hive")
+    names = [n for n in dataset.schema.names if n != PARTITION_COL]
+    date_col = _date_col(names)
+    is_long = ASSET_COL in names
+
+    predicate = None
+
+    def _and(expr):
+        return expr if predicate is None else predicate & expr
+
+    if start is not None:
+        predicate = _and((ds.field(PARTITION_COL) >= _period(start.year))
+                         & (ds.field(date_col) >= start))
+    if end is not None:
+        predicate = _and((ds.field(PARTITION_COL) <= _period(end.year))
+                         & (ds.field(date_col) <= end))
+
+    if columns is not None:
+        selected = [date_col] + [c for c in columns if c != date_col]
+    else:
+        selected = names
+    if tickers is not None:
+        if is_long:
+            predicate = _and(ds.field(ASSET_COL).isin(tickers))
+        else:
+            missing = sorted(set(tickers) - set(names))
+            if missing:
+                raise KeyError(f"tickers not in {path.name}: {missing}")
+            selected = [date_col] + tickers
+
+    table = pq.read_table(
+        str(path),
+        columns=selected,
+        filters=predicate,
+        memory_map=True,
+        partitioning="hive",
+    )
+    df = table.to_pandas()
+    return df.sort_values(date_col, kind="stable").reset_index(drop=True)
+
+
+# --------------------------------------------------------------------- #
+# One-time CSV -> Parquet migration
+# --------------------------------------------------------------------- #
+def migrate_csvs(src_dir: Path = PROCESSED_DIR,
+                 dst_dir: Path = PROCESSED_DIR,
+                 remove_csv: bool = False) -> list[Path]:
+
+    # Convert every data/processed/*.csv into a Parquet dataset next to it.
+
+    # Handles the legacy pandas index column ("Unnamed: 0") written by the
+    # old validate_prices.py. CSVs are left in place unless remove_csv.
+
+    written = []
+    for csv_path in sorted(Path(src_dir).glob("*.csv")):
+        df = pd.read_csv(csv_path)
+        df = df.drop(columns=[c for c in df.columns
+                              if str(c).startswith("Unnamed")])
+        out = write_table(df, table_path(csv_path.stem, dst_dir))
+        written.append(out)
+        print(f"{csv_path.name} -> {out.name} ({len(df)} rows)")
+        if remove_csv:
+            csv_path.unlink()
+    return written
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+    mig = sub.add_parser("migrate", help="convert data/processed/*.csv to Parquet")
+    mig.add_argument("--src", default=str(PROCESSED_DIR))
+    mig.add_argument("--dst", default=str(PROCESSED_DIR))
+    mig.add_argument("--remove-csv", action="store_true")
+    args = ap.parse_args()
+
+    if args.command == "migrate":
+        migrate_csvs(Path(args.src), Path(args.dst), args.remove_csv)
+
+
+if __name__ == "__main__":
+    main()
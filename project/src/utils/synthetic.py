@@ -0,0 +1,332 @@
+
+# Synthetic R1000-scale data.
+
+# Reproducible (seeded) stand-ins for the raw inputs, at the scale the
+# real universe runs at (about 1000 tickers x 25 years) instead of the
+# ten sample tickers in data/raw/equity:
+
+#     prices       - wide daily closes from a market + sector + idiosyncratic
+#                    return model, with late listings, delistings, multi-day
+#                    gaps and scattered missing closes
+#     fundamentals - annual statements in the all_financial_data layout
+#                    (symbol, asOfDate, StockholdersEquity, ...) for every
+#                    fiscal year a ticker traded, with missing fields
+#     sectors      - ticker -> sector labels
+#     macro        - FRED-layout CSVs (observation_date, <series id>) for
+#                    the macro layer's series: monthly CPI and Fed Funds,
+#                    weekly USD index, daily VIX and oil, with a few
+#                    high-volatility / high-inflation episodes
+#     sentiment    - scored events (ticker, timestamp, score, source): an
+#                    earnings call every quarter and a 10-K every year per
+#                    listed ticker, before the open or after the close
+#     universe     - month-end index constituents (top 80% by a size proxy
+#                    at each June reconstitution, less names that stopped
+#                    trading) and ticker changes for 2% of the names
+
+# write_synthetic() lays them out like the real inputs, so the unchanged
+# stages can run on them: the price CSV for validate_prices, the
+# fundamentals as a FixtureBackend directory for the fundamentals client
+# the macro CSVs as a data/raw/macro stand-in and the constituent files
+# as a data/raw/universe stand-in.
+
+# Usage (from project/):
+#     python -m src.utils.synthetic --tickers 1000 --years 25 --seed 0
+
+
+from pathlib import Path
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.utils.fundamentals import ANNUAL_FINANCIALS
+from src.utils.store import PROJECT_DIR
+
+SYNTHETIC_DIR = PROJECT_DIR / "data" / "synthetic"
+PRICES_FILE = "r1000_close_prices.csv"
+SECTORS = ["Tech", "Health", "Financials", "Energy", "Industrials",
+           "Consumer", "Utilities", "Materials", "RealEstate", "Telecom", "Staples"]
+
+
+def tickers(n_tickers: int) -> list[str]:
+    return [f"S{i:04d}" for i in range(n_tickers)]
+
+
+def synthetic_sectors(n_tickers: int, seed: int = 0) -> pd.Series:
+    rng = np.random.default_rng([seed, 1])
+    labels = np.asarray(SECTORS)[rng.integers(len(SECTORS), size=n_tickers)]
+    return pd.Series(labels, index=pd.Index(tickers(n_tickers), name="ticker"),
+                     name="sector")
+
+
+def synthetic_prices(n_tickers: int = 1000, years: int = 25,
+                     start: str = "2000-01-03", seed: int = 0) -> pd.DataFrame:
+
+    # Wide closes (Date index, one column per ticker)
+
+    rng = np.random.default_rng([seed, 0])
+    dates = pd.bdate_range(start, periods=252 * years, name="Date")
+    n_dates = len(dates)
+    sector = pd.Categorical(synthetic_sectors(n_tickers, seed)).codes
+
+    # Returns: beta * market + sector + idiosyncratic, per-ticker drift/vol
+    market = rng.normal(0.0003, 0.011, size=(n_dates, 1))
+    sector_ret = rng.normal(0.0, 0.006, size=(n_dates, len(SECTORS)))
+    beta = rng.normal(1.0, 0.3, size=n_tickers)
+    idio_vol = rng.uniform(0.008, 0.03, size=n_tickers)
+    drift = rng.normal(0.0001, 0.0003, size=n_tickers)
+    log_ret = market * beta + sector_ret[:, sector] + drift \
+        + rng.standard_normal((n_dates, n_tickers)) * idio_vol
+    log_ret[0] = 0.0
+    prices = rng.lognormal(3.5, 1.0, size=n_tickers) * np.exp(np.cumsum(log_ret, axis=0))
+
+    # Lifetimes: 30% list after the start, 15% delist before the end
+    rows = np.arange(n_dates)[:, None]
+    listed = np.where(rng.random(n_tickers) < 0.30,
+                      rng.integers(0, n_dates, size=n_tickers), 0)
+    delisted = np.where(rng.random(n_tickers) < 0.15,
+                        listed + rng.integers(252, n_dates, size=n_tickers), n_dates)
+    alive = (rows >= listed) & (rows < delisted)
+
+    # Trading halts / data gaps: runs of 1-20 missing days, ~2 per ticker
+    n_gaps = rng.poisson(2.0, size=n_tickers)
+    gap_col = np.repeat(np.arange(n_tickers), n_gaps)
+    gap_start = rng.integers(0, n_dates, size=len(gap_col))
+    gap_len = rng.integers(1, 21, size=len(gap_col))
+    steps = np.zeros((n_dates + 1, n_tickers), dtype=np.int32)
+    np.add.at(steps, (gap_start, gap_col), 1)
+    np.add.at(steps, (np.minimum(gap_start + gap_len, n_dates), gap_col), -1)
+    in_gap = np.cumsum(steps[:-1], axis=0) > 0
+
+    # Scattered missing closes
+    missing = rng.random((n_dates, n_tickers)) < 0.001
+
+    prices[~alive | in_gap | missing] = np.nan
+    return pd.DataFrame(prices, index=dates, columns=tickers(n_tickers))
+
+
+def synthetic_fundamentals(prices: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+
+    # Annual statements (one row per ticker and fiscal year end, for every
+    # fiscal year the ticker has a price), long format like yahooquery's
+    # all_financial_data. Book value tracks price through a noisy
+    # price-to-book; about 3% of fields are missing.
+
+    rng = np.random.default_rng([seed, 2])
+    n_tickers = prices.shape[1]
+    fye_month = rng.choice([12, 12, 12, 3, 6, 9], size=n_tickers)
+
+    years = np.arange(prices.index[0].year, prices.index[-1].year + 1)
+    ticker_idx = np.repeat(np.arange(n_tickers), len(years))
+    fye = (pd.to_datetime(pd.DataFrame({"year": np.tile(years, n_tickers),
+                                        "month": fye_month[ticker_idx], "day": 1}))
+           + pd.offsets.MonthEnd(0))
+
+    # Last close on or before each fiscal year end
+    filled = prices.ffill().to_numpy()
+    row = prices.index.searchsorted(fye, side="right") - 1
+    close = np.where(row >= 0, filled[np.maximum(row, 0), ticker_idx], np.nan)
+    keep = ~np.isnan(close)
+    ticker_idx, fye, close = ticker_idx[keep], fye[keep], close[keep]
+    n = len(close)
+
+    shares = rng.lognormal(19.5, 1.0, size=n_tickers)[ticker_idx] \
+        * rng.lognormal(0.0, 0.03, size=n)
+    pb = rng.lognormal(1.0, 0.5, size=n_tickers)[ticker_idx] * rng.lognormal(0.0, 0.15, size=n)
+    equity = close / pb * shares
+    equity[rng.random(n) < 0.02] *= -0.2             # a few negative-equity filers
+    roe = rng.normal(0.12, 0.10, size=n)
+    d2a = np.clip(rng.normal(0.25, 0.15, size=n), 0.0, 0.9)
+    assets = np.abs(equity) / (1.0 - d2a)
+
+    df = pd.DataFrame({
+        "symbol": np.asarray(prices.columns)[ticker_idx],
+        "asOfDate": fye.dt.strftime("%Y-%m-%d").to_numpy(),
+        "periodType": "12M",
+        "currencyCode": "USD",
+        "StockholdersEquity": equity,
+        "OrdinarySharesNumber": shares.round(0),
+        "NetIncome": roe * np.abs(equity),
+        "TotalAssets": assets,
+        "TotalDebt": assets * d2a,
+    })
+    fields = df.columns[4:]
+    df[fields] = df[fields].mask(rng.random((n, len(fields))) < 0.03)
+    return df
+
+
+def synthetic_macro(start: str = "2000-01-03", end: str = "2024-12-31",
+                    seed: int = 0) -> dict:
+
+    # {series id: FRED-layout frame}. CPI is an index level (monthly,
+    # dated the 1st); FEDFUNDS a monthly average rate; DTWEXBGS a weekly
+    # (Friday) dollar index; VIXCLS and DCOILWTICO daily closes with
+    # FRED's "." for holidays.
+
+    rng = np.random.default_rng([seed, 3])
+    months = pd.date_range(pd.Timestamp(start) - pd.DateOffset(years=2), end, freq="MS")
+    weeks = pd.date_range(start, end, freq="W-FRI")
+    days = pd.bdate_range(start, end)
+
+    # Monthly inflation regime: calm ~2% a year with occasional hot spells
+    # and a policy rate chasing a target that rises with it
+    hot = np.convolve(rng.random(len(months)) < 0.006, np.ones(12), mode="full")[:len(months)] > 0
+    inflation = np.where(hot, 0.005, 0.0016) + rng.normal(0.0, 0.001, size=len(months))
+    cpi = 170.0 * np.exp(np.cumsum(inflation))
+    target = np.where(hot, 5.0, 1.5)
+    fed = np.empty(len(months))
+    fed[0] = 1.5
+    for t in range(1, len(months)):
+        fed[t] = fed[t - 1] + 0.08 * (target[t] - fed[t - 1]) + rng.normal(0.0, 0.05)
+    fed = np.clip(fed, 0.05, None)
+
+    # Daily VIX: mean-reverting log level with a few multi-week spikes
+    spike = np.convolve(rng.random(len(days)) < 0.002, np.ones(40), mode="full")[:len(days)]
+    log_vix = np.empty(len(days))
+    log_vix[0] = np.log(16.0)
+    shocks = rng.normal(0.0, 0.07, size=len(days))
+    for t in range(1, len(days)):
+        log_vix[t] = log_vix[t - 1] + 0.05 * (np.log(16.0) - log_vix[t - 1]) + shocks[t]
+    vix = np.exp(log_vix) * (1.0 + 0.8 * np.minimum(spike, 1.0))
+    oil = 30.0 * np.exp(np.cumsum(rng.normal(0.0002, 0.022, size=len(days))))
+    usd = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.008, size=len(weeks))))
+
+    def fred(dates, series_id, values, holidays=0.0):
+        values = np.round(values, 3).astype(object)
+        values[rng.random(len(values)) < holidays] = "."
+        return pd.DataFrame({"observation_date": dates.strftime("%Y-%m-%d"),
+                             series_id: values})
+
+    return {
+        "CPIAUCSL": fred(months, "CPIAUCSL", cpi),
+        "FEDFUNDS": fred(months, "FEDFUNDS", fed),
+        "DTWEXBGS": fred(weeks, "DTWEXBGS", usd),
+        "VIXCLS": fred(days, "VIXCLS", vix, holidays=0.03),
+        "DCOILWTICO": fred(days, "DCOILWTICO", oil, holidays=0.03),
+    }
+
+
+def write_macro(out_dir, start: str = "2000-01-03", end: str = "2024-12-31",
+                seed: int = 0) -> Path:
+
+    # <out_dir>/<series id>.csv, the layout data/raw/macro expects
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for series_id, frame in synthetic_macro(start, end, seed).items():
+        frame.to_csv(out_dir / f"{series_id}.csv", index=False)
+    return out_dir
+
+
+def synthetic_sentiment(prices: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+
+    # Scores in (-1, 1): a persistent per-ticker tone plus noise. Events
+    # on dates a ticker has no price are dropped.
+
+    rng = np.random.default_rng([seed, 5])
+    dates, names = prices.index, prices.columns
+    n_dates, n_tickers = prices.shape
+    tone = rng.normal(0.0, 0.4, size=n_tickers)
+
+    frames = []
+    for source, every, shift in (("earnings_call", 63, 0), ("10-K", 252, 40)):
+        offset = rng.integers(0, every, size=n_tickers) + shift
+        n_events = (n_dates - offset.min()) // every + 1
+        rows = offset[None, :] + every * np.arange(n_events)[:, None]
+        rows = rows + rng.integers(-3, 4, size=rows.shape)
+        cols = np.broadcast_to(np.arange(n_tickers), rows.shape)
+        ok = (rows >= 0) & (rows < n_dates)
+        rows, cols = rows[ok], cols[ok]
+        ok = ~np.isnan(prices.to_numpy()[rows, cols])
+        rows, cols = rows[ok], cols[ok]
+        hour = np.where(rng.random(len(rows)) < 0.5, 8, 17)
+        frames.append(pd.DataFrame({
+            "ticker": names[cols],
+            "timestamp": dates[rows] + pd.to_timedelta(hour, unit="h"),
+            "score": np.tanh(tone[cols] + rng.normal(0.0, 0.5, size=len(rows))),
+            "source": source,
+        }))
+    return pd.concat(frames, ignore_index=True).sort_values("timestamp", ignore_index=True)
+
+
+def synthetic_universe(prices: pd.DataFrame, seed: int = 0):
+
+    # (constituents, ticker_changes) in the data/raw/universe layout.
+    # Renamed names appear under their old ticker before the change date.
+
+    rng = np.random.default_rng([seed, 4])
+    dates, names = prices.index, prices.columns
+    trading = prices.notna().rolling(21, min_periods=1).max().to_numpy() > 0
+    size = prices.ffill().to_numpy() * rng.lognormal(19.5, 1.0, size=len(names))
+
+    month_end = np.flatnonzero(dates.to_period("M").asi8[1:] != dates.to_period("M").asi8[:-1])
+    month_end = np.append(month_end, len(dates) - 1)
+    recon = np.flatnonzero(dates[month_end].month == 6)
+
+    frames, members = [], None
+    for k, row in enumerate(month_end):
+        if members is None or k in recon:
+            live = np.where(trading[row], size[row], np.nan)
+            members = live >= np.nanquantile(live, 0.2)
+        current = members & trading[row]
+        frames.append(pd.DataFrame({"date": dates[row], "ticker": names[current]}))
+    constituents = pd.concat(frames, ignore_index=True)
+
+    renamed = rng.choice(len(names), size=max(len(names) // 50, 1), replace=False)
+    change_dates = dates[rng.integers(len(dates) // 10, len(dates), size=len(renamed))]
+    changes = pd.DataFrame({"date": change_dates,
+                            "old_ticker": [f"X{i:04d}" for i in renamed],
+                            "new_ticker": names[renamed]})
+    old = dict(zip(changes["new_ticker"], zip(changes["old_ticker"], changes["date"])))
+    before = np.array([t in old and d < old[t][1]
+                       for t, d in zip(constituents["ticker"], constituents["date"])], dtype=bool)
+    constituents.loc[before, "ticker"] = [old[t][0] for t in constituents.loc[before, "ticker"]]
+    constituents["date"] = constituents["date"].dt.strftime("%Y-%m-%d")
+    changes["date"] = changes["date"].dt.strftime("%Y-%m-%d")
+    return constituents, changes.sort_values("date", ignore_index=True)
+
+
+def write_synthetic(out_dir=None, n_tickers: int = 1000, years: int = 25,
+                    seed: int = 0) -> Path:
+
+    # <out_dir>/raw/r1000_close_prices.csv
+    # <out_dir>/fundamentals/all_financial_data.csv   (FixtureBackend dir)
+    # <out_dir>/sectors.csv
+    # <out_dir>/macro/<series id>.csv                  (data/raw/macro layout)
+    # <out_dir>/universe/constituents.csv, ticker_changes.csv
+    # <out_dir>/sentiment_events.csv                   (SentimentStore.append input)
+
+    out_dir = Path(out_dir) if out_dir is not None \
+        else SYNTHETIC_DIR / f"{n_tickers}x{years}_seed{seed}"
+    (out_dir / "raw").mkdir(parents=True, exist_ok=True)
+    (out_dir / "fundamentals").mkdir(exist_ok=True)
+
+    prices = synthetic_prices(n_tickers, years, seed=seed)
+    prices.to_csv(out_dir / "raw" / PRICES_FILE)
+    synthetic_fundamentals(prices, seed).to_csv(
+        out_dir / "fundamentals" / f"{ANNUAL_FINANCIALS}.csv", index=False)
+    synthetic_sectors(n_tickers, seed).to_csv(out_dir / "sectors.csv")
+    write_macro(out_dir / "macro", prices.index[0], prices.index[-1], seed)
+    constituents, changes = synthetic_universe(prices, seed)
+    (out_dir / "universe").mkdir(exist_ok=True)
+    constituents.to_csv(out_dir / "universe" / "constituents.csv", index=False)
+    changes.to_csv(out_dir / "universe" / "ticker_changes.csv", index=False)
+    synthetic_sentiment(prices, seed).to_csv(out_dir / "sentiment_events.csv", index=False)
+    return out_dir
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--years", type=int, default=25)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None,
+                    help="output directory (default data/synthetic/<tickers>x<years>_seed<seed>)")
+    args = ap.parse_args()
+
+    out = write_synthetic(args.out, args.tickers, args.years, args.seed)
+    print(f"Synthetic data written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Regression checks for the decile backtest's leg construction.
+
+import numpy as np
+import pytest
+
+from src.features.compute_factors import low_vol, momentum
+from src.portfolio.backtest import backtest, daily_returns, quantile_weights
+from src.utils.store import read_table, table_path
+
+PRICES = table_path("r1000_cleaned_close_prices")
+
+
+def assert_dollar_neutral(weights: np.ndarray, leg: float, held: np.ndarray):
+
+    # weights (R, N, S); held (R, S): dates expected to hold both legs
+
+    net = weights.sum(axis=1)
+    gross = np.abs(weights).sum(axis=1)
+    np.testing.assert_allclose(net, 0.0, atol=1e-12)
+    np.testing.assert_allclose(gross, np.where(held, 2 * leg, 0.0), atol=1e-12)
+
+
+def test_quantile_weights_neutral_for_every_cross_section_size():
+    rng = np.random.default_rng(0)
+    signals = rng.normal(size=(40, 30, 3))
+    # 0 .. 29 valid names on successive dates, plus ties
+    valid = np.arange(30)[None, :, None] < np.arange(40)[:, None, None] % 31
+    signals = np.where(valid, signals, np.nan)
+    signals[5:10, :4] = 1.0
+    leg = 0.5
+    weights = quantile_weights(signals, n_quantiles=10, leg=leg)
+    count = (~np.isnan(signals)).sum(axis=1)
+    assert_dollar_neutral(weights, leg, count >= 2)
+
+    # Both legs hold max(n // q, 1) names
+    size = np.maximum(count // 10, 1)
+    np.testing.assert_array_equal((weights > 0).sum(axis=1), np.where(count >= 2, size, 0))
+    np.testing.assert_array_equal((weights < 0).sum(axis=1), np.where(count >= 2, size, 0))
+
+
+def test_quantile_weights_respects_mask():
+    rng = np.random.default_rng(1)
+    signals = rng.normal(size=(12, 20, 2))
+    mask = rng.random((12, 20)) < 0.3
+    weights = quantile_weights(signals, n_quantiles=5, leg=0.5, mask=mask)
+    assert not weights[~mask].any()
+    assert_dollar_neutral(weights, 0.5, mask.sum(axis=1)[:, None].repeat(2, axis=1) >= 2)
+
+
+@pytest.mark.skipif(not PRICES.exists(), reason="no processed price table")
+def test_repo_prices_every_rebalance_is_dollar_neutral():
+    prices = read_table(PRICES, index=True)
+    signals = {"momentum": momentum(prices), "low_vol": low_vol(prices)}
+    result = backtest(signals, daily_returns(prices))
+    weights = result["weights"]
+    held = np.abs(weights).sum(axis=1) > 0
+    assert held.any()
+    assert_dollar_neutral(weights, 0.5, held)
@@ -0,0 +1,43 @@
+# Fundamentals cache shared by concurrent processes (the pipeline runs
+# value and quality side by side): no writer may drop another's rows.
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src.utils.fundamentals import FixtureBackend, FundamentalsClient
+
+STATEMENT = "all_financial_data"
+TICKERS = [f"T{i:02d}" for i in range(24)]
+
+
+def write_fixture(directory) -> pd.DataFrame:
+    df = pd.DataFrame([
+        {"symbol": t, "asOfDate": f"{year}-12-31", "StockholdersEquity": float(i * 100 + year)}
+        for i, t in enumerate(TICKERS) for year in (2021, 2022, 2023)
+    ])
+    df.to_csv(directory / f"{STATEMENT}.csv", index=False)
+    return df
+
+
+def fetch(fixture_dir, cache_dir, tickers) -> int:
+    client = FundamentalsClient(FixtureBackend(fixture_dir, latency=0.05),
+                                cache_dir=cache_dir, batch_size=2)
+    return len(client.get(tickers, STATEMENT))
+
+
+def test_concurrent_processes_keep_every_row(tmp_path):
+    fixture = write_fixture(tmp_path)
+    cache_dir = tmp_path / "cache"
+    groups = [TICKERS[i::4] for i in range(4)]
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        sizes = list(pool.map(fetch, [tmp_path] * 4, [cache_dir] * 4, groups))
+    assert sizes == [3 * len(g) for g in groups]
+
+    # Everything is now cached: a fresh client serves all of it without a fetch
+    backend = FixtureBackend(tmp_path)
+    client = FundamentalsClient(backend, cache_dir=cache_dir)
+    out = client.get(TICKERS, STATEMENT)
+    assert backend.calls == 0 and client.hits == len(TICKERS)
+    assert len(out) == len(fixture)
+    assert not list(cache_dir.glob("*.tmp"))
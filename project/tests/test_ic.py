@@ -0,0 +1,30 @@
+# IC quantile buckets: same legs as the backtest.
+
+import numpy as np
+
+from src.features.ic import quantile_means
+from src.features.standardize import quantile_buckets, standardize
+
+
+def test_bucket_sizes_match_backtest_legs():
+    x = np.arange(9.0)[None, :, None]
+    bucket = quantile_buckets(x, 5)[0, :, 0]
+    assert (bucket == 1).sum() == 1 and (bucket == 5).sum() == 1
+    assert bucket[0] == 1 and bucket[-1] == 5
+
+    # More quantiles than names: both ends still one name each
+    bucket = quantile_buckets(np.arange(3.0)[None, :, None], 10)[0, :, 0]
+    assert bucket[0] == 1 and bucket[-1] == 10
+
+
+def test_spread_is_top_minus_bottom_names():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(4, 23, 1))
+    y = rng.normal(size=(4, 23, 1))
+    ranks = standardize(x, method="rank")
+    means = quantile_means(ranks, y, 5, np.full((4, 1), 23), min_assets=5)
+    order = np.argsort(x[:, :, 0], axis=1)
+    ys = np.take_along_axis(y[:, :, 0], order, axis=1)
+    size = 23 // 5
+    expected = ys[:, -size:].mean(axis=1) - ys[:, :size].mean(axis=1)
+    np.testing.assert_allclose(means[:, -1, 0] - means[:, 0, 0], expected, atol=1e-14)
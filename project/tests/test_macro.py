@@ -0,0 +1,113 @@
+# Macro layer on the synthetic FRED fixture (utils/synthetic.write_macro)
+# instead of the network: publication lags, the aligned-matrix cache and
+# the regime / tilt arithmetic.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.features import macro
+from src.features.macro import (COMPOSITES, REGIMES, SERIES, TILTS, align_macro,
+                                factor_weights, read_series, regime_flags, transformed)
+from src.utils.synthetic import write_macro
+
+
+@pytest.fixture
+def fixture_dir(tmp_path):
+    return write_macro(tmp_path / "macro", "2008-01-01", "2012-12-31", seed=4)
+
+
+@pytest.fixture
+def dates():
+    return pd.bdate_range("2009-01-01", "2012-12-31")
+
+
+def test_no_value_before_publication(fixture_dir, dates):
+    aligned = align_macro(dates, directory=fixture_dir, cache_dir=None)
+    assert list(aligned.columns) == [s.name for s in SERIES]
+    for spec in SERIES:
+        values = transformed(read_series(spec.series_id, fixture_dir), spec).dropna()
+        published = pd.Series(values.to_numpy(),
+                              index=values.index + pd.Timedelta(days=spec.lag_days))
+        # The latest print whose publication date is on or before each date
+        position = published.index.searchsorted(dates, side="right") - 1
+        expected = np.where(position >= 0, published.to_numpy()[np.maximum(position, 0)], np.nan)
+        np.testing.assert_array_equal(aligned[spec.name].to_numpy(), expected,
+                                      err_msg=spec.name)
+        first = aligned[spec.name].first_valid_index()
+        assert first >= values.index[0] + pd.Timedelta(days=spec.lag_days)
+
+
+def test_second_call_is_served_from_cache(fixture_dir, dates, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    first = align_macro(dates, directory=fixture_dir, cache_dir=cache_dir)
+    assert len(list(cache_dir.glob("*.parquet"))) == 1
+
+    def no_reads(*args, **kwargs):
+        raise AssertionError("cache miss: series were read again")
+
+    monkeypatch.setattr(macro, "read_series", no_reads)
+    cached = align_macro(dates, directory=fixture_dir, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(cached, first, check_freq=False)
+    monkeypatch.undo()
+
+    # Rewriting a series file changes the key: recomputed, cached anew
+    key = macro.macro_key(dates, SERIES, fixture_dir)
+    path = fixture_dir / "VIXCLS.csv"
+    frame = pd.read_csv(path)
+    frame.loc[frame["VIXCLS"] != ".", "VIXCLS"] = "80.0"
+    frame.to_csv(path, index=False)
+    assert macro.macro_key(dates, SERIES, fixture_dir) != key
+    rewritten = align_macro(dates, directory=fixture_dir, cache_dir=cache_dir)
+    assert len(list(cache_dir.glob("*.parquet"))) == 2
+    assert (rewritten["vix"].dropna() == 80.0).all()
+    pd.testing.assert_series_equal(rewritten["cpi_yoy"], first["cpi_yoy"], check_freq=False)
+
+
+def test_regime_flags_and_stress_composite():
+    index = pd.bdate_range("2020-01-01", periods=5)
+    frame = pd.DataFrame({
+        "vix":          [30.0, 30.0, 10.0, np.nan, 30.0],
+        "cpi_yoy":      [0.05, 0.01, 0.05, 0.05, np.nan],
+        "fed_funds_6m": [0.0] * 5,
+        "oil_3m":       [0.0] * 5,
+        "usd_3m":       [0.0] * 5,
+    }, index=index)
+    flags = regime_flags(frame)
+    assert flags.shape == (5, len(REGIMES) + len(COMPOSITES))
+    assert list(flags.columns) == [name for name, *_ in REGIMES] + list(COMPOSITES)
+    assert flags["high_vol"].tolist() == [True, True, False, False, True]
+    assert flags["stress"].tolist() == [True, False, False, False, False]
+    members = list(COMPOSITES["stress"])
+    pd.testing.assert_series_equal(flags["stress"], flags[members].all(axis=1),
+                                   check_names=False)
+
+
+def test_factor_weights_rotate_in_stress():
+    index = pd.bdate_range("2020-01-01", periods=3)
+    flags = pd.DataFrame(False, index=index,
+                         columns=[name for name, *_ in REGIMES] + list(COMPOSITES))
+    flags.loc[index[1], ["high_vol", "high_inflation", "stress"]] = True
+    flags.loc[index[2], "high_vol"] = True
+    factors = sorted({f for tilt in TILTS.values() for f in tilt})
+    base = {f: 1.0 / len(factors) for f in factors}
+
+    weights = factor_weights(flags, base)
+    assert weights.shape == (3, len(factors))
+    assert list(weights.columns) == factors
+    np.testing.assert_allclose(weights.sum(axis=1), 1.0)
+    np.testing.assert_allclose(weights.iloc[0], [base[f] for f in factors])
+    calm, stress, high_vol = (weights.iloc[i] for i in range(3))
+    assert stress["momentum"] < high_vol["momentum"] < calm["momentum"]
+    assert stress["quality"] > high_vol["quality"]
+    assert (weights.to_numpy() >= 0).all()
+
+
+def test_factor_weights_warn_on_tilts_outside_base():
+    flags = pd.DataFrame({"calm": [1.0, 0.2], "stress": [0.0, 0.8]},
+                         index=pd.bdate_range("2020-01-01", periods=2))
+    with pytest.warns(RuntimeWarning, match="stress: quality"):
+        factor_weights(flags, {"momentum": 0.5, "low_vol": 0.5})
+    weights = factor_weights(flags, {"momentum": 1 / 3, "low_vol": 1 / 3, "quality": 1 / 3})
+    assert weights["quality"].iloc[1] > weights["quality"].iloc[0]
+    assert weights["momentum"].iloc[1] < weights["momentum"].iloc[0]
@@ -0,0 +1,61 @@
+# Metrics recording: on for command-line runs, off for library calls.
+
+import importlib.util
+import json
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+
+from src.utils import metrics
+from src.utils.metrics import METRICS_ENV, timed
+
+
+def test_library_calls_do_not_record_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv(METRICS_ENV, raising=False)
+    path = tmp_path / "metrics.jsonl"
+    counted = []
+    monkeypatch.setattr(metrics.Metric, "count",
+                        lambda self, data: counted.append(data) or self)
+
+    @timed(path=path)
+    def work(n):
+        return pd.DataFrame(np.ones((n, 2)))
+
+    assert work(3).shape == (3, 2)
+    with timed("block", path=path) as m:
+        m.add(rows=1)
+    assert not path.exists() and not counted
+
+
+def test_forced_on_records_blocks_and_counts(tmp_path, monkeypatch):
+    monkeypatch.setenv(METRICS_ENV, "1")
+    path = tmp_path / "metrics.jsonl"
+
+    @timed(path=path)
+    def work():
+        return np.array([1.0, np.nan, 3.0])
+
+    with timed("outer", path=path):
+        work()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["step"] for r in records] == ["outer/work", "outer"]
+    assert records[0]["rows"] == 3 and records[0]["nans"] == 1
+
+
+def test_src_commands_record(monkeypatch):
+    monkeypatch.delenv(METRICS_ENV, raising=False)
+    main = types.ModuleType("__main__")
+    main.__spec__ = importlib.util.find_spec("src.etl.merge")
+    monkeypatch.setitem(sys.modules, "__main__", main)
+    assert metrics.recording()
+
+    monkeypatch.delenv(METRICS_ENV)
+    main.__spec__ = importlib.util.find_spec("benchmarks.bench_ewma")
+    assert not metrics.recording()
+
+    # An explicit setting wins over the entry point's default
+    monkeypatch.setenv(METRICS_ENV, "0")
+    metrics.set_recording()
+    assert not metrics.recording()
@@ -0,0 +1,63 @@
+# Optimizer constraints fed from EWMA betas: a frame in any column order
+# or ticker case must land on the risk model's (dates, assets).
+
+import numpy as np
+import pytest
+
+from src.features.ewma import EWMAEstimator
+from src.portfolio.backtest import daily_returns, rebalance_positions
+from src.portfolio.optimizer import optimize
+from src.portfolio.risk import build_risk_model
+from src.utils.synthetic import synthetic_prices
+
+
+@pytest.fixture(scope="module")
+def setup():
+    prices = synthetic_prices(40, 3, seed=2)
+    returns = daily_returns(prices)
+    positions = rebalance_positions(prices.index)[12:]
+    signal = prices.pct_change(60, fill_method=None)
+    risk = build_risk_model(returns, {"trend": signal}, prices.index[positions])
+    raw = signal.to_numpy()[positions]
+    alpha = 1e-4 * (raw - np.nanmean(raw, axis=1, keepdims=True)) \
+        / np.nanstd(raw, axis=1, keepdims=True)
+    betas = EWMAEstimator(returns.columns, halflife=21).update(returns)["beta"]
+    return risk, alpha, betas
+
+
+def test_align_reorders_columns_and_case(setup):
+    risk, _, betas = setup
+    shuffled = betas[betas.columns[::-1]]
+    shuffled.columns = shuffled.columns.str.lower()
+    aligned = risk.align(shuffled)
+    assert aligned.shape == (len(risk.dates), len(risk.assets))
+    expected = betas.reindex(index=risk.dates, columns=risk.assets).to_numpy()
+    np.testing.assert_array_equal(aligned, expected)
+
+
+def test_optimize_takes_an_ewma_beta_frame(setup):
+    risk, alpha, betas = setup
+    shuffled = betas[betas.columns[::-1]]
+    out = optimize(alpha, risk, betas=shuffled, max_weight=0.05, sector_neutral=False)
+    aligned = risk.align(betas)
+    ref = optimize(alpha, risk, betas=aligned, max_weight=0.05, sector_neutral=False)
+    np.testing.assert_array_equal(out["weights"], ref["weights"])
+    # neutral up to the ADMM tolerance (1e-6 per weight)
+    exposure = np.einsum("rn,rn->r", out["weights"], np.nan_to_num(aligned))
+    np.testing.assert_allclose(exposure, 0.0, atol=1e-4)
+
+
+def test_align_rejects_missing_rebalance_dates(setup):
+    risk, _, betas = setup
+    with pytest.raises(KeyError):
+        risk.align(betas.drop(index=risk.dates[3]))
+
+
+def test_unconverged_dates_are_flagged_and_warned(setup):
+    risk, alpha, _ = setup
+    out = optimize(alpha, risk, max_weight=0.05)
+    assert out["converged"].all()
+    with pytest.warns(RuntimeWarning, match="max_iter=3"):
+        short = optimize(alpha, risk, max_weight=0.05, max_iter=3)
+    assert not short["converged"].any()
+    assert (short["iterations"] == 3).all()
@@ -0,0 +1,36 @@
+# Pipeline cache keys: a stage goes stale when any src module it imports
+# changes, not only its own file.
+
+from src import pipeline
+from src.pipeline import Stage, code_dependencies, stage_key
+
+
+def write(path, text=""):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_code_dependencies_follow_transitive_src_imports():
+    files = {p.relative_to(pipeline.SRC_DIR).as_posix()
+             for p in code_dependencies("src.features.ic")}
+    assert {"features/ic.py", "features/standardize.py", "utils/store.py",
+            "utils/cache.py", "__init__.py", "features/__init__.py"} <= files
+    assert "features/pb_ratios.py" not in files
+
+
+def test_stage_key_changes_with_an_indirect_import(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    write(src / "__init__.py")
+    write(src / "stage.py", "import numpy as np\nfrom src.lib import helper\n")
+    write(src / "lib" / "__init__.py")
+    write(src / "lib" / "helper.py", "def f():\n    from src.lib.deep import g\n")
+    write(src / "lib" / "deep.py", "g = 1\n")
+    write(src / "unrelated.py", "x = 1\n")
+    monkeypatch.setattr(pipeline, "SRC_DIR", src)
+
+    stage = Stage("s", "src.stage")
+    key = stage_key(stage)
+    write(src / "unrelated.py", "x = 2\n")
+    assert stage_key(stage) == key
+    write(src / "lib" / "deep.py", "g = 2\n")
+    assert stage_key(stage) != key
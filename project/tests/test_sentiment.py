@@ -0,0 +1,49 @@
+# Sentiment projection: a calendar starting after the event history must
+# carry the decayed state of the earlier events, not restart from them.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.features.sentiment import SentimentStore
+
+EVENTS = pd.DataFrame({
+    "ticker": ["AAPL", "AAPL", "MSFT", "MSFT", "AAPL"],
+    "timestamp": ["2015-01-05 00:00:00", "2019-06-03 00:00:00", "2019-12-02 00:00:00",
+                  "2020-01-02 18:00:00", "2020-03-02 00:00:00"],
+    "score": [1.0, -1.0, 0.5, 0.25, 0.75],
+    "source": "earnings_call",
+})
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SentimentStore(tmp_path / "events")
+    store.append(EVENTS)
+    return store
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(halflife=21),
+    dict(halflife=21, max_age=60),
+    dict(halflife=63, mode="accumulate", how="sum"),
+    dict(halflife=None, lag=0),
+])
+def test_sub_range_equals_slice_of_full_projection(store, kwargs):
+    full_dates = pd.bdate_range("2015-01-01", "2020-06-30")
+    full = store.project(full_dates, **kwargs)
+    for start in ("2020-01-01", "2019-06-03", "2020-01-02", "2020-01-03"):
+        dates = full_dates[full_dates >= start]
+        part = store.project(dates, **kwargs)
+        pd.testing.assert_frame_equal(part, full.loc[dates], check_exact=True)
+
+
+def test_old_events_are_decayed_not_fresh(store):
+    dates = pd.bdate_range("2020-01-03", "2020-01-31")
+    panel = store.project(dates, halflife=21)
+    # MSFT's 2020-01-02 after-hours event lands on 2020-01-03, undecayed
+    assert panel.loc[dates[0], "MSFT"] == 0.25
+    # AAPL's last pre-2020 event (-1.0 on 2019-06-03) is months old
+    assert -0.01 < panel.loc[dates[0], "AAPL"] < 0
+    expired = store.project(dates, halflife=21, max_age=60)
+    assert np.isnan(expired.loc[dates[0], "AAPL"])
@@ -0,0 +1,28 @@
+# standardize: non-finite inputs are treated as missing.
+
+import numpy as np
+import pandas as pd
+
+from src.features.standardize import standardize
+
+
+def test_inf_is_masked_like_nan():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(6, 12))
+    with_nan = x.copy()
+    with_nan[:, 3] = np.nan
+    with_inf = x.copy()
+    with_inf[:, 3] = np.inf
+    with_inf[2, 5] = -np.inf
+    with_nan[2, 5] = np.nan
+    for kwargs in (dict(method="zscore"), dict(method="rank"),
+                   dict(method="zscore", winsor=(0.05, 0.95))):
+        out = standardize(with_inf, **kwargs)
+        np.testing.assert_array_equal(out, standardize(with_nan, **kwargs))
+        assert np.isfinite(out[:, [0, 1, 2, 4]]).all()
+
+
+def test_rank_matches_pandas_with_inf():
+    x = np.array([[1.0, np.inf, 3.0, 2.0, -np.inf, 5.0]])
+    expected = pd.Series(np.where(np.isfinite(x[0]), x[0], np.nan)).rank(pct=True).to_numpy()
+    np.testing.assert_allclose(standardize(x, method="rank")[0], expected)
@@ -0,0 +1,28 @@
+# Benchmark suite baselines: each stage is compared with the latest run
+# that measured it, so a --stages subset run cannot hide the others.
+
+from benchmarks.suite import regressions, stage_baselines
+
+CONFIG = {"tickers": 200, "years": 5, "seed": 0}
+
+
+def run(timestamp, config=CONFIG, **stages):
+    return {"timestamp": timestamp, "commit": timestamp, "config": config,
+            "stages": {name: {"seconds": s, "peak_rss_mb": 100.0, "rows": 10}
+                       for name, s in stages.items()}}
+
+
+def test_baseline_is_the_latest_run_containing_each_stage():
+    history = [
+        run("full", validate=1.0, merge=1.0),
+        run("subset", validate=1.0),
+        run("other-config", config={**CONFIG, "tickers": 1000}, merge=9.0),
+    ]
+    baselines = stage_baselines(history, CONFIG, ["validate", "merge", "ic"])
+    assert {name: r["timestamp"] for name, r in baselines.items()} == \
+        {"validate": "subset", "merge": "full"}
+
+    current = {"validate": {"seconds": 1.0, "peak_rss_mb": 100.0, "rows": 10},
+               "merge": {"seconds": 3.0, "peak_rss_mb": 100.0, "rows": 10}}
+    flags = regressions(current, {name: r["stages"][name] for name, r in baselines.items()})
+    assert flags == ["merge: time 1.00s -> 3.00s"]